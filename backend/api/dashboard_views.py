@@ -3,8 +3,8 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from datetime import date, timedelta
 from django.db.models import Sum, Avg, Count
-# from diet_plans.models import DietPlan, Meal
-from progress.models import WeightLog, CalorieLog, Achievement
+from diet_plans.models import GenerateMeal, ToDoList
+from progress.models import WeightLog, CalorieLog, Achievement, UserStreak
 from notifications.models import UserNotification
 
 class ComprehensiveDashboardView(APIView):
@@ -30,6 +30,17 @@ class ComprehensiveDashboardView(APIView):
         # Today's meals and progress
         today_meals = []
         today_completion = 0
+        active_plan = GenerateMeal.objects.only('id').active_for(user, today)
+        if active_plan:
+            today_meals = list(ToDoList.objects.filter(user=user, date_of_meal=today).values(
+                'id', 'meal_time', 'meal', 'is_completed'
+            ))
+            if today_meals:
+                completed = sum(1 for meal in today_meals if meal['is_completed'])
+                today_completion = round(completed * 100 / len(today_meals))
+
+        # Meal-plan streak
+        streak = UserStreak.objects.filter(user=user).first()
 
         # Recent achievements
         recent_achievements = user.achievements.all()[:5].values(
@@ -48,6 +59,10 @@ class ComprehensiveDashboardView(APIView):
             'user_info': user_info,
             'today_meals': today_meals,
             'today_completion_percentage': today_completion,
+            'streak': {
+                'current': streak.current_on(today) if streak else 0,
+                'best': streak.best_streak if streak else 0,
+            },
             'recent_achievements': list(recent_achievements),
             'unread_notifications': list(unread_notifications),
             'health_insights': health_insights,
@@ -0,0 +1,105 @@
+"""
+Daily adherence summaries.
+
+DailyAdherence holds one row per user and day with the number of planned and
+completed meals and their meal-time bitmasks. Every code path that writes
+ToDoList rows calls refresh_days for the days it touched, inside its own
+transaction, so the summary only ever recomputes those days (at most four
+to-do rows each) and reads of adherence, streaks and calendars never scan the
+ToDoList. `manage.py backfill_adherence` builds the table for existing rows.
+
+Refreshes of the same user and day are serialized by locking the day's
+DailyAdherence rows, so the last one to commit always counts every to-do
+written before it.
+
+When a refresh makes a day complete (every planned meal done) or no longer
+complete, day_completion_changed is sent with the user_id and the `completed`
+and `uncompleted` dates, inside the same transaction.
+"""
+from collections import defaultdict
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from diet_plans.models import DailyAdherence, ToDoList
+
+MEAL_TIMES = [meal_time for meal_time, _ in ToDoList.MEAL_TIME_CHOICES]
+MEAL_TIME_BITS = {meal_time: 1 << index for index, meal_time in enumerate(MEAL_TIMES)}
+
+SUMMARY_FIELDS = ['meals_planned', 'meals_completed', 'planned_mask', 'completed_mask', 'updated_at']
+
+day_completion_changed = Signal()
+
+
+def add_todo(summary, meal_time, is_completed):
+    """Count one to-do row into a DailyAdherence instance"""
+    bit = MEAL_TIME_BITS.get(meal_time, 0)
+    summary.meals_planned += 1
+    summary.planned_mask |= bit
+    if is_completed:
+        summary.meals_completed += 1
+        summary.completed_mask |= bit
+
+
+def save_summaries(summaries, batch_size=500):
+    """Insert or overwrite DailyAdherence rows (one query per batch_size rows)"""
+    now = timezone.now()
+    for summary in summaries:
+        summary.updated_at = now
+    DailyAdherence.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=['user', 'date'],
+        update_fields=SUMMARY_FIELDS,
+        batch_size=batch_size,
+    )
+
+
+def refresh_days(user_id, dates):
+    """
+    Recompute the user's summaries for dates from their to-do rows: four
+    queries in one transaction, plus the day_completion_changed receivers'
+    when a day's completion changes
+    """
+    dates = sorted(set(dates))
+    if not dates:
+        return []
+
+    with transaction.atomic():
+        # Make sure every day has a row to lock, then lock them in date order
+        DailyAdherence.objects.bulk_create(
+            [DailyAdherence(user_id=user_id, date=day) for day in dates], ignore_conflicts=True
+        )
+        was_complete = {
+            day for day, planned, completed in DailyAdherence.objects.select_for_update()
+            .filter(user_id=user_id, date__in=dates).order_by('date')
+            .values_list('date', 'planned_mask', 'completed_mask')
+            if planned and planned == completed
+        }
+        summaries = {day: DailyAdherence(user_id=user_id, date=day) for day in dates}
+        rows = (ToDoList.objects
+                .filter(user_id=user_id, date_of_meal__in=dates)
+                .values_list('date_of_meal', 'meal_time', 'is_completed'))
+        for date_of_meal, meal_time, is_completed in rows:
+            add_todo(summaries[date_of_meal], meal_time, is_completed)
+
+        summaries = list(summaries.values())
+        save_summaries(summaries)
+
+        is_complete = {summary.date for summary in summaries if summary.is_complete}
+        if is_complete != was_complete:
+            day_completion_changed.send(
+                sender=DailyAdherence,
+                user_id=user_id,
+                completed=sorted(is_complete - was_complete),
+                uncompleted=sorted(was_complete - is_complete),
+            )
+    return summaries
+
+
+def refresh_for_todos(todos):
+    """refresh_days for every user and day among ToDoList instances"""
+    dates_by_user = defaultdict(set)
+    for todo in todos:
+        dates_by_user[todo.user_id].add(todo.date_of_meal)
+    for user_id, dates in sorted(dates_by_user.items()):
+        refresh_days(user_id, dates)
@@ -8,6 +8,12 @@ class GenerateMealAdmin(admin.ModelAdmin):
     list_filter = ('meal_type', 'generated_at')
     readonly_fields = ('generated_at', 'start_date', 'end_date')
 
+@admin.register(GeneratedMealDay)
+class GeneratedMealDayAdmin(admin.ModelAdmin):
+    list_display = ('generated_meal', 'day')
+    search_fields = ('generated_meal__user__username',)
+    raw_id_fields = ('generated_meal',)
+
 @admin.register(ToDoList)
 class ToDoListAdmin(admin.ModelAdmin):
     list_display = ('user', 'meal_time', 'day', 'date_of_meal', 'is_completed')
@@ -15,6 +21,13 @@ class ToDoListAdmin(admin.ModelAdmin):
     list_filter = ('meal_time', 'is_completed', 'date_of_meal')
     readonly_fields = ('created_at', 'updated_at')
 
+@admin.register(DailyAdherence)
+class DailyAdherenceAdmin(admin.ModelAdmin):
+    list_display = ('user', 'date', 'meals_planned', 'meals_completed')
+    search_fields = ('user__username',)
+    list_filter = ('date',)
+    readonly_fields = ('meals_planned', 'meals_completed', 'planned_mask', 'completed_mask', 'updated_at')
+
 @admin.register(UserMealProfile)
 class UserMealProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'meal_round', 'new_weight', 'new_height', 'goal')
@@ -25,5 +38,5 @@ class UserMealProfileAdmin(admin.ModelAdmin):
 class FoodAdmin(admin.ModelAdmin):
     list_display = ('name', 'calories_per_100g', 'protein_per_100g', 'category', 'created_at')
     search_fields = ('name', 'category')
-    list_filter = ('category', 'created_at')
-    readonly_fields = ('created_at', 'updated_at')
+    list_filter = ('category', 'is_vegetarian', 'is_vegan', 'is_halal', 'created_at')
+    readonly_fields = ('eligibility_mask', 'created_at', 'updated_at')
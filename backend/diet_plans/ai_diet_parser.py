@@ -1,80 +1,141 @@
 import re
+from collections import namedtuple
 from datetime import date, timedelta
+from functools import lru_cache
 from django.db import transaction
 # from .models import DietPlan, DailyMeal, MealItem, DietPlanProgress, Food
 
+# Meal item text such as "Boiled egg: 2 pcs" or "Rice 1 cup" parsed into a food
+# name and quantity. All units are alternatives of one grammar compiled at import;
+# each alternative is a named group whose name is the unit.
+ParsedItem = namedtuple('ParsedItem', ['name', 'grams', 'pieces', 'unit'])
+
+# When an item mentions several quantities, the unit listed first wins
+UNIT_PRIORITY = ['grams', 'kilograms', 'pieces', 'cups', 'slices', 'tablespoons', 'teaspoons']
+
+UNIT_GRAMMAR = re.compile(
+    r'(?<![\d.])(?P<value>\d+(?:\.\d+)?)\s*'
+    r'(?:(?P<kilograms>kgs?|kilograms?)'
+    r'|(?P<grams>g(?:ms?|rams?)?)'
+    r'|(?P<pieces>pcs?|pieces?)'
+    r'|(?P<cups>cups?)'
+    r'|(?P<slices>slices?)'
+    r'|(?P<tablespoons>tbsp|tablespoons?)'
+    r'|(?P<teaspoons>tsp|teaspoons?))'
+    r'(?![a-z])'
+)
+
+# Typical weights (grams) of one piece/slice or one cup, by keyword in the item
+# text; when several keywords appear, the one listed first wins
+PIECE_GRAMS = {'egg': 50, 'roti': 40, 'bread': 40, 'banana': 120}
+CUP_GRAMS = {'rice': 185, 'tea': 240, 'coffee': 240}
+CUP_DEFAULT_GRAMS = 200
+SPOON_GRAMS = {'tablespoons': 15, 'teaspoons': 5}
+
+
+def _keyword_patterns(table):
+    # Whole words, optionally plural: "eggs" counts, "eggplant" and "steak" don't
+    return [(re.compile(rf'\b{re.escape(keyword)}(?:e?s)?\b'), grams) for keyword, grams in table.items()]
+
+
+PIECE_KEYWORDS = _keyword_patterns(PIECE_GRAMS)
+CUP_KEYWORDS = _keyword_patterns(CUP_GRAMS)
+TRAILING_QUANTITY = re.compile(r'\s*\d.*$', re.DOTALL)
+
+PARSE_CACHE_SIZE = 8192
+
+
+def _keyword_grams(keywords, text):
+    return next((grams for pattern, grams in keywords if pattern.search(text)), None)
+
+
+def parse_quantity(text):
+    """(grams, pieces, unit) of the highest-priority quantity in text; Nones if there is none"""
+    text = text.lower()
+    best = None
+    for match in UNIT_GRAMMAR.finditer(text):
+        rank = UNIT_PRIORITY.index(match.lastgroup)
+        if best is None or rank < best[0]:
+            best = (rank, match)
+    if best is None:
+        return None, None, None
+
+    match = best[1]
+    unit = match.lastgroup
+    value = float(match.group('value'))
+    if unit == 'grams':
+        return value, None, unit
+    if unit == 'kilograms':
+        return value * 1000, None, unit
+    if unit in ('pieces', 'slices'):
+        per_piece = _keyword_grams(PIECE_KEYWORDS, text)
+        return (value * per_piece if per_piece else None), int(value), unit
+    if unit == 'cups':
+        per_cup = _keyword_grams(CUP_KEYWORDS, text) or CUP_DEFAULT_GRAMS
+        return value * per_cup, None, unit
+    return value * SPOON_GRAMS[unit], None, unit
+
+
+def extract_food_name(text):
+    """Food name of an item: the text before ':' (or before the first number), without parentheses"""
+    name, colon, _ = text.partition(':')
+    if not colon:
+        name = TRAILING_QUANTITY.sub('', text)
+    return ' '.join(name.replace('(', '').replace(')', '').split())
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_item(text):
+    """ParsedItem for one meal item string (plans repeat items, so results are cached)"""
+    if not isinstance(text, str):
+        return ParsedItem(str(text), None, None, None)
+    grams, pieces, unit = parse_quantity(text)
+    return ParsedItem(extract_food_name(text), grams, pieces, unit)
+
+
+def parse_items(texts):
+    """ParsedItem for each string, in order"""
+    return [parse_item(text) for text in texts]
+
+
+def parse_plan(plan):
+    """A {"Day N": {meal_time: [items]}} plan with every item string parsed into a ParsedItem"""
+    return {
+        day: {
+            meal_time: parse_items(items) if isinstance(items, list) else items
+            for meal_time, items in meals.items()
+        } if isinstance(meals, dict) else meals
+        for day, meals in plan.items()
+    }
+
+
+def meal_item_records(meals):
+    """One day's {meal_time: [items]} parsed into JSON-ready {meal_time: [{name, grams, pieces, unit}]}"""
+    if not isinstance(meals, dict):
+        return {}
+    return {
+        meal_time: [item._asdict() for item in parse_items(items)] if isinstance(items, list) else []
+        for meal_time, items in meals.items()
+    }
+
+
+def plan_item_records(plan):
+    """meal_item_records for every day of a plan; plan saves store them next to each day's meals"""
+    return {day: meal_item_records(meals) for day, meals in plan.items()}
+
+
 class AIDialPlanParser:
     """Service to parse AI-generated diet plan JSON and create database records"""
-    
-    def __init__(self):
-        self.quantity_patterns = [
-            (r'(\d+(?:\.\d+)?)\s*g', 'grams'),
-            (r'(\d+(?:\.\d+)?)\s*kg', 'kilograms'),
-            (r'(\d+)\s*pc[s]?', 'pieces'),
-            (r'(\d+)\s*cup[s]?', 'cups'),
-            (r'(\d+)\s*slice[s]?', 'slices'),
-            (r'(\d+)\s*tbsp', 'tablespoons'),
-            (r'(\d+)\s*tsp', 'teaspoons'),
-        ]
-    
+
     def parse_quantity(self, quantity_text):
         """Parse quantity text and return grams and pieces"""
-        quantity_grams = None
-        quantity_pieces = None
-        
-        # Convert to lowercase for easier parsing
-        text = quantity_text.lower().strip()
-        
-        for pattern, unit_type in self.quantity_patterns:
-            match = re.search(pattern, text)
-            if match:
-                value = float(match.group(1))
-                
-                if unit_type == 'grams':
-                    quantity_grams = value
-                elif unit_type == 'kilograms':
-                    quantity_grams = value * 1000
-                elif unit_type in ['pieces', 'slices']:
-                    quantity_pieces = int(value)
-                    # Estimate grams for common items
-                    if 'egg' in text:
-                        quantity_grams = value * 50  # Average egg ~50g
-                    elif 'roti' in text or 'bread' in text:
-                        quantity_grams = value * 40  # Average roti ~40g
-                    elif 'banana' in text:
-                        quantity_grams = value * 120  # Average banana ~120g
-                elif unit_type == 'cups':
-                    # Rough conversion - varies by ingredient
-                    if 'rice' in text:
-                        quantity_grams = value * 185  # 1 cup cooked rice ~185g
-                    elif 'tea' in text or 'coffee' in text:
-                        quantity_grams = value * 240  # 1 cup liquid ~240ml
-                    else:
-                        quantity_grams = value * 200  # Generic estimate
-                elif unit_type == 'tablespoons':
-                    quantity_grams = value * 15  # 1 tbsp ~15g
-                elif unit_type == 'teaspoons':
-                    quantity_grams = value * 5   # 1 tsp ~5g
-                
-                break
-        
-        return quantity_grams, quantity_pieces
-    
+        grams, pieces, _ = parse_quantity(quantity_text)
+        return grams, pieces
+
     def extract_food_name(self, food_item_text):
         """Extract clean food name from the AI text"""
-        # Split by colon to separate food name from quantity
-        if ':' in food_item_text:
-            food_name = food_item_text.split(':')[0].strip()
-        else:
-            # Try to remove quantity from the end
-            food_name = re.sub(r'\s*\d+.*$', '', food_item_text).strip()
-        
-        # Clean up common variations
-        food_name = food_name.replace('(', '').replace(')', '')
-        food_name = re.sub(r'\s+', ' ', food_name).strip()
-        
-        return food_name
-    
+        return extract_food_name(food_item_text)
+
     def find_matching_food(self, food_name):
         """Try to find a matching Food object in the database"""
         try:
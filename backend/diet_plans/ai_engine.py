@@ -1,14 +1,31 @@
-import random
+import logging
+import time
+import numpy as np
 from datetime import date, timedelta
-from .models import Food, DietPlan, Meal, MealFood, DietPlanProgress
+from django.db import transaction
+from nutrition.models import NutritionGoal
+from .eligibility import eligible_foods
+from .food_matrix import FoodMatrix
+from .meal_compositions import MAX_PORTION_GRAMS, MEAL_COMPOSITIONS, MIN_PORTION_GRAMS
+from .models import Food
+from .portion_optimizer import PortionOptimizer
+from .restrictions import get_matcher
+
+BULK_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
 
 class DietAIEngine:
     """AI Engine for generating personalized diet plans"""
     
-    def __init__(self, user):
+    def __init__(self, user, seed=None):
         self.user = user
         self.bmr = user.calculate_bmr()
         self.daily_calories = self.calculate_daily_calories()
+        self.rng = np.random.default_rng(seed)
+        self._food_matrix = None
+        self.persist_stats = None
     
     def calculate_daily_calories(self):
         """Calculate daily calorie needs based on goal"""
@@ -28,61 +45,116 @@ class DietAIEngine:
     
     def filter_foods_by_preferences(self):
         """Filter foods based on user preferences and restrictions"""
-        foods = Food.objects.all()
-        
-        # Filter by dietary restrictions
-        if 'vegetarian' in self.user.dietary_restrictions.lower():
-            foods = foods.filter(is_vegetarian=True)
-        if 'vegan' in self.user.dietary_restrictions.lower():
-            foods = foods.filter(is_vegan=True)
-        
-        # Filter by allergies
-        if self.user.allergies:
-            allergies = [a.strip().lower() for a in self.user.allergies.split(',')]
-            for allergy in allergies:
-                foods = foods.exclude(common_allergens__icontains=allergy)
-        
-        # Filter by disliked foods
-        if self.user.disliked_foods:
-            disliked = [f.strip().lower() for f in self.user.disliked_foods.split(',')]
-            for food in disliked:
-                foods = foods.exclude(name__icontains=food)
-        
-        return foods
+        return eligible_foods(Food.objects.all(), get_matcher(self.user))
     
-    def generate_meal_plan(self, meal_type, target_calories):
+    @property
+    def food_matrix(self):
+        """Eligible food catalog, loaded once per engine (i.e. once per plan)"""
+        if self._food_matrix is None:
+            self._food_matrix = FoodMatrix.catalog().for_user(get_matcher(self.user))
+        return self._food_matrix
+
+    def daily_macro_targets(self):
+        """Daily (calories, protein g, carbs g, fat g) from the user's NutritionGoal"""
+        goal = NutritionGoal.objects.filter(user=self.user).first()
+        if goal:
+            return (goal.daily_calorie_goal, goal.protein_goal_grams,
+                    goal.carbs_goal_grams, goal.fat_goal_grams)
+
+        # No goal set: 20% protein, 50% carbs, 30% fat of the daily calories
+        calories = self.daily_calories
+        return (calories, calories * 0.20 / 4, calories * 0.50 / 4, calories * 0.30 / 9)
+
+    def compose_meals(self, meal_types, target_calories, optimize_portions=False):
+        """
+        Pick foods and portions for many meals at once.
+
+        meal_types and target_calories are parallel sequences; returns one list of
+        {'food_id', 'name', 'quantity'} dicts per meal, in input order. Foods are
+        drawn per (meal type, category) with a single vectorized pick. Portions
+        come from each category's calorie share, or, with optimize_portions, from
+        one PortionOptimizer solve against the user's macro targets.
+        """
+        matrix = self.food_matrix
+        meal_types = np.asarray(meal_types, dtype=object)
+        target_calories = np.asarray(target_calories, dtype=np.float64)
+
+        # Padded (meal, food slot) layout; -1 marks an empty slot
+        width = max(len(composition) for composition in MEAL_COMPOSITIONS.values())
+        rows = np.full((len(meal_types), width), -1, dtype=np.int64)
+        grams = np.zeros((len(meal_types), width))
+
+        for meal_type in dict.fromkeys(meal_types):
+            positions = np.flatnonzero(meal_types == meal_type)
+            composition = MEAL_COMPOSITIONS.get(meal_type, MEAL_COMPOSITIONS['lunch'])
+
+            for slot, (category, percentage) in enumerate(composition.items()):
+                picked = matrix.pick(category, len(positions), self.rng)
+                if picked is None:
+                    continue
+                rows[positions, slot] = picked
+                grams[positions, slot] = matrix.portions_for_calories(
+                    picked, target_calories[positions] * percentage, MAX_PORTION_GRAMS
+                )
+
+        if optimize_portions and len(meal_types):
+            daily = np.asarray(self.daily_macro_targets(), dtype=np.float64)
+            shares = target_calories / self.daily_calories
+            optimizer = PortionOptimizer(matrix, max_grams=MAX_PORTION_GRAMS, min_grams=MIN_PORTION_GRAMS)
+            grams = optimizer.solve(rows, shares[:, None] * daily[None, :], initial=grams)
+
+        return [
+            [
+                {
+                    'food_id': int(matrix.ids[row]),
+                    'name': matrix.names[row],
+                    'quantity': float(quantity),
+                }
+                for row, quantity in zip(meal_rows, meal_grams) if row >= 0
+            ]
+            for meal_rows, meal_grams in zip(rows, grams)
+        ]
+
+    def generate_meal_plan(self, meal_type, target_calories, optimize_portions=False):
         """Generate a single meal plan"""
-        available_foods = self.filter_foods_by_preferences()
-        
-        # Meal composition guidelines
-        meal_compositions = {
-            'breakfast': {'proteins': 0.25, 'carbs': 0.45, 'fats': 0.15, 'fruits': 0.15},
-            'lunch': {'proteins': 0.30, 'carbs': 0.40, 'vegetables': 0.20, 'fats': 0.10},
-            'dinner': {'proteins': 0.35, 'carbs': 0.30, 'vegetables': 0.25, 'fats': 0.10},
-            'snack': {'fruits': 0.50, 'proteins': 0.30, 'fats': 0.20},
-            'suhoor': {'proteins': 0.30, 'carbs': 0.40, 'fruits': 0.20, 'fats': 0.10},
-            'iftar': {'fruits': 0.30, 'proteins': 0.25, 'carbs': 0.35, 'fats': 0.10},
-        }
-        
-        composition = meal_compositions.get(meal_type, meal_compositions['lunch'])
-        selected_foods = []
-        
-        for category, percentage in composition.items():
-            category_calories = target_calories * percentage
-            category_foods = available_foods.filter(category=category)
-            
-            if category_foods.exists():
-                food = random.choice(category_foods)
-                quantity_needed = (category_calories * 100) / food.calories_per_100g
-                selected_foods.append({
-                    'food': food,
-                    'quantity': min(quantity_needed, 500)  # Max 500g per food item
-                })
-        
-        return selected_foods
+        return self.compose_meals([meal_type], [target_calories], optimize_portions)[0]
     
-    def generate_30_day_plan(self, plan_type='regular'):
+    def generate_30_day_plan(self, plan_type='regular', optimize_portions=False):
         """Generate complete 30-day diet plan"""
+        # Generate meals for 30 days in one vectorized pass
+        meal_types = self.get_meal_types_for_plan(plan_type)
+        slots = [
+            (day, meal_type, self.daily_calories * calorie_percentage)
+            for day in range(1, 31)
+            for meal_type, calorie_percentage in meal_types.items()
+        ]
+        composed = self.compose_meals(
+            [slot[1] for slot in slots], [slot[2] for slot in slots], optimize_portions
+        )
+
+        diet_plan, self.persist_stats = self.persist_plan(plan_type, slots, composed)
+        logger.info(
+            f"Persisted diet plan {diet_plan.id}: {self.persist_stats['rows']} rows "
+            f"in {self.persist_stats['seconds']:.3f}s"
+        )
+        return diet_plan
+
+    @transaction.atomic
+    def persist_plan(self, plan_type, slots, composed):
+        """
+        Write a generated plan with a fixed number of statements.
+
+        All Meal and MealFood objects are built in memory and written with one
+        bulk_create each (split into BULK_BATCH_SIZE batches), inside a single
+        transaction. Returns the DietPlan and a stats dict with row counts and
+        elapsed seconds.
+        """
+        # The DietPlan models aren't part of this app yet; importing them here keeps
+        # meal composition usable without them
+        from .models import DietPlan, DietPlanProgress, Meal, MealFood
+
+        started = time.perf_counter()
+
         # Create diet plan
         diet_plan = DietPlan.objects.create(
             user=self.user,
@@ -93,36 +165,41 @@ class DietAIEngine:
             start_date=date.today(),
             end_date=date.today() + timedelta(days=30)
         )
-        
+
         # Create progress tracker
         DietPlanProgress.objects.create(diet_plan=diet_plan)
-        
-        # Generate meals for 30 days
-        meal_types = self.get_meal_types_for_plan(plan_type)
-        
-        for day in range(1, 31):
-            for meal_type, calorie_percentage in meal_types.items():
-                meal_calories = self.daily_calories * calorie_percentage
-                
-                # Create meal
-                meal = Meal.objects.create(
-                    diet_plan=diet_plan,
-                    day_number=day,
-                    meal_type=meal_type,
-                    name=f"Day {day} {meal_type.title()}",
-                    total_calories=meal_calories
-                )
-                
-                # Add foods to meal
-                meal_foods = self.generate_meal_plan(meal_type, meal_calories)
-                for food_data in meal_foods:
-                    MealFood.objects.create(
-                        meal=meal,
-                        food=food_data['food'],
-                        quantity_grams=food_data['quantity']
-                    )
-        
-        return diet_plan
+
+        meals = [
+            Meal(
+                diet_plan=diet_plan,
+                day_number=day,
+                meal_type=meal_type,
+                name=f"Day {day} {meal_type.title()}",
+                total_calories=meal_calories
+            )
+            for day, meal_type, meal_calories in slots
+        ]
+        # Primary keys are set on the objects by bulk_create (RETURNING)
+        meals = Meal.objects.bulk_create(meals, batch_size=BULK_BATCH_SIZE)
+
+        meal_foods = [
+            MealFood(
+                meal=meal,
+                food_id=food_data['food_id'],
+                quantity_grams=food_data['quantity']
+            )
+            for meal, meal_foods in zip(meals, composed)
+            for food_data in meal_foods
+        ]
+        MealFood.objects.bulk_create(meal_foods, batch_size=BULK_BATCH_SIZE)
+
+        stats = {
+            'meals': len(meals),
+            'meal_foods': len(meal_foods),
+            'rows': 2 + len(meals) + len(meal_foods),
+            'seconds': time.perf_counter() - started,
+        }
+        return diet_plan, stats
     
     def get_meal_types_for_plan(self, plan_type):
         """Get meal types and calorie distribution based on plan type"""
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DietPlansConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'diet_plans'
+
+    def ready(self):
+        from . import signals  # noqa: F401
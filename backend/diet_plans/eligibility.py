@@ -0,0 +1,111 @@
+"""
+Precomputed food eligibility bitmasks.
+
+Every Food carries an eligibility_mask combining the diets it satisfies and the
+allergen classes it contains. Preference filtering is a bitwise AND, in SQL
+(eligible_foods) or in process (FoodMatrix). Allergen classes are matched by
+substring, so "milk powder" or "wheat flour" still set their class bit, and every
+allergy is also checked as text against common_allergens, so an allergen the
+classes don't know about is never served.
+"""
+from django.db.models import F
+
+# Diet flags: set when the food satisfies the diet
+VEGETARIAN = 1 << 0
+VEGAN = 1 << 1
+HALAL = 1 << 2
+
+DIET_BITS = {
+    'vegetarian': VEGETARIAN,
+    'vegan': VEGAN,
+    'halal': HALAL,
+}
+
+# Allergen classes: set when the food contains the allergen. Each class lists the
+# words that name it in Food.common_allergens and in a user's allergies.
+ALLERGEN_CLASSES = {
+    'milk': ('milk', 'dairy', 'lactose', 'cheese', 'butter', 'cream', 'yogurt', 'ghee', 'casein', 'whey',
+             'paneer', 'curd'),
+    'egg': ('egg', 'eggs'),
+    'fish': ('fish',),
+    'shellfish': ('shellfish', 'shrimp', 'prawn', 'prawns', 'crab', 'lobster'),
+    'tree_nuts': ('tree nut', 'tree nuts', 'nuts', 'almond', 'cashew', 'walnut', 'pistachio'),
+    'peanut': ('peanut', 'peanuts', 'groundnut'),
+    'gluten': ('gluten', 'wheat', 'barley', 'rye', 'semolina', 'maida'),
+    'soy': ('soy', 'soya', 'soybean'),
+    'sesame': ('sesame',),
+}
+
+ALLERGEN_BITS = {name: 1 << (3 + index) for index, name in enumerate(ALLERGEN_CLASSES)}
+
+_ALLERGEN_WORDS = [
+    (word, ALLERGEN_BITS[name]) for name, words in ALLERGEN_CLASSES.items() for word in words
+]
+
+
+def allergen_bit(term):
+    """
+    Bits of every allergen class term mentions: a class word inside term
+    ("wheat flour" -> gluten) or term inside a class word ("nuts" -> peanut too).
+    0 if term names no known class.
+    """
+    term = term.strip().lower()
+    if not term:
+        return 0
+    mask = 0
+    for word, bit in _ALLERGEN_WORDS:
+        if word in term or (len(term) >= 3 and term in word):
+            mask |= bit
+    return mask
+
+
+def food_mask(is_vegetarian=False, is_vegan=False, is_halal=False, common_allergens=''):
+    """Eligibility bitmask for a food's diet flags and comma-separated allergens"""
+    mask = 0
+    if is_vegetarian:
+        mask |= VEGETARIAN
+    if is_vegan:
+        mask |= VEGAN
+    if is_halal:
+        mask |= HALAL
+    for allergen in (common_allergens or '').split(','):
+        mask |= allergen_bit(allergen)
+    return mask
+
+
+def user_requirements(matcher):
+    """
+    Translate a RestrictionMatcher into (required, checked, allergies).
+
+    A food is eligible when `mask & checked == required` and its common_allergens
+    mention none of the returned allergies. Every allergy is returned, including
+    those with a class bit, so foods whose allergens the classes miss are still
+    excluded.
+    """
+    required = 0
+    for diet, bit in DIET_BITS.items():
+        if matcher.has_restriction(diet):
+            required |= bit
+
+    forbidden = 0
+    for allergy in matcher.allergies:
+        forbidden |= allergen_bit(allergy)
+
+    return required, required | forbidden, list(matcher.allergies)
+
+
+def eligible_foods(queryset, matcher):
+    """Restrict a Food queryset to foods the matcher's user can eat"""
+    required, checked, allergies = user_requirements(matcher)
+    if checked:
+        queryset = queryset.alias(
+            eligibility_check=F('eligibility_mask').bitand(checked)
+        ).filter(eligibility_check=required)
+
+    for allergy in allergies:
+        queryset = queryset.exclude(common_allergens__icontains=allergy)
+
+    for food in matcher.dislikes:
+        queryset = queryset.exclude(name__icontains=food)
+
+    return queryset
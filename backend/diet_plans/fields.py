@@ -0,0 +1,69 @@
+"""
+Compressed JSON storage.
+
+Values are stored as one format byte followed by the compressed UTF-8 JSON:
+
+    0x01  zlib
+    0x02  zstd (needs the optional `zstandard` package)
+
+Rows load as the raw bytes and are only decompressed when the model asks for
+them (see decode_json), so listing or filtering plans never pays for decoding.
+"""
+import json
+import zlib
+from django.conf import settings
+from django.db import models
+
+try:
+    import zstandard
+except ImportError:  # zlib is always available
+    zstandard = None
+
+FORMAT_ZLIB = 1
+FORMAT_ZSTD = 2
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 10
+
+
+def encode_json(value, codec=None):
+    """Serialize value to JSON and compress it with the configured codec"""
+    raw = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    codec = codec or settings.PLAN_DATA_COMPRESSION
+    if codec == 'zstd' and zstandard is not None:
+        return bytes([FORMAT_ZSTD]) + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return bytes([FORMAT_ZLIB]) + zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decode_json(blob):
+    """Inverse of encode_json"""
+    blob = bytes(blob)
+    if not blob:
+        return None
+    version, payload = blob[0], blob[1:]
+    if version == FORMAT_ZLIB:
+        raw = zlib.decompress(payload)
+    elif version == FORMAT_ZSTD:
+        if zstandard is None:
+            raise ValueError("Data is zstd-compressed but the zstandard package is not installed")
+        raw = zstandard.ZstdDecompressor().decompress(payload)
+    else:
+        raise ValueError(f"Unknown compressed JSON format {version}")
+    return json.loads(raw)
+
+
+class CompressedJSONField(models.BinaryField):
+    """
+    JSON compressed into a binary column. Assign any JSON-serializable value; it
+    is encoded on save. Values read from the database stay bytes until passed
+    to decode_json.
+    """
+
+    def get_prep_value(self, value):
+        if value is None or isinstance(value, (bytes, bytearray, memoryview)):
+            return super().get_prep_value(value)
+        return super().get_prep_value(encode_json(value))
+
+    def from_db_value(self, value, expression, connection):
+        # Some backends return memoryview; keep plain bytes so instances pickle
+        return bytes(value) if value is not None else None
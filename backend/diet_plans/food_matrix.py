@@ -0,0 +1,131 @@
+import threading
+import time
+import numpy as np
+from .eligibility import user_requirements
+from .models import Food
+
+# Per-100g columns loaded into the matrix, in column order
+NUTRIENT_FIELDS = (
+    'calories_per_100g',
+    'protein_per_100g',
+    'carbs_per_100g',
+    'fat_per_100g',
+    'fiber_per_100g',
+)
+CALORIES, PROTEIN, CARBS, FAT, FIBER = range(len(NUTRIENT_FIELDS))
+
+# How long a process keeps the shared catalog before reloading it (Food edits in
+# this process invalidate it immediately through a signal)
+CATALOG_MAX_AGE = 300
+
+_catalog = None
+_catalog_loaded_at = 0.0
+_catalog_lock = threading.Lock()
+
+
+class FoodMatrix:
+    """Food catalog held in memory as a NumPy nutrient matrix.
+
+    Rows are foods, columns are NUTRIENT_FIELDS. Category and eligibility
+    masks let the engine pick foods and size portions with vectorized
+    operations instead of one queryset per meal category.
+    """
+
+    def __init__(self, ids, names, categories, nutrients, eligible=None, masks=None, allergens=None):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.names = list(names)
+        self.allergens = list(allergens) if allergens is not None else [''] * len(self.ids)
+        self.categories = np.asarray(categories, dtype=object)
+        self.nutrients = np.asarray(nutrients, dtype=np.float64).reshape(len(self.ids), len(NUTRIENT_FIELDS))
+        if masks is None:
+            masks = np.zeros(len(self.ids), dtype=np.int64)
+        self.masks = np.asarray(masks, dtype=np.int64)
+        if eligible is None:
+            eligible = np.ones(len(self.ids), dtype=bool)
+        # Foods without calories can't be sized from a calorie share
+        self.eligible = np.asarray(eligible, dtype=bool) & (self.nutrients[:, CALORIES] > 0)
+        self._category_indices = {}
+        self._lowered = {}
+
+    @classmethod
+    def load(cls):
+        """Load the whole catalog, with eligibility bitmasks, in one query"""
+        rows = list(Food.objects.order_by('id').values_list(
+            'id', 'name', 'category', 'eligibility_mask', 'common_allergens', *NUTRIENT_FIELDS
+        ))
+        if not rows:
+            return cls([], [], [], np.empty((0, len(NUTRIENT_FIELDS))))
+
+        ids, names, categories, masks, allergens = zip(*[row[:5] for row in rows])
+        nutrients = np.array([row[5:] for row in rows], dtype=np.float64)
+        return cls(ids, names, categories, nutrients, masks=masks, allergens=allergens)
+
+    @classmethod
+    def catalog(cls):
+        """Process-wide cached catalog, shared by every user's matrix"""
+        global _catalog, _catalog_loaded_at
+        with _catalog_lock:
+            if _catalog is None or time.monotonic() - _catalog_loaded_at > CATALOG_MAX_AGE:
+                _catalog = cls.load()
+                _catalog_loaded_at = time.monotonic()
+            return _catalog
+
+    @staticmethod
+    def invalidate_catalog():
+        global _catalog
+        with _catalog_lock:
+            _catalog = None
+
+    def for_user(self, matcher):
+        """
+        Copy of this matrix (sharing its arrays) whose eligibility mask is the
+        user's restrictions: a bitwise AND over the food masks, plus matcher passes
+        for disliked foods (over names) and every allergy (over common_allergens),
+        mirroring eligible_foods().
+        """
+        required, checked, allergies = user_requirements(matcher)
+        eligible = (self.masks & checked) == required
+        for allergy in allergies:
+            eligible &= np.char.find(self.lowered('allergens'), allergy) < 0
+        for food in matcher.dislikes:
+            eligible &= np.char.find(self.lowered('names'), food) < 0
+
+        matrix = FoodMatrix.__new__(FoodMatrix)
+        matrix.ids, matrix.names, matrix.categories = self.ids, self.names, self.categories
+        matrix.allergens = self.allergens
+        matrix._lowered = self._lowered
+        matrix.nutrients, matrix.masks = self.nutrients, self.masks
+        matrix.eligible = eligible & (self.nutrients[:, CALORIES] > 0)
+        matrix._category_indices = {}
+        return matrix
+
+    def lowered(self, attribute):
+        """Lowercased NumPy string array of a text column, built on first use"""
+        if attribute not in self._lowered:
+            self._lowered[attribute] = np.array([text.lower() for text in getattr(self, attribute)], dtype=str)
+        return self._lowered[attribute]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def category_mask(self, category):
+        """Boolean mask of eligible foods in a category"""
+        return (self.categories == category) & self.eligible
+
+    def category_indices(self, category):
+        """Row indices of eligible foods in a category (cached)"""
+        if category not in self._category_indices:
+            self._category_indices[category] = np.flatnonzero(self.category_mask(category))
+        return self._category_indices[category]
+
+    def pick(self, category, size, rng):
+        """Pick `size` random eligible rows from a category, or None if it is empty"""
+        indices = self.category_indices(category)
+        if not len(indices):
+            return None
+        return indices[rng.integers(0, len(indices), size=size)]
+
+    def portions_for_calories(self, rows, calories, max_grams):
+        """Grams of each food in `rows` needed to supply `calories`, capped at `max_grams`"""
+        grams = np.asarray(calories, dtype=np.float64) * 100 / self.nutrients[rows, CALORIES]
+        return np.minimum(grams, max_grams)
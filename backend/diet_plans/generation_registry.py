@@ -0,0 +1,91 @@
+"""
+In-flight registry for diet plan generation requests.
+
+A request is identified by (user, goal, meal_type). The first request claims
+the key with an atomic add (SET NX in Redis) and its Celery task id; repeated
+requests while that task runs get the same task id instead of a new task. A
+completed result stays reusable for DIET_PLAN_RESULT_REUSE_SECONDS.
+"""
+import uuid
+from celery.result import AsyncResult
+from django.conf import settings
+from django.core.cache import cache
+
+KEY_PREFIX = 'plan-generation'
+
+
+def request_key(user_id, goal, meal_type):
+    return f'{KEY_PREFIX}:{user_id}:{str(goal).strip().lower()}:{str(meal_type).strip().lower()}'
+
+
+def _inflight_key(key):
+    return f'{key}:task'
+
+
+def _result_key(key):
+    return f'{key}:result'
+
+
+def _owner_key(task_id):
+    return f'{KEY_PREFIX}:owner:{task_id}'
+
+
+def _inflight_timeout():
+    # Outlives the task's hard time limit, so a killed worker can't block the user forever
+    return settings.CELERY_TASK_TIME_LIMIT + 60
+
+
+def get_reusable_result(user_id, goal, meal_type):
+    """Result of a recently completed identical request, or None"""
+    return cache.get(_result_key(request_key(user_id, goal, meal_type)))
+
+
+def claim(user_id, goal, meal_type):
+    """
+    Return (task_id, created). created is True when the caller must dispatch the
+    task with this id; otherwise task_id belongs to the identical request in flight.
+    """
+    key = _inflight_key(request_key(user_id, goal, meal_type))
+    task_id = str(uuid.uuid4())
+    while not cache.add(key, task_id, timeout=_inflight_timeout()):
+        existing = cache.get(key)
+        if existing is None:
+            # Released between our add and get; try again
+            continue
+        if not AsyncResult(existing).ready():
+            return existing, False
+        # The task finished without releasing its claim (e.g. the worker died)
+        cache.delete(key)
+
+    cache.set(_owner_key(task_id), user_id, timeout=_inflight_timeout() + settings.DIET_PLAN_RESULT_REUSE_SECONDS)
+    return task_id, True
+
+
+def extend(user_id, goal, meal_type, task_id):
+    """
+    Restart the claim's timeout if task_id still holds it. The scheduler calls
+    this while the job waits and when it is dispatched, so a long queue doesn't
+    let the claim expire and a repeated request start a second job.
+    """
+    key = _inflight_key(request_key(user_id, goal, meal_type))
+    if cache.get(key) != task_id:
+        return False
+    cache.touch(key, _inflight_timeout())
+    cache.touch(_owner_key(task_id), _inflight_timeout() + settings.DIET_PLAN_RESULT_REUSE_SECONDS)
+    return True
+
+
+def owner_of(task_id):
+    return cache.get(_owner_key(task_id))
+
+
+def release(user_id, goal, meal_type):
+    cache.delete(_inflight_key(request_key(user_id, goal, meal_type)))
+
+
+def complete(user_id, goal, meal_type, result):
+    """Record a successful result for reuse and release the in-flight claim"""
+    key = request_key(user_id, goal, meal_type)
+    if settings.DIET_PLAN_RESULT_REUSE_SECONDS > 0:
+        cache.set(_result_key(key), result, timeout=settings.DIET_PLAN_RESULT_REUSE_SECONDS)
+    cache.delete(_inflight_key(key))
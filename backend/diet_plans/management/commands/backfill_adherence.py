@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from diet_plans.adherence import add_todo, save_summaries
+from diet_plans.models import DailyAdherence, ToDoList
+
+
+class Command(BaseCommand):
+    help = 'Rebuild DailyAdherence summaries from the ToDoList in one ordered pass'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--user', type=int, help='Only rebuild this user id')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        todos = ToDoList.objects.order_by('user_id', 'date_of_meal')
+        if options['user']:
+            todos = todos.filter(user_id=options['user'])
+        rows = todos.values_list('user_id', 'date_of_meal', 'meal_time', 'is_completed')
+
+        batch = []
+        summary = None
+        days = 0
+        for user_id, date_of_meal, meal_time, is_completed in rows.iterator(chunk_size=batch_size * 4):
+            if summary is None or (summary.user_id, summary.date) != (user_id, date_of_meal):
+                if len(batch) >= batch_size:
+                    save_summaries(batch, batch_size)
+                    days += len(batch)
+                    batch = []
+                summary = DailyAdherence(user_id=user_id, date=date_of_meal)
+                batch.append(summary)
+            add_todo(summary, meal_time, is_completed)
+
+        if batch:
+            save_summaries(batch, batch_size)
+            days += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {days} daily adherence rows"))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from diet_plans.models import GenerateMeal
+from services.save_data import save_plan_days
+
+
+class Command(BaseCommand):
+    help = 'Create GeneratedMealDay rows for plans saved before per-day storage existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        plans = days = 0
+        last_id = 0
+
+        while True:
+            batch = list(
+                GenerateMeal.objects.filter(id__gt=last_id, days__isnull=True)
+                .order_by('id')
+                .only('id', 'plan_blob', 'ai_generated_data')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            with transaction.atomic():
+                for plan in batch:
+                    try:
+                        plan_dict = plan.plan_data
+                    except ValueError as e:
+                        self.stderr.write(f"GenerateMeal {plan.id}: unreadable plan data ({e}), skipped")
+                        continue
+                    if isinstance(plan_dict, dict):
+                        days += save_plan_days(plan, plan_dict)
+                        plans += 1
+            self.stdout.write(f"Backfilled {plans} plans (up to id {last_id})")
+
+        self.stdout.write(self.style.SUCCESS(f"Created {days} day rows for {plans} plans"))
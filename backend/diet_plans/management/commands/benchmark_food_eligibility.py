@@ -0,0 +1,98 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from diet_plans.eligibility import ALLERGEN_CLASSES, eligible_foods
+from diet_plans.food_matrix import FoodMatrix
+from diet_plans.models import Food
+from diet_plans.restrictions import RestrictionMatcher
+
+
+NON_CANONICAL_ALLERGENS = ['milk powder', 'wheat flour', 'casein', 'peanut oil', 'soy lecithin', 'mustard']
+
+
+class Command(BaseCommand):
+    help = 'Compare chained-exclude preference filtering with the eligibility bitmask path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--foods', type=int, default=10000, help='Size of the synthetic catalog')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        # The synthetic catalog lives inside a transaction that is always rolled back
+        with transaction.atomic():
+            self.create_catalog(options['foods'], random.Random(options['seed']))
+            self.run(options['repeat'])
+            transaction.set_rollback(True)
+        FoodMatrix.invalidate_catalog()
+
+    def create_catalog(self, size, rng):
+        # Canonical class words plus the free-text variants real catalogs use
+        allergens = [words[0] for words in ALLERGEN_CLASSES.values()] + NON_CANONICAL_ALLERGENS
+        foods = []
+        for i in range(size):
+            vegan = rng.random() < 0.2
+            foods.append(Food(
+                name=f"benchmark food {i}",
+                calories_per_100g=rng.uniform(20, 600),
+                category=rng.choice(['proteins', 'carbs', 'fats', 'fruits', 'vegetables']),
+                is_vegan=vegan,
+                is_vegetarian=vegan or rng.random() < 0.3,
+                is_halal=rng.random() < 0.8,
+                common_allergens=', '.join(rng.sample(allergens, rng.randint(0, 2))),
+            ))
+        for food in foods:
+            food.eligibility_mask = food.compute_eligibility_mask()
+        Food.objects.bulk_create(foods, batch_size=1000)
+        self.stdout.write(f"Created {size} synthetic foods")
+
+    def run(self, repeat):
+        matcher = RestrictionMatcher(
+            allergies=['milk', 'peanut', 'shellfish'],
+            dietary_restrictions=['vegetarian', 'halal'],
+            dislikes=['food 13'],
+        )
+
+        def chained_exclude():
+            foods = Food.objects.all()
+            if matcher.has_restriction('vegetarian'):
+                foods = foods.filter(is_vegetarian=True)
+            if matcher.has_restriction('halal'):
+                foods = foods.filter(is_halal=True)
+            for allergy in matcher.allergies:
+                foods = foods.exclude(common_allergens__icontains=allergy)
+            for food in matcher.dislikes:
+                foods = foods.exclude(name__icontains=food)
+            return set(foods.values_list('id', flat=True))
+
+        def bitmask_sql():
+            return set(eligible_foods(Food.objects.all(), matcher).values_list('id', flat=True))
+
+        catalog = FoodMatrix.load()
+
+        def bitmask_in_process():
+            matrix = catalog.for_user(matcher)
+            return set(matrix.ids[matrix.eligible].tolist())
+
+        results = {}
+        for label, func in [
+            ('chained exclude (SQL)', chained_exclude),
+            ('bitmask (SQL)', bitmask_sql),
+            ('bitmask (in-process)', bitmask_in_process),
+        ]:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                results[label] = func()
+            elapsed = (time.perf_counter() - started) / repeat
+            self.stdout.write(f"{label:<24} {elapsed * 1000:8.2f} ms/query  {len(results[label])} eligible")
+
+        # The bitmask paths may exclude more (e.g. "casein" for a milk allergy), never less
+        chained = results['chained exclude (SQL)']
+        if results['bitmask (SQL)'] == results['bitmask (in-process)'] and results['bitmask (SQL)'] <= chained:
+            self.stdout.write(self.style.SUCCESS(
+                f"Bitmask paths agree and exclude everything the chained excludes do "
+                f"(plus {len(chained - results['bitmask (SQL)'])} foods matched by allergen class)"
+            ))
+        else:
+            self.stdout.write(self.style.WARNING('Paths disagree on the eligible set'))
@@ -0,0 +1,144 @@
+import random
+import re
+import time
+from django.core.management.base import BaseCommand
+from diet_plans.ai_diet_parser import parse_item, parse_plan
+from diet_plans.models import GeneratedMealDay
+from services.offline_diet_plan import generate_offline_meal_suggestions
+
+# The per-item parser this replaced: seven patterns tried in turn with re.search
+LEGACY_PATTERNS = [
+    (r'(\d+(?:\.\d+)?)\s*g', 'grams'),
+    (r'(\d+(?:\.\d+)?)\s*kg', 'kilograms'),
+    (r'(\d+)\s*pc[s]?', 'pieces'),
+    (r'(\d+)\s*cup[s]?', 'cups'),
+    (r'(\d+)\s*slice[s]?', 'slices'),
+    (r'(\d+)\s*tbsp', 'tablespoons'),
+    (r'(\d+)\s*tsp', 'teaspoons'),
+]
+
+# Quantity styles seen in model output, used to vary the generated plans
+QUANTITY_STYLES = ['{g}g', '{g} gm', '{n} pcs', '{n} cup', '{n} slices', '1 tbsp', '{g}g ({n} pcs)', '{kg} kg']
+
+
+def legacy_parse(text):
+    grams = pieces = None
+    lowered = text.lower().strip()
+    for pattern, unit in LEGACY_PATTERNS:
+        match = re.search(pattern, lowered)
+        if match:
+            value = float(match.group(1))
+            if unit == 'grams':
+                grams = value
+            elif unit == 'kilograms':
+                grams = value * 1000
+            elif unit in ['pieces', 'slices']:
+                pieces = int(value)
+                if 'egg' in lowered:
+                    grams = value * 50
+                elif 'roti' in lowered or 'bread' in lowered:
+                    grams = value * 40
+                elif 'banana' in lowered:
+                    grams = value * 120
+            elif unit == 'cups':
+                if 'rice' in lowered:
+                    grams = value * 185
+                elif 'tea' in lowered or 'coffee' in lowered:
+                    grams = value * 240
+                else:
+                    grams = value * 200
+            elif unit == 'tablespoons':
+                grams = value * 15
+            elif unit == 'teaspoons':
+                grams = value * 5
+            break
+
+    name = text.split(':')[0].strip() if ':' in text else re.sub(r'\s*\d+.*$', '', text).strip()
+    name = re.sub(r'\s+', ' ', name.replace('(', '').replace(')', '')).strip()
+    return name, grams, pieces
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the batch meal-text parser against the per-item regex loop on recorded plans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plans', type=int, default=20, help='Number of 30-day plans to parse')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--synthetic', action='store_true',
+                            help='Ignore saved plans and only use generated ones')
+
+    def handle(self, *args, **options):
+        plans = [] if options['synthetic'] else self.recorded_plans(options['plans'])
+        source = f"{len(plans)} saved"
+        if len(plans) < options['plans']:
+            generated = self.generated_plans(options['plans'] - len(plans), random.Random(options['seed']))
+            plans += generated
+            source += f", {len(generated)} generated"
+        if not plans:
+            self.stdout.write("No plans to parse")
+            return
+
+        items = [item for plan in plans for meals in plan.values() for meal in meals.values() for item in meal]
+        self.stdout.write(f"Plans: {len(plans)} ({source}), {len(items)} items, {len(set(items))} distinct")
+
+        legacy = self.time_it(lambda: [legacy_parse(item) for item in items], options['repeat'])
+        uncached = self.time_it(lambda: [parse_item.__wrapped__(item) for item in items], options['repeat'])
+        parse_item.cache_clear()
+        cold = self.time_it(lambda: [parse_plan(plan) for plan in plans], 1)
+        warm = self.time_it(lambda: [parse_plan(plan) for plan in plans], options['repeat'])
+
+        # Expected differences: the loop matched keywords anywhere in the text
+        # ("Steak" as tea, "Eggplant" as egg); the grammar matches whole words
+        differs = [item for item in items if legacy_parse(item) != tuple(parse_item(item))[:3]]
+        per_plan = 1000 / len(plans)
+        self.stdout.write(f"Per-item regex loop:   {legacy * per_plan:8.3f} ms/plan")
+        self.stdout.write(f"Grammar, no cache:     {uncached * per_plan:8.3f} ms/plan")
+        self.stdout.write(f"Batch parser (cold):   {cold * per_plan:8.3f} ms/plan")
+        self.stdout.write(self.style.SUCCESS(f"Batch parser (cached): {warm * per_plan:8.3f} ms/plan"))
+        self.stdout.write(f"Items parsed differently from the regex loop: {len(differs)}")
+        for item in sorted(set(differs))[:10]:
+            self.stdout.write(f"  {item!r}: {legacy_parse(item)[1:]} -> {tuple(parse_item(item))[1:3]}")
+
+    def time_it(self, run, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    def recorded_plans(self, count):
+        """The most recent saved plans, rebuilt from their day rows"""
+        plans = {}
+        days = (GeneratedMealDay.objects.order_by('-generated_meal_id', 'day')
+                .values_list('generated_meal_id', 'day', 'meals').iterator())
+        for plan_id, day, meals in days:
+            if plan_id not in plans:
+                if len(plans) == count:
+                    break
+                plans[plan_id] = {}
+            plans[plan_id][f'Day {day}'] = meals
+        return list(plans.values())
+
+    def generated_plans(self, count, rng):
+        """Offline-generator plans with their quantities rewritten in varied model-output styles"""
+        plans = []
+        for _ in range(count):
+            profile = {
+                'age': rng.randint(18, 70), 'weight': rng.randint(45, 120), 'height': rng.randint(150, 195),
+                'gender': rng.choice(['male', 'female']),
+                'goal': rng.choice(['weight loss', 'weight gain', 'maintenance']),
+            }
+            plan = generate_offline_meal_suggestions(profile)
+            for meals in plan.values():
+                for meal_time, items in meals.items():
+                    meals[meal_time] = [self.restyle(item, rng) for item in items]
+            plans.append(plan)
+        return plans
+
+    def restyle(self, item, rng):
+        name, _, quantity = item.partition(':')
+        grams = int(''.join(char for char in quantity if char.isdigit()) or 100)
+        style = rng.choice(QUANTITY_STYLES)
+        return f"{name}: " + style.format(g=grams, n=max(1, grams // 60), kg=grams / 1000)
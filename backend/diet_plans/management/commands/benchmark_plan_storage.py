@@ -0,0 +1,59 @@
+import json
+import statistics
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from diet_plans.fields import encode_json
+from diet_plans.models import GenerateMeal
+from services.offline_diet_plan import generate_offline_meal_suggestions
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare stored size and fetch+decode time of legacy JSON text and compressed plans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plans', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=200, help='Single-plan fetches to time')
+        parser.add_argument('--codec', choices=['zstd', 'zlib'], default=None)
+
+    def handle(self, *args, **options):
+        # Everything is created inside a transaction that is always rolled back
+        with transaction.atomic():
+            self.run(options['plans'], options['repeat'], options['codec'])
+            transaction.set_rollback(True)
+
+    def run(self, count, repeat, codec):
+        user = User.objects.create(username='plan-storage-benchmark', email='plan-storage-benchmark@example.com')
+        legacy, compressed = [], []
+        for i in range(count):
+            plan = generate_offline_meal_suggestions({'age': 20 + i % 50, 'weight_kg': 50 + i % 60, 'height_cm': 170})
+            legacy.append(GenerateMeal(user=user, meal_type='Regular', ai_generated_data=json.dumps(plan)))
+            compressed.append(GenerateMeal(user=user, meal_type='Regular', plan_blob=encode_json(plan, codec)))
+        # bulk_create skips save(), so rows are stored exactly as built above
+        legacy = GenerateMeal.objects.bulk_create(legacy)
+        compressed = GenerateMeal.objects.bulk_create(compressed)
+
+        text_bytes = sum(len(meal.ai_generated_data.encode()) for meal in legacy)
+        blob_bytes = sum(len(meal.plan_blob) for meal in compressed)
+        self.stdout.write(f"{count} plans: JSON text {text_bytes / count:.0f} B/plan, "
+                          f"compressed {blob_bytes / count:.0f} B/plan ({text_bytes / blob_bytes:.1f}x smaller)")
+
+        legacy_ids = [meal.id for meal in legacy]
+        compressed_ids = [meal.id for meal in compressed]
+        self.report('fetch + decode, JSON text', repeat, legacy_ids)
+        self.report('fetch + decode, compressed', repeat, compressed_ids)
+        self.report('fetch only, compressed (lazy)', repeat, compressed_ids, decode=False)
+
+    def report(self, label, repeat, ids, decode=True):
+        timings = []
+        for i in range(repeat):
+            started = time.perf_counter()
+            meal = GenerateMeal.objects.get(id=ids[i % len(ids)])
+            if decode:
+                meal.plan_data
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(f"{label:32} median {statistics.median(timings):.3f} ms, "
+                          f"p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:.3f} ms")
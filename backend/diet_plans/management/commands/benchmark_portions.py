@@ -0,0 +1,69 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from diet_plans.meal_compositions import MAX_PORTION_GRAMS, MEAL_COMPOSITIONS, MIN_PORTION_GRAMS
+from diet_plans.food_matrix import FoodMatrix, NUTRIENT_FIELDS
+from diet_plans.portion_optimizer import PortionOptimizer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the batched portion optimizer (plans per second and macro error)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plans', type=int, default=50, help='Number of 30-day plans to solve')
+        parser.add_argument('--foods', type=int, default=2000, help='Size of the synthetic food catalog')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        matrix = self.synthetic_matrix(options['foods'], rng)
+        optimizer = PortionOptimizer(matrix, max_grams=MAX_PORTION_GRAMS, min_grams=MIN_PORTION_GRAMS)
+
+        # One regular plan: 30 days x 4 meals, 2000 kcal / 100P / 250C / 65F per day
+        daily = np.array([2000, 100, 250, 65], dtype=np.float64)
+        plan = [('breakfast', 0.25), ('lunch', 0.35), ('dinner', 0.30), ('snack', 0.10)] * 30
+        targets = np.array([share * daily for _, share in plan])
+
+        baseline_error = optimized_error = 0.0
+        started = time.perf_counter()
+        for _ in range(options['plans']):
+            rows, grams = self.pick_plan(matrix, plan, targets[:, 0], rng)
+            solved = optimizer.solve(rows, targets, initial=grams)
+            baseline_error += self.macro_error(optimizer, rows, grams, targets)
+            optimized_error += self.macro_error(optimizer, rows, solved, targets)
+        elapsed = time.perf_counter() - started
+
+        plans = options['plans']
+        self.stdout.write(f"Plans solved: {plans} ({len(plan)} meals each, {len(matrix)} foods)")
+        self.stdout.write(f"Plans per second: {plans / elapsed:.1f}")
+        self.stdout.write(f"Mean relative macro error (calorie share): {baseline_error / plans:.3f}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Mean relative macro error (optimized):     {optimized_error / plans:.3f}"
+        ))
+
+    def synthetic_matrix(self, size, rng):
+        categories = np.array(['proteins', 'carbs', 'fats', 'fruits', 'vegetables'])[rng.integers(0, 5, size)]
+        nutrients = np.zeros((size, len(NUTRIENT_FIELDS)))
+        protein = rng.uniform(0, 30, size)
+        carbs = rng.uniform(0, 70, size)
+        fat = rng.uniform(0, 40, size)
+        nutrients[:, 0] = protein * 4 + carbs * 4 + fat * 9 + 1
+        nutrients[:, 1], nutrients[:, 2], nutrients[:, 3] = protein, carbs, fat
+        return FoodMatrix(np.arange(size), [f'food {i}' for i in range(size)], categories, nutrients)
+
+    def pick_plan(self, matrix, plan, calories, rng):
+        width = max(len(composition) for composition in MEAL_COMPOSITIONS.values())
+        rows = np.full((len(plan), width), -1, dtype=np.int64)
+        grams = np.zeros((len(plan), width))
+        for position, (meal_type, _) in enumerate(plan):
+            for slot, (category, percentage) in enumerate(MEAL_COMPOSITIONS[meal_type].items()):
+                picked = matrix.pick(category, 1, rng)
+                rows[position, slot] = picked[0]
+                grams[position, slot] = matrix.portions_for_calories(
+                    picked, calories[position] * percentage, MAX_PORTION_GRAMS
+                )[0]
+        return rows, grams
+
+    def macro_error(self, optimizer, rows, grams, targets):
+        totals = optimizer.totals(rows, grams)
+        return float(np.mean(np.abs(totals - targets) / targets))
@@ -0,0 +1,48 @@
+import json
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from diet_plans.fields import encode_json
+from diet_plans.models import GenerateMeal
+
+
+class Command(BaseCommand):
+    help = 'Move legacy GenerateMeal.ai_generated_data JSON text into the compressed plan_blob column'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        converted = skipped = 0
+        last_id = 0
+
+        while True:
+            # Keyset pagination: each batch is a short transaction and converted rows drop out
+            batch = list(
+                GenerateMeal.objects.filter(id__gt=last_id)
+                .exclude(ai_generated_data='')
+                .order_by('id')
+                .only('id', 'ai_generated_data')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            updated = []
+            for meal in batch:
+                try:
+                    data = json.loads(meal.ai_generated_data)
+                except ValueError:
+                    self.stderr.write(f"GenerateMeal {meal.id}: invalid JSON, left as is")
+                    skipped += 1
+                    continue
+                meal.plan_blob = encode_json(data)
+                meal.ai_generated_data = ''
+                updated.append(meal)
+
+            with transaction.atomic():
+                GenerateMeal.objects.bulk_update(updated, ['plan_blob', 'ai_generated_data'])
+            converted += len(updated)
+            self.stdout.write(f"Compressed {converted} plans (up to id {last_id})")
+
+        self.stdout.write(self.style.SUCCESS(f"Compressed {converted} plans, skipped {skipped}"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from diet_plans.food_matrix import FoodMatrix
+from diet_plans.models import Food
+
+
+class Command(BaseCommand):
+    help = 'Recompute Food.eligibility_mask (needed after bulk imports or queryset.update())'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        changed = []
+        for food in Food.objects.only(
+            'id', 'is_vegetarian', 'is_vegan', 'is_halal', 'common_allergens', 'eligibility_mask'
+        ).iterator(chunk_size=options['batch_size']):
+            mask = food.compute_eligibility_mask()
+            if mask != food.eligibility_mask:
+                food.eligibility_mask = mask
+                changed.append(food)
+
+        Food.objects.bulk_update(changed, ['eligibility_mask'], batch_size=options['batch_size'])
+        FoodMatrix.invalidate_catalog()
+        self.stdout.write(self.style.SUCCESS(f"Updated eligibility mask of {len(changed)} foods"))
@@ -0,0 +1,151 @@
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.management.base import BaseCommand
+from services.offline_diet_plan import generate_offline_meal_suggestions
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal', 'exponential')
+
+
+class LatencyModel:
+    """Samples response delays (seconds) from a distribution with a given mean and spread"""
+
+    def __init__(self, distribution, mean, spread, maximum, seed=None):
+        self.distribution = distribution
+        self.mean = mean
+        self.spread = spread
+        self.maximum = maximum
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sample(self):
+        with self.lock:
+            if self.distribution == 'fixed':
+                delay = self.mean
+            elif self.distribution == 'uniform':
+                delay = self.rng.uniform(self.mean - self.spread, self.mean + self.spread)
+            elif self.distribution == 'normal':
+                delay = self.rng.gauss(self.mean, self.spread)
+            elif self.distribution == 'exponential':
+                delay = self.rng.expovariate(1 / self.mean) if self.mean > 0 else 0.0
+            else:
+                # Log-normal with the requested mean and standard deviation
+                if self.mean <= 0:
+                    return 0.0
+                sigma2 = math.log(1 + (self.spread / self.mean) ** 2)
+                delay = self.rng.lognormvariate(math.log(self.mean) - sigma2 / 2, math.sqrt(sigma2))
+            return min(max(delay, 0.0), self.maximum)
+
+    def roll(self, rate):
+        with self.lock:
+            return self.rng.random() < rate
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """POST /plan returns a plan for the posted user_data; GET /stats returns request counters"""
+
+    server_version = 'DietPlanAIStub/1.0'
+
+    def do_GET(self):
+        if self.path.rstrip('/') != '/stats':
+            self.send_json(404, {'error': 'Not found'})
+            return
+        with self.server.stats_lock:
+            self.send_json(200, dict(self.server.stats))
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/plan':
+            self.send_json(404, {'error': 'Not found'})
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            user_data = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self.count('bad_request')
+            self.send_json(400, {'error': 'Request body must be JSON'})
+            return
+
+        model = self.server.latency
+        delay = model.sample()
+        time.sleep(delay)
+
+        if model.roll(self.server.error_rate):
+            self.count('errors')
+            self.send_json(503, {'error': 'Model overloaded'})
+        elif model.roll(self.server.malformed_rate):
+            self.count('malformed')
+            body = json.dumps(generate_offline_meal_suggestions(user_data)).encode()
+            self.send_body(200, body[:len(body) // 2])
+        else:
+            self.count('ok')
+            self.send_json(200, generate_offline_meal_suggestions(user_data))
+        self.server.stdout.write(f"POST /plan delay={delay:.2f}s")
+
+    def count(self, outcome):
+        with self.server.stats_lock:
+            self.server.stats['requests'] += 1
+            self.server.stats[outcome] += 1
+
+    def send_json(self, status, payload):
+        self.send_body(status, json.dumps(payload).encode())
+
+    def send_body(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Run a local stub of the AI plan service with configurable latency, errors and malformed JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency-distribution', choices=LATENCY_DISTRIBUTIONS, default='lognormal')
+        parser.add_argument('--latency-mean', type=float, default=5.0, help='Mean response delay in seconds')
+        parser.add_argument('--latency-spread', type=float, default=2.0,
+                            help='Standard deviation (normal, lognormal) or half-width (uniform) in seconds')
+        parser.add_argument('--latency-max', type=float, default=900.0, help='Cap on any single delay')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+        parser.add_argument('--malformed-rate', type=float, default=0.0,
+                            help='Fraction of requests answered with truncated JSON')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer((options['host'], options['port']), StubHandler)
+        server.daemon_threads = True
+        server.latency = LatencyModel(
+            options['latency_distribution'],
+            options['latency_mean'],
+            options['latency_spread'],
+            options['latency_max'],
+            seed=options['seed'],
+        )
+        server.error_rate = options['error_rate']
+        server.malformed_rate = options['malformed_rate']
+        server.stats = Counter(requests=0, ok=0, errors=0, malformed=0, bad_request=0)
+        server.stats_lock = threading.Lock()
+        server.stdout = self.stdout
+
+        self.stdout.write(
+            f"AI stub listening on http://{options['host']}:{server.server_port}/plan "
+            f"({options['latency_distribution']} latency, mean {options['latency_mean']}s, "
+            f"error rate {options['error_rate']}, malformed rate {options['malformed_rate']})"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Stopped. {dict(server.stats)}")
@@ -0,0 +1,12 @@
+# Meal composition guidelines (share of the meal's calories per food category)
+MEAL_COMPOSITIONS = {
+    'breakfast': {'proteins': 0.25, 'carbs': 0.45, 'fats': 0.15, 'fruits': 0.15},
+    'lunch': {'proteins': 0.30, 'carbs': 0.40, 'vegetables': 0.20, 'fats': 0.10},
+    'dinner': {'proteins': 0.35, 'carbs': 0.30, 'vegetables': 0.25, 'fats': 0.10},
+    'snack': {'fruits': 0.50, 'proteins': 0.30, 'fats': 0.20},
+    'suhoor': {'proteins': 0.30, 'carbs': 0.40, 'fruits': 0.20, 'fats': 0.10},
+    'iftar': {'fruits': 0.30, 'proteins': 0.25, 'carbs': 0.35, 'fats': 0.10},
+}
+
+MAX_PORTION_GRAMS = 500  # Max 500g per food item
+MIN_PORTION_GRAMS = 10  # Optimized portions never shrink a picked food below this
@@ -1,4 +1,6 @@
+from .eligibility import eligible_foods
 from .models import Food
+from .restrictions import get_matcher
 import random
 
 
@@ -20,29 +22,11 @@ class MealSuggestionEngine:
 
     def find_food_alternatives(self, original_food):
         """Find suitable alternatives for a specific food"""
-        # Find foods in same category with similar calories
-        similar_foods = Food.objects.filter(
+        # Find foods in same category with similar calories, within the user's restrictions
+        similar_foods = self.filter_foods_by_preferences().filter(
             category=original_food.category
         ).exclude(id=original_food.id)
         
-        # Apply user dietary restrictions
-        if 'vegetarian' in self.user.dietary_restrictions.lower():
-            similar_foods = similar_foods.filter(is_vegetarian=True)
-        if 'vegan' in self.user.dietary_restrictions.lower():
-            similar_foods = similar_foods.filter(is_vegan=True)
-        
-        # Filter by allergies
-        if self.user.allergies:
-            allergies = [a.strip().lower() for a in self.user.allergies.split(',')]
-            for allergy in allergies:
-                similar_foods = similar_foods.exclude(common_allergens__icontains=allergy)
-        
-        # Filter by disliked foods
-        if self.user.disliked_foods:
-            disliked = [f.strip().lower() for f in self.user.disliked_foods.split(',')]
-            for food in disliked:
-                similar_foods = similar_foods.exclude(name__icontains=food)
-        
         # Sort by calorie similarity
         calorie_range = 50  # +/- 50 calories
         alternatives = similar_foods.filter(
@@ -134,27 +118,7 @@ class MealSuggestionEngine:
     
     def filter_foods_by_preferences(self):
         """Filter foods based on user preferences"""
-        foods = Food.objects.all()
-        
-        # Apply dietary restrictions
-        if 'vegetarian' in self.user.dietary_restrictions.lower():
-            foods = foods.filter(is_vegetarian=True)
-        if 'vegan' in self.user.dietary_restrictions.lower():
-            foods = foods.filter(is_vegan=True)
-        
-        # Filter by allergies
-        if self.user.allergies:
-            allergies = [a.strip().lower() for a in self.user.allergies.split(',')]
-            for allergy in allergies:
-                foods = foods.exclude(common_allergens__icontains=allergy)
-        
-        # Filter by disliked foods
-        if self.user.disliked_foods:
-            disliked = [f.strip().lower() for f in self.user.disliked_foods.split(',')]
-            for food in disliked:
-                foods = foods.exclude(name__icontains=food)
-        
-        return foods
+        return eligible_foods(Food.objects.all(), get_matcher(self.user))
     
     def get_seasonal_suggestions(self, season):
         """Get seasonal food suggestions"""
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet_plans', '0006_alter_generatemeal_is_running'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='common_allergens',
+            field=models.CharField(blank=True, help_text='Comma-separated allergens (e.g., milk, egg, gluten)', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='eligibility_mask',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Diet/allergen bitmask, computed on save'),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='is_halal',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='is_vegan',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='food',
+            name='is_vegetarian',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:32
+
+import diet_plans.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet_plans', '0007_food_eligibility'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatemeal',
+            name='plan_blob',
+            field=diet_plans.fields.CompressedJSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='generatemeal',
+            name='ai_generated_data',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
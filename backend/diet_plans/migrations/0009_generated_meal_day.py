@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:33
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet_plans', '0008_generatemeal_plan_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeneratedMealDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('meals', models.JSONField(default=dict)),
+                ('generated_meal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='days', to='diet_plans.generatemeal')),
+            ],
+            options={
+                'ordering': ['generated_meal', 'day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='generatedmealday',
+            constraint=models.UniqueConstraint(fields=('generated_meal', 'day'), name='uniq_generated_meal_day'),
+        ),
+    ]
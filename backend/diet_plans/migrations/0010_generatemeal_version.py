@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet_plans', '0009_generated_meal_day'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatemeal',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text="Bumped on every change; part of the plan's ETag"),
+        ),
+    ]
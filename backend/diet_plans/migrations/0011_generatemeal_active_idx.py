@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet_plans', '0010_generatemeal_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='generatemeal',
+            index=models.Index(fields=['user', 'is_running', 'start_date', 'end_date'], name='generatemeal_active_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet_plans', '0011_generatemeal_active_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatemeal',
+            name='restrictions_key',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Digest of the restrictions the plan was last rewritten for', max_length=40),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('diet_plans', '0012_generatemeal_restrictions_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAdherence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('meals_planned', models.PositiveSmallIntegerField(default=0)),
+                ('meals_completed', models.PositiveSmallIntegerField(default=0)),
+                ('planned_mask', models.PositiveSmallIntegerField(default=0)),
+                ('completed_mask', models.PositiveSmallIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_adherence', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['user', 'date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyadherence',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='uniq_user_adherence_date'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+from diet_plans.eligibility import food_mask
+
+
+def recompute_masks(apps, schema_editor):
+    # Allergen classes are now matched by substring ("milk powder" sets the milk bit)
+    Food = apps.get_model('diet_plans', 'Food')
+    changed = []
+    for food in Food.objects.only(
+        'id', 'is_vegetarian', 'is_vegan', 'is_halal', 'common_allergens', 'eligibility_mask'
+    ).iterator(chunk_size=1000):
+        mask = food_mask(food.is_vegetarian, food.is_vegan, food.is_halal, food.common_allergens)
+        if mask != food.eligibility_mask:
+            food.eligibility_mask = mask
+            changed.append(food)
+    Food.objects.bulk_update(changed, ['eligibility_mask'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet_plans', '0013_daily_adherence'),
+    ]
+
+    operations = [
+        migrations.RunPython(recompute_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:11
+
+from django.db import migrations, models
+
+from diet_plans.ai_diet_parser import meal_item_records
+
+
+def parse_existing_days(apps, schema_editor):
+    # Day rows saved before parsing ran on save
+    GeneratedMealDay = apps.get_model('diet_plans', 'GeneratedMealDay')
+    batch = []
+    for day in GeneratedMealDay.objects.only('id', 'meals').iterator(chunk_size=1000):
+        day.items = meal_item_records(day.meals)
+        batch.append(day)
+        if len(batch) == 1000:
+            GeneratedMealDay.objects.bulk_update(batch, ['items'])
+            batch = []
+    GeneratedMealDay.objects.bulk_update(batch, ['items'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet_plans', '0014_recompute_food_eligibility'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedmealday',
+            name='items',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(parse_existing_days, migrations.RunPython.noop),
+    ]
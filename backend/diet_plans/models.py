@@ -5,6 +5,13 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 import json
 import logging
+from .ai_diet_parser import meal_item_records
+from .eligibility import food_mask
+from .fields import CompressedJSONField, decode_json
+from .restrictions import (
+    find_safe_replacement, get_matcher, load_substitutions, restrictions_key, rewrite_meals, rewrite_plan,
+    rewrite_todo_meal,
+)
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -20,153 +27,196 @@ class Food(models.Model):
     fiber_per_100g = models.FloatField(default=0, help_text="Fiber in grams per 100g")
     category = models.CharField(max_length=100, blank=True,
                                 help_text="Food category (e.g., vegetables, fruits, grains)")
+    is_vegetarian = models.BooleanField(default=False)
+    is_vegan = models.BooleanField(default=False)
+    is_halal = models.BooleanField(default=False)
+    common_allergens = models.CharField(max_length=255, blank=True,
+                                        help_text="Comma-separated allergens (e.g., milk, egg, gluten)")
+    eligibility_mask = models.PositiveIntegerField(default=0, editable=False,
+                                                   help_text="Diet/allergen bitmask, computed on save")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
+    def compute_eligibility_mask(self):
+        return food_mask(self.is_vegetarian, self.is_vegan, self.is_halal, self.common_allergens)
+
+    def save(self, *args, **kwargs):
+        self.eligibility_mask = self.compute_eligibility_mask()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'eligibility_mask' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['eligibility_mask']
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['name']
 
 
+class GenerateMealQuerySet(models.QuerySet):
+    def active_on(self, day=None):
+        """Plans whose date range contains day (default today)"""
+        day = day or timezone.now().date()
+        return self.filter(start_date__lte=day, end_date__gte=day)
+
+    def active_for(self, user, day=None):
+        """
+        The user's active plan on day, or None. If several plans cover the day,
+        the one marked as running wins, then the most recent one. One query,
+        served by the generatemeal_active_idx index.
+        """
+        return self.filter(user=user).active_on(day).order_by('-is_running', '-start_date').first()
+
+
 class GenerateMeal(models.Model):
     MEAL_TYPE_CHOICES = [('Regular', 'Regular'), ('Ramadan', 'Ramadan')]
     generated_at = models.DateTimeField(auto_now_add=True)
     meal_type = models.CharField(max_length=50, choices=MEAL_TYPE_CHOICES)
     start_date = models.DateField(blank=True, null=True)
     end_date = models.DateField(blank=True, null=True)
-    ai_generated_data = models.TextField()  # store the big dict as JSON
+    # Legacy uncompressed JSON; `manage.py compress_meal_plans` moves it to plan_blob
+    ai_generated_data = models.TextField(blank=True, default='')
+    plan_blob = CompressedJSONField(null=True, blank=True)  # the big dict, compressed
     is_running = models.BooleanField(default=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='generated_meals')
+    version = models.PositiveIntegerField(default=1, editable=False,
+                                          help_text="Bumped on every change; part of the plan's ETag")
+    restrictions_key = models.CharField(max_length=40, blank=True, default='', editable=False,
+                                        help_text="Digest of the restrictions the plan was last rewritten for")
+
+    objects = GenerateMealQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Active plan lookup: user equality, then is_running/start_date ordering
+            # with the date range checked from the index
+            models.Index(fields=['user', 'is_running', 'start_date', 'end_date'], name='generatemeal_active_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.meal_type} ({self.start_date} to {self.end_date})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded blob so save() can tell whether the plan was touched
+        instance._loaded_plan_blob = instance.__dict__.get('plan_blob')
+        return instance
+
+    def _plan_json(self):
+        return json.dumps(self.plan_blob, ensure_ascii=False, separators=(',', ':'))
+
+    def plan_changed(self):
+        """
+        True if the plan was assigned, or decoded and so possibly edited in
+        place, since the row was loaded; after a save, true only if the plan
+        differs from what was saved. Always True for unsaved plans.
+        """
+        if self.ai_generated_data:
+            return True
+        if self.plan_blob is not getattr(self, '_loaded_plan_blob', self):
+            return True
+        saved_json = getattr(self, '_saved_plan_json', None)
+        if isinstance(self.plan_blob, (dict, list)):
+            return saved_json is None or self._plan_json() != saved_json
+        return False
+
+    @property
+    def plan_data(self):
+        """The plan dict, decompressed on first access"""
+        if self.plan_blob is None:
+            return json.loads(self.ai_generated_data) if self.ai_generated_data else {}
+        if isinstance(self.plan_blob, (bytes, bytearray, memoryview)):
+            # Keep the decoded dict so in-place edits are saved
+            self.plan_blob = decode_json(self.plan_blob)
+        return self.plan_blob
+
+    @plan_data.setter
+    def plan_data(self, value):
+        self.plan_blob = value
+        self.ai_generated_data = ''
+
+    @property
+    def etag(self):
+        return f'"plan-{self.pk}-v{self.version}"'
+
+    def bump_version(self):
+        """Mark the plan as changed (invalidates cached responses and ETags)"""
+        GenerateMeal.objects.filter(pk=self.pk).update(version=models.F('version') + 1)
+        self.version += 1
+
+    def rewrite_rows(self, matcher=None):
+        """
+        Apply the owner's restrictions to the plan's day rows and to its to-dos
+        from today on (earlier ones are history). Returns the number of rows changed.
+        """
+        matcher = matcher or self.get_restriction_matcher()
+        if not matcher:
+            return 0
+
+        days = []
+        for day in self.days.all():
+            meals = rewrite_meals(day.meals, matcher)
+            if meals != day.meals:
+                day.meals = meals
+                day.items = meal_item_records(meals)
+                days.append(day)
+        GeneratedMealDay.objects.bulk_update(days, ['meals', 'items'], batch_size=500)
+
+        now = timezone.now()
+        todos = []
+        for todo in ToDoList.objects.filter(
+            user_id=self.user_id,
+            date_of_meal__gte=max(self.start_date, now.date()),
+            date_of_meal__lte=self.end_date,
+        ).only('id', 'meal'):
+            meal = rewrite_todo_meal(todo.meal, matcher)
+            if meal != todo.meal:
+                todo.meal, todo.updated_at = meal, now
+                todos.append(todo)
+        ToDoList.objects.bulk_update(todos, ['meal', 'updated_at'], batch_size=500)
+
+        if days:
+            # bulk_update sends no post_save, so bump the version here
+            self.bump_version()
+        return len(days) + len(todos)
+
+    def get_restriction_matcher(self):
+        """Compiled matcher for the plan owner's restrictions (cached per user)"""
+        return get_matcher(self.user)
+
     def get_user_restrictions(self):
         """Helper method to safely get user dietary restrictions"""
         try:
-            # Safely handle None values and empty strings
-            allergies = []
-            restrictions = []
-            dislikes = []
-
-            if hasattr(self.user, 'allergies') and self.user.allergies:
-                allergies = [a.strip().lower() for a in self.user.allergies.split(',') if a.strip()]
-
-            if hasattr(self.user, 'dietary_restrictions') and self.user.dietary_restrictions:
-                restrictions = [r.strip().lower() for r in self.user.dietary_restrictions.split(',') if r.strip()]
-
-            if hasattr(self.user, 'disliked_foods') and self.user.disliked_foods:
-                dislikes = [d.strip().lower() for d in self.user.disliked_foods.split(',') if d.strip()]
-
-            return set(allergies + restrictions + dislikes)
+            return set(self.get_restriction_matcher().terms)
         except Exception as e:
             logger.warning(f"Error getting user restrictions: {e}")
             return set()
 
     def get_replacement_map(self):
-        """Get replacement map with cascading replacement logic"""
-        base_replacement_map = {
-            "beef": "chicken",
-            "pork": "chicken",
-            "lamb": "chicken",
-            "shrimp": "tofu",
-            "fish": "chicken",  # Changed from egg to avoid circular dependency
-            "eggplant": "zucchini",
-            "peanut": "sunflower seeds",
-            "milk": "soy milk",
-            "egg": "tofu scramble",
-            "cheese": "vegan cheese",
-            "butter": "olive oil",
-            "cream": "coconut milk",
-        }
-        return base_replacement_map
-
-    def find_safe_replacement(self, restricted_item, restricted_items, replacement_map, max_depth=3):
-        """Find a safe replacement that isn't also restricted"""
-        if max_depth <= 0:
-            return "vegetables"  # Safe fallback
+        """Substitution rules (ingredient -> substitute) from substitutions.csv"""
+        return load_substitutions()
 
-        primary_replacement = replacement_map.get(restricted_item, "vegetables")
-
-        # Check if the replacement is also restricted
-        for restriction in restricted_items:
-            if restriction in primary_replacement.lower():
-                # The replacement is also restricted, try to find another one
-                return self.find_safe_replacement(restriction, restricted_items, replacement_map, max_depth - 1)
-
-        return primary_replacement
+    def find_safe_replacement(self, restricted_item, restricted_items, replacement_map=None, max_depth=None):
+        """Find a safe replacement that isn't also restricted"""
+        return find_safe_replacement(restricted_item, restricted_items, replacement_map, max_depth)
 
-    def replace_meal_item(self, meal_item, restricted_items, replacement_map):
+    def replace_meal_item(self, meal_item, matcher=None):
         """Replace a meal item if it contains restricted ingredients"""
         if not meal_item or not isinstance(meal_item, str):
             return meal_item
 
-        meal_lower = meal_item.lower()
-        replacement_made = False
-        result_meal = meal_item
-
-        # Check each restriction
-        for restricted in restricted_items:
-            if restricted in meal_lower:
-                # Find a safe replacement
-                safe_replacement = self.find_safe_replacement(restricted, restricted_items, replacement_map)
-
-                # Replace the restricted item in the meal name
-                result_meal = result_meal.replace(restricted, safe_replacement)
-                replacement_made = True
-
-                # Update meal_lower for subsequent checks
-                meal_lower = result_meal.lower()
-
-        return result_meal
+        matcher = matcher or self.get_restriction_matcher()
+        return matcher.rewrite(meal_item)
 
     def process_dietary_restrictions(self, data):
-        """Process dietary restrictions and modify meal data"""
+        """Copy of a {"Day N": {meal_time: [items]}} plan with restricted items replaced"""
         try:
             if not isinstance(data, dict):
                 logger.warning("AI generated data is not a dictionary")
                 return data
-
-            restricted_items = self.get_user_restrictions()
-            if not restricted_items:
-                return data  # No restrictions to process
-
-            replacement_map = self.get_replacement_map()
-
-            # Process each day's meals
-            days = data.get("days", [])
-            if not isinstance(days, list):
-                logger.warning("Days data is not a list")
-                return data
-
-            for day in days:
-                if not isinstance(day, dict):
-                    continue
-
-                meals = day.get("meals", [])
-                if not isinstance(meals, list):
-                    continue
-
-                # Replace meals
-                new_meals = []
-                for meal in meals:
-                    if isinstance(meal, str):
-                        replaced_meal = self.replace_meal_item(meal, restricted_items, replacement_map)
-                        new_meals.append(replaced_meal)
-                    elif isinstance(meal, dict):
-                        # Handle case where meal is a dictionary with details
-                        if 'name' in meal:
-                            meal['name'] = self.replace_meal_item(meal['name'], restricted_items, replacement_map)
-                        new_meals.append(meal)
-                    else:
-                        new_meals.append(meal)
-
-                day["meals"] = new_meals
-
-            return data
-
+            return rewrite_plan(data, self.get_restriction_matcher())
         except Exception as e:
             logger.error(f"Error processing dietary restrictions: {e}")
             return data  # Return original data if processing fails
@@ -178,46 +228,68 @@ class GenerateMeal(models.Model):
         if not self.end_date:
             self.end_date = self.start_date + timedelta(days=29)
 
-        # process dietary restrictions and modify ai_generated_data
-        if self.ai_generated_data:
-            data = json.loads(self.ai_generated_data)
-
-            # Collect restrictions
-            allergies = [a.strip().lower() for a in (self.user.allergies or "").split(',') if a]
-            restrictions = [r.strip().lower() for r in (self.user.dietary_restrictions or "").split(',') if r]
-            dislikes = [d.strip().lower() for d in (self.user.disliked_foods or "").split(',') if d]
-
-            # Replacement map (could be moved to settings or a config file)
-            replacement_map = {
-                "beef": "chicken",  # Hindus / no beef
-                "pork": "chicken",  # Muslims / Jewish dietary law
-                "eggplant": "zucchini",  # allergy or dislike
-                "peanut": "sunflower seeds",
-                "shrimp": "tofu",
-                "lamb": "turkey",
-                "fish": "mushroom",
-                "milk": "soy milk",
-                "egg": "tofu scramble"
-            }
-
-            restricted_items = set(allergies + restrictions + dislikes)
-
-            def replace_item(item):
-                for restricted in restricted_items:
-                    if restricted in item.lower():
-                        return replacement_map.get(restricted, "vegetables")
-                return item
-
-            # Assume ai_generated_data is a dict like { "days": [ { "meals": ["beef curry", "eggplant stew"] } ] }
-            if isinstance(data, dict):
-                for day in data.get("days", []):
-                    meals = day.get("meals", [])
-                    new_meals = [replace_item(meal) for meal in meals]
-                    day["meals"] = new_meals
-
-            self.ai_generated_data = json.dumps(data)
+        plan_fields = {'plan_blob', 'ai_generated_data'}
+        update_fields = kwargs.get('update_fields')
+        touches_plan = update_fields is None or plan_fields & set(update_fields)
+        restrictions_changed = False
+        if touches_plan and not plan_fields & self.get_deferred_fields():
+            restrictions_changed = self._apply_restrictions()
+            if update_fields is not None:
+                kwargs['update_fields'] = update_fields = set(update_fields) | plan_fields | {'restrictions_key'}
+
+        # Bump in the database so concurrent saves of a stale copy can't reuse a version
+        bumped = not self._state.adding
+        if bumped:
+            self.version = models.F('version') + 1
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'version'}
 
         super().save(*args, **kwargs)
+        if bumped:
+            self.refresh_from_db(fields=['version'])
+        self._loaded_plan_blob = self.plan_blob
+        self._saved_plan_json = self._plan_json() if isinstance(self.plan_blob, (dict, list)) else None
+        if bumped and restrictions_changed:
+            # The day rows and to-dos were written for the old restrictions
+            self.rewrite_rows()
+
+    def _apply_restrictions(self):
+        """
+        Rewrite restricted items in the plan, but only if the plan changed or the
+        owner's restrictions differ from the ones it was last rewritten for, so
+        saves that just flip is_running or dates never decode the blob.
+        Returns True if the owner's restrictions changed.
+        """
+        key = restrictions_key(self.user)
+        restrictions_changed = key != self.restrictions_key
+        if not self.plan_changed() and not restrictions_changed:
+            return False
+
+        # Plans assigned as JSON text are stored compressed
+        if self.ai_generated_data:
+            self.plan_data = json.loads(self.ai_generated_data)
+        if self.plan_blob is not None and key:
+            self.plan_blob = self.process_dietary_restrictions(self.plan_data)
+        self.restrictions_key = key
+        return restrictions_changed
+
+
+class GeneratedMealDay(models.Model):
+    """One day of a GenerateMeal plan; the plan's blob is kept for audit only"""
+    generated_meal = models.ForeignKey(GenerateMeal, on_delete=models.CASCADE, related_name='days')
+    day = models.PositiveSmallIntegerField(validators=[MinValueValidator(1)])
+    meals = models.JSONField(default=dict)  # {"Breakfast": [...], "Lunch": [...], ...}
+    # The meals parsed at save time: {"Breakfast": [{"name", "grams", "pieces", "unit"}], ...}
+    items = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        ordering = ['generated_meal', 'day']
+        constraints = [
+            models.UniqueConstraint(fields=['generated_meal', 'day'], name='uniq_generated_meal_day')
+        ]
+
+    def __str__(self):
+        return f"{self.generated_meal_id} • Day {self.day}"
 
 
 class ToDoList(models.Model):
@@ -243,6 +315,40 @@ class ToDoList(models.Model):
     def __str__(self):
         return f"{self.user.get_full_name() or self.user.username} • {self.date_of_meal} • {self.meal_time} • {'Done' if self.is_completed else 'Pending'}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded date so moving a row to another day refreshes both days
+        instance._loaded_date_of_meal = instance.__dict__.get('date_of_meal')
+        return instance
+
+
+class DailyAdherence(models.Model):
+    """
+    Per-user, per-day summary of the ToDoList, kept current by diet_plans.adherence
+    whenever to-do rows are written. Bit i of the masks is ToDoList.MEAL_TIME_CHOICES[i].
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_adherence')
+    date = models.DateField()
+    meals_planned = models.PositiveSmallIntegerField(default=0)
+    meals_completed = models.PositiveSmallIntegerField(default=0)
+    planned_mask = models.PositiveSmallIntegerField(default=0)
+    completed_mask = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['user', 'date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='uniq_user_adherence_date')
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} • {self.date} • {self.meals_completed}/{self.meals_planned}"
+
+    @property
+    def is_complete(self):
+        return bool(self.meals_planned) and self.completed_mask == self.planned_mask
+
 
 class UserMealProfile(models.Model):
     GOAL_CHOICES = [
@@ -0,0 +1,115 @@
+"""
+Profile-bucketed cache of AI-generated plans.
+
+Users with the same goal, gender, activity level, restrictions and medical
+conditions, and an age/height/weight in the same bucket, get the same plan from
+the AI. The raw plan is cached in the configured Redis cache under a key derived
+from that bucket (TTL from PLAN_CACHE_TTL); a sorted-set index of last access
+times keeps at most PLAN_CACHE_MAX_ENTRIES plans by evicting the least recently
+used ones.
+"""
+import hashlib
+import json
+import logging
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'plan-cache'
+LRU_INDEX_KEY = f'{KEY_PREFIX}:lru'
+HITS_KEY = f'{KEY_PREFIX}:hits'
+MISSES_KEY = f'{KEY_PREFIX}:misses'
+
+
+def _bucket(value, width):
+    if value is None:
+        return None
+    return int(float(value) // width)
+
+
+def _terms(values):
+    return sorted({str(value).strip().lower() for value in values or [] if str(value).strip()})
+
+
+def profile_bucket(user_data):
+    """Normalized profile bucket for the user_data passed to the AI"""
+    widths = settings.PLAN_CACHE_BUCKETS
+    return {
+        'goal': user_data.get('goal'),
+        'gender': user_data.get('gender'),
+        'activity_level': user_data.get('activity_level'),
+        'age': _bucket(user_data.get('age'), widths['age']),
+        'height_cm': _bucket(user_data.get('height_cm'), widths['height_cm']),
+        'weight_kg': _bucket(user_data.get('weight_kg'), widths['weight_kg']),
+        'medical_conditions': _terms(user_data.get('medical_conditions')),
+        'food_restrictions': _terms(user_data.get('food_restrictions')),
+        'dietary_restrictions': _terms(user_data.get('dietary_restrictions')),
+        'food_preferences': _terms(user_data.get('food_preferences')),
+    }
+
+
+def bucket_key(user_data):
+    payload = json.dumps(profile_bucket(user_data), sort_keys=True)
+    return f'{KEY_PREFIX}:{hashlib.sha1(payload.encode()).hexdigest()}'
+
+
+def _lru_index():
+    """Raw Redis client and index key, or (None, None) if the cache isn't Redis"""
+    try:
+        return get_redis_connection('default'), cache.make_key(LRU_INDEX_KEY)
+    except NotImplementedError:
+        return None, None
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def get_cached_plan(user_data):
+    """Return (plan, generation_seconds) for the user's bucket, or None on a miss"""
+    if not settings.PLAN_CACHE_ENABLED:
+        return None
+
+    key = bucket_key(user_data)
+    entry = cache.get(key)
+    _count(HITS_KEY if entry else MISSES_KEY)
+    if not entry:
+        return None
+
+    client, index_key = _lru_index()
+    if client is not None:
+        client.zadd(index_key, {key: time.time()})
+    return entry['plan'], entry['generation_seconds']
+
+
+def store_plan(user_data, plan, generation_seconds):
+    """Cache a freshly generated plan for the user's bucket, evicting LRU entries over the limit"""
+    if not settings.PLAN_CACHE_ENABLED:
+        return
+
+    key = bucket_key(user_data)
+    cache.set(key, {'plan': plan, 'generation_seconds': generation_seconds}, timeout=settings.PLAN_CACHE_TTL)
+
+    client, index_key = _lru_index()
+    if client is None:
+        return
+    client.zadd(index_key, {key: time.time()})
+    overflow = client.zcard(index_key) - settings.PLAN_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        evicted = [member.decode() for member, _ in client.zpopmin(index_key, overflow)]
+        cache.delete_many(evicted)
+        logger.info(f"Evicted {len(evicted)} least recently used cached plans")
+
+
+def cache_stats():
+    """Lifetime hit/miss counters"""
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else 0.0}
@@ -0,0 +1,113 @@
+"""
+Precomputed running-meal-plan responses.
+
+The response body only depends on the plan's days and dates, so it is built
+once per plan version and kept in the default cache. The version is bumped by
+every plan or day change, which makes older entries unreachable; they expire
+after RUNNING_PLAN_CACHE_TTL.
+"""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from .ai_diet_parser import plan_item_records
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'running-plan'
+
+
+def _window(first_day, last_day):
+    return '' if first_day is None else f':d{first_day}-{last_day}'
+
+
+def response_key(meal_plan, first_day=None, last_day=None):
+    return f'{KEY_PREFIX}:{meal_plan.pk}:v{meal_plan.version}{_window(first_day, last_day)}'
+
+
+def etag(meal_plan, first_day=None, last_day=None):
+    """Strong ETag of the plan version, or of a day window of it"""
+    if first_day is None:
+        return meal_plan.etag
+    return f'"plan-{meal_plan.pk}-v{meal_plan.version}-d{first_day}-{last_day}"'
+
+
+def day_window(meal_plan, from_date=None, to_date=None):
+    """Plan day numbers (first, last) covering the dates from_date..to_date, clipped to the plan"""
+    plan_days = (meal_plan.end_date - meal_plan.start_date).days + 1
+    first = (from_date - meal_plan.start_date).days + 1 if from_date else 1
+    last = (to_date - meal_plan.start_date).days + 1 if to_date else plan_days
+    return max(first, 1), min(last, plan_days)
+
+
+def build_running_plan(meal_plan, first_day=None, last_day=None):
+    """Response body of running-meal-plan for a plan, optionally only days first_day..last_day"""
+    # Per-day rows; plans saved before they existed fall back to the blob
+    rows = meal_plan.days.all()
+    if first_day is not None:
+        rows = rows.filter(day__range=(first_day, last_day))
+    days = list(rows.values_list('day', 'meals', 'items'))
+    if not days and not meal_plan.days.exists():
+        plan = meal_plan.plan_data
+        items = plan_item_records(plan)
+        days = sorted(
+            ((int(day_key.split(' ')[1]), meals, items[day_key])
+             for day_key, meals in plan.items() if day_key.startswith('Day ')),
+            key=lambda day: day[0]
+        )
+        if first_day is not None:
+            days = [day for day in days if first_day <= day[0] <= last_day]
+
+    # Convert to the format expected by frontend
+    daily_plans = []
+    for day_number, meals, items in days:
+        # Calculate the date for this day
+        day_date = meal_plan.start_date + timedelta(days=day_number - 1)
+
+        daily_plans.append({
+            'day': day_number,
+            'date': day_date.strftime('%Y-%m-%d'),
+            'breakfast': meals.get('Breakfast', [''])[0],
+            'lunch': meals.get('Lunch', [''])[0],
+            'dinner': meals.get('Dinner', [''])[0],
+            'snacks': meals.get('Snacks', [''])[0],
+            # Parsed name and quantity of every item, by meal time
+            'items': items,
+        })
+
+    # Days come ordered by day number
+    return {
+        'id': meal_plan.id,
+        'daily_plans': daily_plans,
+        'start_date': meal_plan.start_date.strftime('%Y-%m-%d'),
+        'end_date': meal_plan.end_date.strftime('%Y-%m-%d'),
+        'meal_type': meal_plan.meal_type
+    }
+
+
+def get_running_plan(meal_plan, first_day=None, last_day=None):
+    """Cached response body for the plan's current version (and day window)"""
+    key = response_key(meal_plan, first_day, last_day)
+    try:
+        data = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Running plan cache lookup failed: {e}")
+        data = None
+    if data is not None:
+        return data
+
+    data = build_running_plan(meal_plan, first_day, last_day)
+    try:
+        cache.set(key, data, timeout=settings.RUNNING_PLAN_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"Could not cache running plan response: {e}")
+    return data
+
+
+def etag_matches(request, etag):
+    """True if the request's If-None-Match lists etag (or *)"""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
@@ -0,0 +1,71 @@
+import numpy as np
+from .food_matrix import CALORIES, PROTEIN, CARBS, FAT
+
+# Columns of the food matrix the optimizer balances, in target order
+TARGET_COLUMNS = (CALORIES, PROTEIN, CARBS, FAT)
+
+
+class PortionOptimizer:
+    """
+    Size the portions of many meals in one batched solve.
+
+    Each meal is a bounded least-squares problem: find grams x (min_grams <= x <= max_grams)
+    for its foods so that the meal's calories, protein, carbs and fat are as close
+    as possible to its targets, with errors measured relative to each target. All
+    meals are padded to the same number of foods and solved together with a fixed
+    number of accelerated projected-gradient steps, so the result only depends on
+    the inputs.
+    """
+
+    def __init__(self, matrix, max_grams=500, iterations=300, min_grams=0):
+        self.matrix = matrix
+        self.max_grams = max_grams
+        # Above 0, every picked food stays in its meal instead of being sized away
+        self.min_grams = min_grams
+        self.iterations = iterations
+
+    def solve(self, rows, targets, initial=None):
+        """
+        rows: (n_meals, n_foods) matrix row indices, -1 for padding
+        targets: (n_meals, 4) calories, protein, carbs and fat per meal
+        initial: optional (n_meals, n_foods) starting grams
+        Returns (n_meals, n_foods) grams, 0 for padding.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.float64)
+        present = rows >= 0
+
+        # A[m, j, f]: nutrient j supplied by one gram of food f in meal m, scaled by 1/target
+        per_gram = self.matrix.nutrients[np.where(present, rows, 0)][:, :, TARGET_COLUMNS] / 100
+        per_gram = per_gram * present[:, :, None]
+        scale = 1 / np.maximum(targets, 1e-6)
+        A = np.transpose(per_gram, (0, 2, 1)) * scale[:, :, None]
+        b = np.ones_like(targets)
+
+        AtA = A.transpose(0, 2, 1) @ A
+        Atb = np.einsum('mjf,mj->mf', A, b)
+        # Per-meal Lipschitz constant of the gradient
+        lipschitz = np.linalg.eigvalsh(AtA)[:, -1]
+        step = 1 / np.maximum(lipschitz, 1e-12)
+
+        if initial is None:
+            x = np.full(rows.shape, float(self.min_grams)) * present
+        else:
+            x = np.clip(np.asarray(initial, dtype=np.float64), self.min_grams, self.max_grams) * present
+        y, t = x.copy(), 1.0
+
+        for _ in range(self.iterations):
+            gradient = np.einsum('mfg,mg->mf', AtA, y) - Atb
+            x_next = np.clip(y - step[:, None] * gradient, self.min_grams, self.max_grams) * present
+            t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+            y = x_next + ((t - 1) / t_next) * (x_next - x)
+            x, t = x_next, t_next
+
+        return x
+
+    def totals(self, rows, grams):
+        """(n_meals, 4) calories, protein, carbs and fat delivered by the given portions"""
+        rows = np.asarray(rows, dtype=np.int64)
+        present = rows >= 0
+        per_gram = self.matrix.nutrients[np.where(present, rows, 0)][:, :, TARGET_COLUMNS] / 100
+        return np.einsum('mfj,mf->mj', per_gram, np.asarray(grams) * present)
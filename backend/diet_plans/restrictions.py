@@ -0,0 +1,292 @@
+"""
+Compiled per-user dietary restriction matching.
+
+A user's allergies, dietary restrictions and disliked foods are parsed once into
+a RestrictionMatcher: an Aho-Corasick automaton over every restricted term plus
+the resolved safe replacement for each term. Plan rewriting and food filtering
+then make a single linear pass over each text instead of scanning every term
+against every item.
+
+Substitution rules live in substitutions.csv (ingredient -> substitute). For a
+set of restricted terms the rule graph is resolved once into a table of final
+safe substitutes (replacement_table), so rewriting an item is a dict lookup
+per match however many rules there are.
+"""
+import csv
+import hashlib
+import json
+import threading
+from collections import OrderedDict, deque
+from functools import lru_cache
+from pathlib import Path
+
+SUBSTITUTIONS_CSV = Path(__file__).resolve().parent / 'substitutions.csv'
+FALLBACK_REPLACEMENT = "vegetables"
+MATCHER_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=None)
+def load_substitutions():
+    """Substitution rules from substitutions.csv as {ingredient: substitute}"""
+    rules = {}
+    with open(SUBSTITUTIONS_CSV, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            ingredient = (row.get('ingredient') or '').strip().lower()
+            substitute = (row.get('substitute') or '').strip()
+            if ingredient and substitute:
+                rules[ingredient] = substitute
+    return rules
+
+
+def parse_terms(value):
+    """Split a comma-separated profile field into lowercase terms ('none' means no terms)"""
+    if not value or value.strip().lower() == 'none':
+        return []
+    return [term.strip().lower() for term in value.split(',') if term.strip()]
+
+
+def resolve_replacements(terms, replacement_map):
+    """
+    Final safe substitute for each restricted term.
+
+    A term's substitute is safe when it mentions no restricted term. Otherwise
+    the chain continues from the first restricted term it mentions, so
+    egg -> "tofu scramble" -> tofu's substitute when tofu is restricted too.
+    Chains without a rule, or that come back to a term already on the chain,
+    end at FALLBACK_REPLACEMENT. Each term is resolved once; chains that join
+    reuse the part already resolved.
+    """
+    terms = list(dict.fromkeys(terms))
+    automaton = AhoCorasick(terms)
+    resolved = {}
+
+    for term in terms:
+        chain = []
+        on_chain = set()
+        current = term
+        while current not in resolved:
+            if current in on_chain:
+                # Cycle: every term on it would only lead to another restricted term
+                resolved[current] = FALLBACK_REPLACEMENT
+                break
+            chain.append(current)
+            on_chain.add(current)
+            substitute = replacement_map.get(current)
+            if substitute is None:
+                resolved[current] = FALLBACK_REPLACEMENT
+                break
+            hit = min(automaton.find_all(substitute.lower()), key=lambda m: (m[0], -m[1]), default=None)
+            if hit is None:
+                resolved[current] = substitute
+                break
+            current = hit[2]
+        answer = resolved[current]
+        for link in chain:
+            resolved[link] = answer
+
+    return {term: resolved[term] for term in terms}
+
+
+@lru_cache(maxsize=MATCHER_CACHE_SIZE)
+def replacement_table(terms):
+    """resolve_replacements over the substitutions.csv rules, memoized per restriction set"""
+    return resolve_replacements(terms, load_substitutions())
+
+
+def find_safe_replacement(restricted_item, restricted_items, replacement_map=None, max_depth=None):
+    """Find a safe replacement that isn't also restricted (max_depth is ignored; cycles are detected)"""
+    if replacement_map is None:
+        terms = tuple(sorted(set(restricted_items) | {restricted_item}))
+        return replacement_table(terms)[restricted_item]
+    terms = [restricted_item] + [item for item in restricted_items if item != restricted_item]
+    return resolve_replacements(terms, replacement_map)[restricted_item]
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton reporting every occurrence of a fixed set of terms"""
+
+    def __init__(self, terms):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+
+        for term in terms:
+            state = 0
+            for char in term:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state] = self.output[state] + (term,)
+
+        # Breadth-first construction of failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                if self.fail[child] == child:
+                    self.fail[child] = 0
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find_all(self, text):
+        """Yield (start, end, term) for every occurrence of every term in text"""
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for term in output[state]:
+                yield index - len(term) + 1, index + 1, term
+
+
+class RestrictionMatcher:
+    """A user's restricted terms compiled into one automaton with resolved replacements"""
+
+    def __init__(self, allergies=(), dietary_restrictions=(), dislikes=(), replacement_map=None):
+        self.allergies = list(allergies)
+        self.dietary_restrictions = list(dietary_restrictions)
+        self.dislikes = list(dislikes)
+        self.terms = list(dict.fromkeys(self.allergies + self.dietary_restrictions + self.dislikes))
+
+        if replacement_map is None:
+            self.replacements = replacement_table(tuple(sorted(self.terms)))
+        else:
+            self.replacements = resolve_replacements(self.terms, replacement_map)
+        self.automaton = AhoCorasick(self.terms)
+
+    @classmethod
+    def for_user(cls, user):
+        return cls(
+            allergies=parse_terms(getattr(user, 'allergies', '')),
+            dietary_restrictions=parse_terms(getattr(user, 'dietary_restrictions', '')),
+            dislikes=parse_terms(getattr(user, 'disliked_foods', '')),
+        )
+
+    def __bool__(self):
+        return bool(self.terms)
+
+    def has_restriction(self, name):
+        """True if any dietary restriction mentions name (e.g. 'vegetarian')"""
+        return any(name in restriction for restriction in self.dietary_restrictions)
+
+    def find(self, text):
+        """Leftmost-longest, non-overlapping (start, end, term) matches in text, case-insensitive"""
+        if not self.terms or not text:
+            return []
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # Some characters change length when lowercased; keep offsets aligned
+            lowered = ''.join(char if len(char.lower()) != 1 else char.lower() for char in text)
+
+        matches = sorted(self.automaton.find_all(lowered), key=lambda match: (match[0], -match[1]))
+        selected = []
+        position = 0
+        for start, end, term in matches:
+            if start >= position:
+                selected.append((start, end, term))
+                position = end
+        return selected
+
+    def contains(self, text):
+        if not self.terms or not text:
+            return False
+        return next(self.automaton.find_all(text.lower()), None) is not None
+
+    def rewrite(self, text):
+        """Replace every restricted term in text with its safe replacement"""
+        if not isinstance(text, str):
+            return text
+        matches = self.find(text)
+        if not matches:
+            return text
+
+        parts = []
+        position = 0
+        for start, end, term in matches:
+            parts.append(text[position:start])
+            parts.append(self.replacements[term])
+            position = end
+        parts.append(text[position:])
+        return ''.join(parts)
+
+
+def rewrite_meals(meals, matcher):
+    """Copy of one day's {meal_time: [items]} with every item rewritten"""
+    if not matcher or not isinstance(meals, dict):
+        return meals
+    return {
+        meal_time: [matcher.rewrite(item) for item in items] if isinstance(items, list) else items
+        for meal_time, items in meals.items()
+    }
+
+
+def rewrite_plan(plan, matcher):
+    """Copy of a {"Day N": {meal_time: [items]}} plan with every item rewritten"""
+    if not matcher or not isinstance(plan, dict):
+        return plan
+    return {day: rewrite_meals(meals, matcher) for day, meals in plan.items()}
+
+
+def rewrite_todo_meal(meal, matcher):
+    """Rewrite a ToDoList.meal: a JSON list of items, or plain text from the save endpoint"""
+    if not matcher or not isinstance(meal, str):
+        return meal
+    try:
+        items = json.loads(meal)
+    except ValueError:
+        items = None
+    if not isinstance(items, list):
+        return matcher.rewrite(meal)
+    rewritten = [matcher.rewrite(item) for item in items]
+    return meal if rewritten == items else json.dumps(rewritten, ensure_ascii=False)
+
+
+_matchers = OrderedDict()
+_matchers_lock = threading.Lock()
+
+
+def _fingerprint(user):
+    return (
+        getattr(user, 'allergies', '') or '',
+        getattr(user, 'dietary_restrictions', '') or '',
+        getattr(user, 'disliked_foods', '') or '',
+    )
+
+
+def restrictions_key(user):
+    """Stable digest of the user's restriction fields ('' when they have none)"""
+    fingerprint = _fingerprint(user)
+    if not any(parse_terms(value) for value in fingerprint):
+        return ''
+    return hashlib.sha1('\x1f'.join(fingerprint).encode()).hexdigest()
+
+
+def get_matcher(user):
+    """Return the user's compiled matcher, rebuilding it if their restrictions changed"""
+    fingerprint = _fingerprint(user)
+    with _matchers_lock:
+        cached = _matchers.get(user.pk)
+        if cached and cached[0] == fingerprint:
+            _matchers.move_to_end(user.pk)
+            return cached[1]
+
+    matcher = RestrictionMatcher.for_user(user)
+    with _matchers_lock:
+        _matchers[user.pk] = (fingerprint, matcher)
+        _matchers.move_to_end(user.pk)
+        while len(_matchers) > MATCHER_CACHE_SIZE:
+            _matchers.popitem(last=False)
+    return matcher
+
+
+def invalidate_matcher(user_id):
+    with _matchers_lock:
+        _matchers.pop(user_id, None)
@@ -0,0 +1,250 @@
+"""
+Fair-share scheduler in front of the diet_plans Celery queue.
+
+Generation jobs are held in Redis and only handed to Celery when a worker slot
+is free, so the broker queue never holds more than DIET_PLAN_SCHEDULER_SLOTS
+jobs. Waiting jobs are ordered by fair queuing: each job gets a virtual finish
+tag max(V, user's last tag) + 1, where V is the tag of the last dispatched job,
+so one user's burst interleaves with everyone else's requests instead of
+running ahead of them. A user never has more than
+DIET_PLAN_MAX_JOBS_PER_USER jobs running at once.
+
+Slots are freed by finish() when a job ends. Jobs that end without calling it
+(a killed worker, a failed chord) are reclaimed by tick(), which the periodic
+tick_plan_scheduler task (run by Celery beat) and status polls of queued jobs
+call.
+
+When DIET_PLAN_SCHEDULER_ENABLED is off or the default cache isn't Redis, the
+scheduler is bypassed and jobs go straight to Celery.
+"""
+import json
+import logging
+import math
+import time
+from celery.result import AsyncResult
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from diet_plans import generation_registry
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'plan-scheduler'
+QUEUE_KEY = f'{KEY_PREFIX}:queue'            # ZSET task_id -> finish tag
+JOBS_KEY = f'{KEY_PREFIX}:jobs'              # HASH task_id -> job JSON
+USER_TAGS_KEY = f'{KEY_PREFIX}:user-tags'    # HASH user_id -> last finish tag
+VIRTUAL_TIME_KEY = f'{KEY_PREFIX}:vtime'     # tag of the last dispatched job
+RUNNING_KEY = f'{KEY_PREFIX}:running'        # ZSET task_id -> dispatch time
+RUNNING_USERS_KEY = f'{KEY_PREFIX}:running-users'  # HASH task_id -> user_id
+AVG_SECONDS_KEY = f'{KEY_PREFIX}:avg-seconds'
+LOCK_KEY = f'{KEY_PREFIX}:lock'
+
+# Initial run-time estimate before any job has finished, and the weight given
+# to each new sample in the moving average
+DEFAULT_RUN_SECONDS = 450
+AVERAGE_SMOOTHING = 0.2
+
+
+def _redis():
+    """Raw Redis client, or None if the scheduler is off or the cache isn't Redis"""
+    if not settings.DIET_PLAN_SCHEDULER_ENABLED:
+        return None
+    try:
+        return get_redis_connection('default')
+    except NotImplementedError:
+        return None
+
+
+def _key(name):
+    return cache.make_key(name)
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _send(args, task_id):
+    # Imported here because tasks.py imports this module
+    from diet_plans.tasks import generate_diet_plan_async
+    generate_diet_plan_async.apply_async(args=args, task_id=task_id)
+
+
+def submit(user_id, task_id, args):
+    """Queue a generation job; it is sent to Celery as soon as fairness and capacity allow"""
+    client = _redis()
+    if client is None:
+        _send(args, task_id)
+        return
+
+    with client.lock(_key(LOCK_KEY), timeout=10, blocking_timeout=5):
+        virtual_time = float(client.get(_key(VIRTUAL_TIME_KEY)) or 0)
+        last_tag = float(client.hget(_key(USER_TAGS_KEY), user_id) or 0)
+        tag = max(virtual_time, last_tag) + 1
+
+        job = {'user_id': user_id, 'args': args, 'queued_at': time.time()}
+        pipe = client.pipeline()
+        pipe.hset(_key(JOBS_KEY), task_id, json.dumps(job))
+        pipe.zadd(_key(QUEUE_KEY), {task_id: tag})
+        pipe.hset(_key(USER_TAGS_KEY), user_id, tag)
+        pipe.execute()
+        _dispatch(client)
+
+
+def finish(task_id):
+    """Free the job's worker slot, record its run time and dispatch waiting jobs"""
+    client = _redis()
+    if client is None:
+        return
+
+    with client.lock(_key(LOCK_KEY), timeout=10, blocking_timeout=5):
+        started = client.zscore(_key(RUNNING_KEY), task_id)
+        if started is not None:
+            _record_run_time(client, time.time() - started)
+        pipe = client.pipeline()
+        pipe.zrem(_key(RUNNING_KEY), task_id)
+        pipe.hdel(_key(RUNNING_USERS_KEY), task_id)
+        pipe.execute()
+        _dispatch(client)
+
+
+def tick():
+    """Reclaim slots of jobs that ended without finish() and dispatch waiting jobs"""
+    client = _redis()
+    if client is None:
+        return
+
+    lock = client.lock(_key(LOCK_KEY), timeout=10)
+    if not lock.acquire(blocking=False):
+        # A submit, finish or another tick is dispatching right now
+        return
+    try:
+        _dispatch(client)
+    finally:
+        lock.release()
+
+
+def _record_run_time(client, seconds):
+    average = float(client.get(_key(AVG_SECONDS_KEY)) or DEFAULT_RUN_SECONDS)
+    client.set(_key(AVG_SECONDS_KEY), average + AVERAGE_SMOOTHING * (seconds - average))
+
+
+def _release_stale(client):
+    """
+    Forget running jobs that have ended without finish() (failed chord, task
+    killed at its time limit) or are older than the time limit (their worker died)
+    """
+    cutoff = time.time() - settings.CELERY_TASK_TIME_LIMIT - 60
+    stale = []
+    for task_id, started in client.zrange(_key(RUNNING_KEY), 0, -1, withscores=True):
+        if started <= cutoff or AsyncResult(_decode(task_id)).ready():
+            stale.append(task_id)
+    if stale:
+        client.zrem(_key(RUNNING_KEY), *stale)
+        client.hdel(_key(RUNNING_USERS_KEY), *stale)
+        logger.warning(f"Released {len(stale)} stale diet plan scheduler slots")
+
+
+def _prune_user_tags(client, virtual_time):
+    """Drop finish tags the virtual time has passed; max(V, tag) ignores them anyway"""
+    passed = [user for user, tag in client.hgetall(_key(USER_TAGS_KEY)).items() if float(tag) <= virtual_time]
+    if passed:
+        client.hdel(_key(USER_TAGS_KEY), *passed)
+
+
+def _extend_claim(job, task_id):
+    try:
+        generation_registry.extend(*job['args'], task_id)
+    except Exception as e:
+        logger.warning(f"Could not extend the generation claim of {task_id}: {e}")
+
+
+def _extend_waiting_claims(client):
+    for task_id, raw_job in client.hgetall(_key(JOBS_KEY)).items():
+        _extend_claim(json.loads(raw_job), _decode(task_id))
+
+
+def _dispatch(client):
+    """Send waiting jobs to Celery, lowest finish tag first, while slots are free (caller holds the lock)"""
+    _release_stale(client)
+    _dispatch_waiting(client)
+    _extend_waiting_claims(client)
+    _prune_user_tags(client, float(client.get(_key(VIRTUAL_TIME_KEY)) or 0))
+
+
+def _dispatch_waiting(client):
+    running_users = [_decode(user) for user in client.hvals(_key(RUNNING_USERS_KEY))]
+    free_slots = settings.DIET_PLAN_SCHEDULER_SLOTS - len(running_users)
+    if free_slots <= 0:
+        return
+
+    per_user = {}
+    for user in running_users:
+        per_user[user] = per_user.get(user, 0) + 1
+
+    for task_id, tag in client.zrange(_key(QUEUE_KEY), 0, -1, withscores=True):
+        if free_slots <= 0:
+            break
+        task_id = _decode(task_id)
+        raw_job = client.hget(_key(JOBS_KEY), task_id)
+        if raw_job is None:
+            client.zrem(_key(QUEUE_KEY), task_id)
+            continue
+        job = json.loads(raw_job)
+        user = str(job['user_id'])
+        if per_user.get(user, 0) >= settings.DIET_PLAN_MAX_JOBS_PER_USER:
+            continue
+
+        _send(job['args'], task_id)
+        # The claim now has to outlive the task's own time limit
+        _extend_claim(job, task_id)
+        pipe = client.pipeline()
+        pipe.zrem(_key(QUEUE_KEY), task_id)
+        pipe.hdel(_key(JOBS_KEY), task_id)
+        pipe.zadd(_key(RUNNING_KEY), {task_id: time.time()})
+        pipe.hset(_key(RUNNING_USERS_KEY), task_id, user)
+        pipe.set(_key(VIRTUAL_TIME_KEY), tag)
+        pipe.execute()
+
+        per_user[user] = per_user.get(user, 0) + 1
+        free_slots -= 1
+        logger.info(f"Dispatched diet plan job {task_id} for user {user} (tag {tag:.2f})")
+
+
+def average_run_seconds(client=None):
+    client = client or _redis()
+    if client is None:
+        return DEFAULT_RUN_SECONDS
+    return float(client.get(_key(AVG_SECONDS_KEY)) or DEFAULT_RUN_SECONDS)
+
+
+def queue_stats():
+    """Queue depth, running jobs and average job run time"""
+    client = _redis()
+    if client is None:
+        return {'queued': 0, 'running': 0, 'average_run_seconds': DEFAULT_RUN_SECONDS}
+    return {
+        'queued': client.zcard(_key(QUEUE_KEY)),
+        'running': client.zcard(_key(RUNNING_KEY)),
+        'average_run_seconds': round(average_run_seconds(client), 1),
+    }
+
+
+def estimate(task_id):
+    """
+    Queue position and estimated wait for a job: it starts once the jobs ahead
+    of it have run, DIET_PLAN_SCHEDULER_SLOTS at a time.
+    """
+    client = _redis()
+    if client is None:
+        return None
+    position = client.zrank(_key(QUEUE_KEY), task_id)
+    if position is None:
+        return None
+    average = average_run_seconds(client)
+    rounds = math.ceil((position + 1) / settings.DIET_PLAN_SCHEDULER_SLOTS)
+    return {
+        'queue_position': position + 1,
+        'queue_depth': client.zcard(_key(QUEUE_KEY)),
+        'estimated_wait_seconds': round(rounds * average),
+        'estimated_run_seconds': round(average),
+    }
@@ -0,0 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .food_matrix import FoodMatrix
+from . import adherence
+from .models import Food, GenerateMeal, GeneratedMealDay, ToDoList
+from .restrictions import invalidate_matcher, restrictions_key
+
+User = get_user_model()
+
+RESTRICTION_FIELDS = {'allergies', 'dietary_restrictions', 'disliked_foods'}
+
+
+@receiver(post_save, sender=User)
+def invalidate_restriction_matcher(sender, instance, **kwargs):
+    """Drop the cached restriction matcher when a user's profile is saved"""
+    invalidate_matcher(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def apply_restrictions_to_plans(sender, instance, created, update_fields=None, **kwargs):
+    """Rewrite the user's current and upcoming plans (blob, day rows, to-dos) for changed restrictions"""
+    if created or (update_fields is not None and not RESTRICTION_FIELDS & set(update_fields)):
+        return
+    key = restrictions_key(instance)
+    plans = GenerateMeal.objects.filter(
+        user=instance, end_date__gte=timezone.now().date()
+    ).exclude(restrictions_key=key)
+    for plan in plans:
+        plan.user = instance
+        plan.save(update_fields=['plan_blob'])
+
+
+@receiver(post_save, sender=Food)
+@receiver(post_delete, sender=Food)
+def invalidate_food_catalog(sender, instance, **kwargs):
+    """Reload the in-process food catalog after any Food change"""
+    FoodMatrix.invalidate_catalog()
+
+
+@receiver(post_save, sender=GeneratedMealDay)
+@receiver(post_delete, sender=GeneratedMealDay)
+def bump_plan_version(sender, instance, **kwargs):
+    """A day edit changes the plan: bump its version so cached responses and ETags go stale"""
+    GenerateMeal.objects.filter(pk=instance.generated_meal_id).update(version=F('version') + 1)
+
+
+@receiver(post_save, sender=ToDoList)
+@receiver(post_delete, sender=ToDoList)
+def refresh_daily_adherence(sender, instance, origin=None, **kwargs):
+    """Single-row saves and deletes (admin, shell); bulk writes refresh adherence themselves"""
+    if getattr(origin, 'model', type(origin)) is User:
+        # Cascade from deleting the user: their summaries and streak go with them
+        return
+    dates = {instance.date_of_meal, getattr(instance, '_loaded_date_of_meal', None)} - {None}
+    adherence.refresh_days(instance.user_id, dates)
+    instance._loaded_date_of_meal = instance.date_of_meal
@@ -1,14 +1,155 @@
 import logging
-from celery import shared_task
+import time
+from celery import chord, shared_task
+from celery.exceptions import Ignore
 from django.contrib.auth import get_user_model
+from django.conf import settings
 from datetime import datetime
-from services.ai_served_diet_plan import generate_meal_suggestions
-from services.save_data import save_30_day_plan_for_user
+from services.ai_backends import get_backend
+from services.offline_diet_plan import generate_offline_meal_suggestions
+from services.save_data import (
+    PLAN_DAYS, append_plan_day, discard_plan, save_30_day_plan_for_user, save_plan_audit, start_plan_for_user,
+)
+from diet_plans import generation_registry, plan_cache, scheduler
 from diet_plans.models import GenerateMeal
+from diet_plans.restrictions import get_matcher, parse_terms, rewrite_plan
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+CHUNK_MAX_RETRIES = 3
+
+
+def generate_meal_suggestions(user_data):
+    return get_backend().generate(user_data)
+
+
+def _offline_fallback(user_data, error):
+    """Offline plan for user_data if DIET_PLAN_OFFLINE_MODE allows it, else re-raise error"""
+    if settings.DIET_PLAN_OFFLINE_MODE != 'fallback':
+        raise error
+    logger.warning(f"AI generation failed ({error}); using the offline generator")
+    return generate_offline_meal_suggestions(user_data)
+
+
+def _generate_plan(user_data):
+    """Return (plan, source) where source is 'ai' or 'offline'"""
+    if settings.DIET_PLAN_OFFLINE_MODE == 'always':
+        return generate_offline_meal_suggestions(user_data), 'offline'
+    try:
+        return generate_meal_suggestions(user_data), 'ai'
+    except Exception as e:
+        # Includes SoftTimeLimitExceeded, so a stalled AI call still yields a plan
+        return _offline_fallback(user_data, e), 'offline'
+
+
+def _get_cached_plan(user_data):
+    """Plan cache lookup that never fails the task"""
+    try:
+        return plan_cache.get_cached_plan(user_data)
+    except Exception as e:
+        logger.warning(f"Plan cache lookup failed: {e}")
+        return None
+
+
+def _store_cached_plan(user_data, diet_plan, generation_seconds):
+    try:
+        plan_cache.store_plan(user_data, diet_plan, generation_seconds)
+    except Exception as e:
+        logger.warning(f"Could not cache generated plan: {e}")
+
+
+def _finish_request(task_id, user_id, goal, meal_type, result=None):
+    """
+    Free the job's scheduler slot and release the request's in-flight claim,
+    keeping a successful result for reuse
+    """
+    try:
+        scheduler.finish(task_id)
+    except Exception as e:
+        logger.warning(f"Could not release the scheduler slot of {task_id}: {e}")
+    try:
+        if result is None:
+            generation_registry.release(user_id, goal, meal_type)
+        else:
+            generation_registry.complete(user_id, goal, meal_type, result)
+    except Exception as e:
+        logger.warning(f"Could not update the generation registry: {e}")
+
+
+def _expected_run_seconds():
+    try:
+        return scheduler.average_run_seconds()
+    except Exception:
+        return scheduler.DEFAULT_RUN_SECONDS
+
+
+def _success_result(generated_meal, meal_type, cache_metrics, plan_source):
+    return {
+        'status': 'SUCCESS',
+        'message': 'Diet plan generated successfully',
+        'meal_plan_id': generated_meal.id,
+        'start_date': str(generated_meal.start_date),
+        'end_date': str(generated_meal.end_date),
+        'meal_type': meal_type,
+        'progress': 100,
+        'step': 'completed',
+        'plan_cache': cache_metrics,
+        'plan_source': plan_source,
+    }
+
+
+def _stream_plan_days(user_data):
+    """Yield ("Day N", meals) pairs as the backend produces them"""
+    yield from get_backend().stream(user_data)
+
+
+def _generate_streaming(task, user, user_data, meal_type):
+    """
+    Generate the plan day by day, saving each day and reporting real progress.
+    Returns (generated_meal, diet_plan, source); if the AI fails part-way, the
+    remaining days come from the offline generator when fallback is enabled.
+    Otherwise the partial plan is deleted so it never becomes the active plan.
+    """
+    generated_meal = start_plan_for_user(user=user, meal_type=meal_type)
+    logger.info(f"Streaming diet plan into GenerateMeal {generated_meal.id}")
+
+    diet_plan = {}
+    source = 'ai'
+    try:
+        _save_streamed_days(task, generated_meal, diet_plan, _stream_plan_days(user_data))
+    except Exception as e:
+        days_from_ai = len(diet_plan)
+        remaining = {**user_data, 'start_day': days_from_ai + 1, 'num_days': PLAN_DAYS - days_from_ai}
+        try:
+            _save_streamed_days(task, generated_meal, diet_plan, _offline_fallback(remaining, e).items())
+        except Exception:
+            logger.warning(f"Discarding partial GenerateMeal {generated_meal.id} ({len(diet_plan)} days saved)")
+            discard_plan(generated_meal=generated_meal, day_labels=diet_plan)
+            raise
+        source = 'ai+offline' if days_from_ai else 'offline'
+
+    save_plan_audit(generated_meal=generated_meal, plan_dict=diet_plan)
+    return generated_meal, diet_plan, source
+
+
+def _save_streamed_days(task, generated_meal, diet_plan, days):
+    for day_label, meals in days:
+        append_plan_day(generated_meal=generated_meal, day_label=day_label, meals=meals)
+        diet_plan[day_label] = meals
+
+        days_saved = len(diet_plan)
+        task.update_state(
+            state='PROGRESS',
+            meta={
+                'status': f'Saved {day_label} ({days_saved} of {PLAN_DAYS} days)',
+                'progress': 30 + int(65 * min(days_saved, PLAN_DAYS) / PLAN_DAYS),
+                'step': 'ai_generation',
+                'meal_plan_id': generated_meal.id,
+                'days_saved': days_saved,
+            }
+        )
+
 
 @shared_task(bind=True, time_limit=900, soft_time_limit=840)  # 15 min hard limit, 14 min soft limit
 def generate_diet_plan_async(self, user_id, goal, meal_type):
@@ -64,6 +205,7 @@ def generate_diet_plan_async(self, user_id, goal, meal_type):
             ', ') if user.medical_conditions and user.medical_conditions.strip().lower() != 'none' else []
         food_restrictions = user.allergies.split(
             ', ') if user.allergies and user.allergies.strip().lower() != 'none' else []
+        dietary_restrictions = parse_terms(user.dietary_restrictions)
         food_preferences = ['Bangladeshi']
 
         user_data = {
@@ -75,64 +217,100 @@ def generate_diet_plan_async(self, user_id, goal, meal_type):
             "goal": goal,
             "medical_conditions": medical_conditions,
             "food_restrictions": food_restrictions,
+            "dietary_restrictions": dietary_restrictions,
             "food_preferences": food_preferences,
         }
         logger.info(f"User data prepared successfully: {user_data}")
 
-        # Update task status before AI call
-        self.update_state(
-            state='PROGRESS',
-            meta={
-                'status': 'Generating meal plan with AI (this may take 5-10 minutes)...',
-                'progress': 30,
-                'step': 'ai_generation'
+        # Reuse the plan of a near-identical profile if one is cached
+        lookup_started = time.monotonic()
+        cached = _get_cached_plan(user_data)
+        generated_meal = None
+
+        if cached:
+            plan_source = 'cache'
+            cached_plan, generation_seconds = cached
+            logger.info("=== PLAN CACHE HIT === Personalizing cached plan")
+            diet_plan = rewrite_plan(cached_plan, get_matcher(user))
+            cache_metrics = {
+                'hit': True,
+                'latency_saved_seconds': round(max(0.0, generation_seconds - (time.monotonic() - lookup_started)), 2),
             }
-        )
+        else:
+            # Update task status before AI call
+            expected_minutes = max(1, round(_expected_run_seconds() / 60))
+            self.update_state(
+                state='PROGRESS',
+                meta={
+                    'status': f'Generating meal plan with AI (this usually takes about {expected_minutes} minutes)...',
+                    'progress': 30,
+                    'step': 'ai_generation',
+                    'estimated_run_seconds': expected_minutes * 60,
+                }
+            )
 
-        logger.info("=== CALLING AI SERVICE ===")
-        logger.info("This may take 5-10 minutes...")
+            logger.info(f"=== CALLING AI SERVICE ({settings.DIET_PLAN_AI_BACKEND} backend) ===")
+            logger.info(f"Recent plans took about {expected_minutes} minutes")
 
-        # Generate diet plan using AI
-        diet_plan = generate_meal_suggestions(user_data)
-        logger.info("=== AI SERVICE COMPLETED ===")
-        logger.info(f"Diet plan generated successfully. Plan type: {type(diet_plan)}")
+            offline_only = settings.DIET_PLAN_OFFLINE_MODE == 'always'
+            if settings.DIET_PLAN_GENERATION_MODE == 'chunked' and not offline_only:
+                # Fan out day ranges to parallel tasks; the chord callback saves the plan
+                # and its result becomes this task's result
+                logger.info("Dispatching chunked plan generation")
+                return self.replace(_chunked_plan(task_id, user_id, meal_type, user_data))
 
-        # Update task status
-        self.update_state(
-            state='PROGRESS',
-            meta={
-                'status': 'Saving diet plan to database...',
-                'progress': 80,
-                'step': 'saving_data'
-            }
-        )
+            generation_started = time.monotonic()
+            if settings.DIET_PLAN_GENERATION_MODE == 'streaming' and not offline_only:
+                # Persist each day as soon as the AI produces it
+                generated_meal, diet_plan, plan_source = _generate_streaming(self, user, user_data, meal_type)
+            else:
+                # Generate diet plan using AI
+                diet_plan, plan_source = _generate_plan(user_data)
+            generation_seconds = time.monotonic() - generation_started
+            logger.info("=== AI SERVICE COMPLETED ===")
+            logger.info(f"Diet plan generated successfully ({plan_source}) in {generation_seconds:.2f}s")
+
+            if plan_source == 'ai':
+                # Offline plans are cheaper to rebuild than to cache
+                _store_cached_plan(user_data, diet_plan, generation_seconds)
+            cache_metrics = {'hit': False, 'latency_saved_seconds': 0.0}
+
+        logger.info(f"Plan cache: {cache_metrics}")
+
+        if generated_meal is None:
+            # Update task status
+            self.update_state(
+                state='PROGRESS',
+                meta={
+                    'status': 'Saving diet plan to database...',
+                    'progress': 80,
+                    'step': 'saving_data'
+                }
+            )
 
-        logger.info("Saving diet plan to database...")
-        # Save the generated plan
-        generated_meal = save_30_day_plan_for_user(user=user, plan_dict=diet_plan, meal_type=meal_type)
+            logger.info("Saving diet plan to database...")
+            # Save the generated plan
+            generated_meal = save_30_day_plan_for_user(user=user, plan_dict=diet_plan, meal_type=meal_type)
         logger.info(f"Diet plan saved successfully with ID: {generated_meal.id}")
 
         # Final success state
-        result = {
-            'status': 'SUCCESS',
-            'message': 'Diet plan generated successfully',
-            'meal_plan_id': generated_meal.id,
-            'start_date': str(generated_meal.start_date),
-            'end_date': str(generated_meal.end_date),
-            'meal_type': meal_type,
-            'progress': 100,
-            'step': 'completed'
-        }
+        result = _success_result(generated_meal, meal_type, cache_metrics, plan_source)
 
         logger.info(f"=== TASK COMPLETED SUCCESSFULLY === Task ID: {task_id}")
         logger.info(f"Result: {result}")
+        _finish_request(task_id, user_id, goal, meal_type, result)
 
         return result
 
+    except Ignore:
+        # Raised by self.replace() when the work was handed to a chord
+        raise
+
     except Exception as e:
         error_msg = str(e)
         logger.error(f"=== TASK FAILED === Task ID: {task_id}")
         logger.error(f"Error: {error_msg}", exc_info=True)
+        _finish_request(task_id, user_id, goal, meal_type)
 
         # Update task status with error
         self.update_state(
@@ -146,4 +324,89 @@ def generate_diet_plan_async(self, user_id, goal, meal_type):
         )
 
         # Re-raise the exception so Celery marks the task as failed
-        raise e
\ No newline at end of file
+        raise e
+
+
+def _chunked_plan(request_id, user_id, meal_type, user_data):
+    """Chord generating DIET_PLAN_CHUNK_DAYS-day ranges in parallel, merged by merge_plan_chunks"""
+    chunk_days = settings.DIET_PLAN_CHUNK_DAYS
+    chunks = [
+        generate_plan_chunk.s(user_data, first_day, min(first_day + chunk_days - 1, PLAN_DAYS))
+        for first_day in range(1, PLAN_DAYS + 1, chunk_days)
+    ]
+    merge = merge_plan_chunks.s(request_id, user_id, meal_type, user_data, time.time())
+    merge.on_error(release_failed_plan.s(request_id, user_id, user_data['goal'], meal_type))
+    return chord(chunks, merge)
+
+
+def _relabel_chunk(chunk, first_day, last_day):
+    """Label a chunk's days first_day..last_day, whatever numbering the AI used"""
+    expected = last_day - first_day + 1
+    labels = sorted(
+        (label for label in chunk if label.startswith('Day ')),
+        key=lambda label: int(label.split()[1])
+    )
+    days = [chunk[label] for label in labels]
+    if len(days) < expected:
+        raise ValueError(f"AI returned {len(days)} days for a {expected}-day chunk")
+    return {f"Day {first_day + offset}": meals for offset, meals in enumerate(days[:expected])}
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True,
+             retry_kwargs={'max_retries': CHUNK_MAX_RETRIES}, time_limit=300, soft_time_limit=270)
+def generate_plan_chunk(self, user_data, first_day, last_day):
+    """
+    Generate days first_day..last_day of a plan. A failed chunk is retried on
+    its own; the other chunks of the chord are not redone. Once its retries are
+    used up, the chunk comes from the offline generator when fallback is enabled.
+    """
+    logger.info(f"Generating plan chunk Day {first_day}-{last_day} (task {self.request.id})")
+    chunk_data = {
+        **user_data,
+        'start_day': first_day,
+        'num_days': last_day - first_day + 1,
+    }
+    source = 'ai'
+    try:
+        chunk = generate_meal_suggestions(chunk_data)
+    except Exception as e:
+        if self.request.retries < CHUNK_MAX_RETRIES:
+            raise
+        chunk, source = _offline_fallback(chunk_data, e), 'offline'
+    return {'source': source, 'days': _relabel_chunk(chunk, first_day, last_day)}
+
+
+@shared_task(bind=True)
+def merge_plan_chunks(self, chunks, request_id, user_id, meal_type, user_data, dispatched_at):
+    """Chord callback: merge the generated chunks and save the plan once"""
+    diet_plan = {}
+    sources = set()
+    for chunk in chunks:
+        diet_plan.update(chunk['days'])
+        sources.add(chunk['source'])
+    plan_source = '+'.join(sorted(sources))
+    generation_seconds = time.time() - dispatched_at
+    logger.info(f"Merged {len(chunks)} chunks into a {len(diet_plan)}-day plan in {generation_seconds:.1f}s")
+
+    user = User.objects.get(id=user_id)
+    if plan_source == 'ai':
+        _store_cached_plan(user_data, diet_plan, generation_seconds)
+    generated_meal = save_30_day_plan_for_user(user=user, plan_dict=diet_plan, meal_type=meal_type)
+    logger.info(f"Diet plan saved successfully with ID: {generated_meal.id}")
+
+    result = _success_result(generated_meal, meal_type, {'hit': False, 'latency_saved_seconds': 0.0}, plan_source)
+    _finish_request(request_id, user_id, user_data['goal'], meal_type, result)
+    return result
+
+
+@shared_task
+def release_failed_plan(request, exc, traceback, request_id, user_id, goal, meal_type):
+    """Chord errback: a chunk or the merge failed, so free the request's slot and claim"""
+    logger.error(f"Chunked diet plan {request_id} failed: {exc}")
+    _finish_request(request_id, user_id, goal, meal_type)
+
+
+@shared_task
+def tick_plan_scheduler():
+    """Periodic scheduler pass reclaiming slots of jobs that ended without finishing"""
+    scheduler.tick()
@@ -0,0 +1,568 @@
+import itertools
+import json
+import threading
+import numpy as np
+from datetime import date, timedelta
+from unittest import mock, skipUnless
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from diet_plans import generation_registry, plan_cache, plan_responses, scheduler
+from diet_plans.adherence import refresh_days
+from diet_plans.ai_diet_parser import parse_quantity
+from diet_plans.ai_engine import DietAIEngine
+from diet_plans.eligibility import ALLERGEN_BITS, eligible_foods, food_mask
+from diet_plans.fields import FORMAT_ZLIB, FORMAT_ZSTD, decode_json, encode_json, zstandard
+from diet_plans.food_matrix import FoodMatrix
+from diet_plans.meal_compositions import MAX_PORTION_GRAMS, MIN_PORTION_GRAMS
+from diet_plans.portion_optimizer import PortionOptimizer
+from diet_plans.models import DailyAdherence, Food, GenerateMeal, ToDoList
+from diet_plans.restrictions import RestrictionMatcher
+from rest_framework.test import APIClient
+from services.offline_diet_plan import (
+    DAIRY_FOODS, MEAT_CATEGORIES, generate_offline_meal_suggestions, load_foods,
+)
+from services.save_data import (
+    append_plan_day, plan_todo_rows, save_plan, save_plan_audit, set_todo_completion, start_plan_for_user,
+    upsert_todo_rows,
+)
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class EligibilityTests(TestCase):
+    def setUp(self):
+        for name, allergens in [
+            ('Milk powder biscuit', 'milk powder'),
+            ('Paratha', 'Wheat flour'),
+            ('Protein shake', 'casein'),
+            ('Peanut chikki', 'peanuts'),
+            ('Mustard fish', 'mustard'),
+            ('Plain rice', ''),
+        ]:
+            Food.objects.create(name=name, calories_per_100g=100, common_allergens=allergens)
+
+    def eligible_names(self, **restrictions):
+        matcher = RestrictionMatcher(**restrictions)
+        foods = eligible_foods(Food.objects.all(), matcher)
+        matrix = FoodMatrix.load().for_user(matcher)
+        self.assertEqual(set(foods.values_list('id', flat=True)), set(matrix.ids[matrix.eligible].tolist()))
+        return set(foods.values_list('name', flat=True))
+
+    def test_non_canonical_allergens_set_class_bits(self):
+        self.assertTrue(food_mask(common_allergens='milk powder') & ALLERGEN_BITS['milk'])
+        self.assertTrue(food_mask(common_allergens='Wheat flour') & ALLERGEN_BITS['gluten'])
+        self.assertTrue(food_mask(common_allergens='casein') & ALLERGEN_BITS['milk'])
+
+    def test_milk_allergy_excludes_milk_derivatives(self):
+        names = self.eligible_names(allergies=['milk'])
+        self.assertNotIn('Milk powder biscuit', names)
+        self.assertNotIn('Protein shake', names)
+        self.assertIn('Plain rice', names)
+
+    def test_gluten_allergy_excludes_wheat_flour(self):
+        self.assertNotIn('Paratha', self.eligible_names(allergies=['gluten']))
+
+    def test_nuts_allergy_excludes_peanuts(self):
+        self.assertNotIn('Peanut chikki', self.eligible_names(allergies=['nuts']))
+
+    def test_allergy_without_class_is_matched_as_text(self):
+        names = self.eligible_names(allergies=['mustard'])
+        self.assertNotIn('Mustard fish', names)
+        self.assertIn('Plain rice', names)
+
+
+class OfflinePlanDietTests(TestCase):
+    profile = {'age': 30, 'gender': 'male', 'height_cm': 170, 'weight_kg': 70, 'goal': 'maintain'}
+
+    def plan_items(self, **user_data):
+        plan = generate_offline_meal_suggestions({**self.profile, **user_data})
+        return {item.split(':')[0] for day in plan.values() for items in day.values() for item in items}
+
+    def names_in(self, categories):
+        return {food.name for foods in load_foods().values() for food in foods if food.category in categories}
+
+    def test_unrestricted_plan_includes_meat(self):
+        self.assertTrue(self.plan_items() & self.names_in(MEAT_CATEGORIES))
+
+    def test_vegetarian_plan_has_no_meat_or_fish(self):
+        items = self.plan_items(dietary_restrictions=['Vegetarian'])
+        self.assertFalse(items & self.names_in(MEAT_CATEGORIES))
+        self.assertTrue(items & self.names_in(('Legumes & Pulses',)))
+
+    def test_vegan_plan_has_no_dairy(self):
+        items = self.plan_items(dietary_restrictions='vegan')
+        self.assertFalse(items & self.names_in(MEAT_CATEGORIES))
+        self.assertFalse(items & set(DAIRY_FOODS))
+
+
+class TodoUpsertTests(TestCase):
+    day = date(2026, 1, 5)
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='upsert', password='x')
+
+    def upsert(self, meals):
+        upsert_todo_rows(plan_todo_rows(self.user, {'Day 1': meals}, self.day))
+        return {row.meal_time: row for row in ToDoList.objects.filter(user=self.user)}
+
+    def test_resave_keeps_completion_of_unchanged_meals(self):
+        self.upsert({'Breakfast': ['Egg: 50g'], 'Lunch': ['Rice: 185g']})
+        ToDoList.objects.filter(user=self.user).update(is_completed=True)
+
+        todos = self.upsert({'Breakfast': ['Egg: 50g'], 'Lunch': ['Khichuri: 250g']})
+        self.assertTrue(todos['Breakfast'].is_completed)
+        self.assertFalse(todos['Lunch'].is_completed)
+        self.assertEqual(json.loads(todos['Lunch'].meal), ['Khichuri: 250g'])
+
+    def test_duplicate_keys_in_one_batch_keep_the_last_row(self):
+        rows = plan_todo_rows(self.user, {'Day 1': {'Dinner': ['Dal: 50g']}}, self.day)
+        rows += plan_todo_rows(self.user, {'Day 1': {'Dinner': ['Fish curry: 100g']}}, self.day)
+        self.assertEqual(upsert_todo_rows(rows), 1)
+        self.assertEqual(json.loads(ToDoList.objects.get(user=self.user).meal), ['Fish curry: 100g'])
+
+
+class PlanRestrictionTests(TestCase):
+    plan = {'Day 1': {'Lunch': ['Beef curry: 100g'], 'Dinner': ['Rice: 185g']}}
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='restricted', password='x')
+
+    def saved_meals(self, plan):
+        todos = ToDoList.objects.filter(user=self.user).order_by('meal_time')
+        return (
+            plan.plan_data['Day 1']['Lunch'],
+            list(plan.days.values_list('meals', flat=True))[0]['Lunch'],
+            [json.loads(todo.meal) for todo in todos],
+        )
+
+    def test_restriction_change_rewrites_saved_plan_rows(self):
+        plan = save_plan(user=self.user, plan_dict=self.plan)
+        self.assertFalse(plan.plan_changed())
+
+        self.user.dietary_restrictions = 'Beef'
+        self.user.save()
+        plan.refresh_from_db()
+        self.assertEqual(self.saved_meals(plan), (
+            ['chicken curry: 100g'], ['chicken curry: 100g'], [['Rice: 185g'], ['chicken curry: 100g']],
+        ))
+
+    def test_streamed_plan_is_rewritten(self):
+        self.user.dietary_restrictions = 'Beef'
+        self.user.save()
+        plan = start_plan_for_user(user=self.user)
+        append_plan_day(generated_meal=plan, day_label='Day 1', meals=self.plan['Day 1'])
+        save_plan_audit(generated_meal=plan, plan_dict=self.plan)
+
+        plan = GenerateMeal.objects.get(pk=plan.pk)
+        self.assertEqual(self.saved_meals(plan), (
+            ['chicken curry: 100g'], ['chicken curry: 100g'], [['Rice: 185g'], ['chicken curry: 100g']],
+        ))
+
+    def test_explicit_todo_rows_are_rewritten(self):
+        self.user.dietary_restrictions = 'Beef'
+        self.user.save()
+        plan = save_plan(user=self.user, plan_dict={'Day 1': {'Lunch': ['Beef bhuna']}}, todo_rows=[
+            ToDoList(user=self.user, meal='Beef bhuna', day=1, meal_time='Lunch', date_of_meal=date(2026, 1, 5)),
+        ])
+        self.assertEqual(ToDoList.objects.get(user=self.user).meal, 'chicken bhuna')
+        self.assertEqual(plan.plan_data['Day 1']['Lunch'], ['chicken bhuna'])
+
+
+class DailyAdherenceTests(TestCase):
+    day = date(2026, 1, 5)
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='adherence', password='x')
+        upsert_todo_rows(plan_todo_rows(self.user, {'Day 1': {'Breakfast': ['Egg: 50g'], 'Lunch': ['Rice: 185g']}}, self.day))
+        self.todos = {todo.meal_time: todo for todo in ToDoList.objects.filter(user=self.user)}
+
+    def summary(self, day=None):
+        return DailyAdherence.objects.get(user=self.user, date=day or self.day)
+
+    def test_completion_updates_counts_and_masks(self):
+        set_todo_completion(user=self.user, changes={self.todos['Breakfast'].id: True})
+        summary = self.summary()
+        self.assertEqual((summary.meals_planned, summary.meals_completed), (2, 1))
+        self.assertEqual((summary.planned_mask, summary.completed_mask), (0b11, 0b01))
+        self.assertFalse(summary.is_complete)
+
+        set_todo_completion(user=self.user, changes={self.todos['Lunch'].id: True})
+        self.assertTrue(self.summary().is_complete)
+
+    def test_moving_a_todo_refreshes_both_days(self):
+        lunch = ToDoList.objects.get(pk=self.todos['Lunch'].pk)
+        lunch.date_of_meal = self.day + timedelta(days=1)
+        lunch.save()
+        self.assertEqual(self.summary().meals_planned, 1)
+        self.assertEqual(self.summary(lunch.date_of_meal).meals_planned, 1)
+
+    def test_refresh_issues_four_queries(self):
+        # Create the summary rows, lock them, read the to-dos and write the
+        # summaries, between the SAVEPOINT and RELEASE atomic() issues in a test
+        with self.assertNumQueries(6):
+            refresh_days(self.user.id, [self.day, self.day + timedelta(days=1)])
+        self.assertEqual(self.summary(self.day + timedelta(days=1)).meals_planned, 0)
+
+    def test_deleting_the_user_deletes_their_todos_and_summaries(self):
+        self.user.delete()
+        self.assertFalse(ToDoList.objects.exists())
+        self.assertFalse(DailyAdherence.objects.exists())
+
+
+class ParseQuantityTests(TestCase):
+    def test_keywords_follow_table_priority(self):
+        self.assertEqual(parse_quantity('Banana bread: 2 slices'), (80.0, 2, 'slices'))
+        self.assertEqual(parse_quantity('Steak with rice: 1 cup'), (185.0, None, 'cups'))
+
+    def test_plan_saves_store_parsed_items(self):
+        user = get_user_model().objects.create_user(username='parsed', password='x')
+        plan = save_plan(user=user, plan_dict={'Day 1': {'Breakfast': ['Boiled egg: 2 pcs'], 'Lunch': ['Rice: 1 cup']}})
+        streamed = start_plan_for_user(user=user)
+        append_plan_day(generated_meal=streamed, day_label='Day 1', meals={'Dinner': ['Dal: 150g']})
+
+        self.assertEqual(plan.days.get().items, {
+            'Breakfast': [{'name': 'Boiled egg', 'grams': 100.0, 'pieces': 2, 'unit': 'pieces'}],
+            'Lunch': [{'name': 'Rice', 'grams': 185.0, 'pieces': None, 'unit': 'cups'}],
+        })
+        self.assertEqual(streamed.days.get().items, {
+            'Dinner': [{'name': 'Dal', 'grams': 150.0, 'pieces': None, 'unit': 'grams'}],
+        })
+
+    def test_keywords_match_whole_words(self):
+        self.assertEqual(parse_quantity('Boiled eggs: 2 pcs'), (100.0, 2, 'pieces'))
+        self.assertEqual(parse_quantity('Begun (Eggplant): 2 pcs'), (None, 2, 'pieces'))
+        self.assertEqual(parse_quantity('Kakrol (Teasle Gourd): 1 cup'), (200.0, None, 'cups'))
+
+
+class ComposeMealsTests(TestCase):
+    def setUp(self):
+        for name, category, calories, allergens in [
+            ('Chicken', 'proteins', 165, ''),
+            ('Peanut butter', 'proteins', 588, 'peanuts'),
+            ('Rice', 'carbs', 130, ''),
+            ('Roti', 'carbs', 300, 'wheat'),
+            ('Spinach', 'vegetables', 23, ''),
+            ('Mustard oil', 'fats', 884, ''),
+            ('Banana', 'fruits', 89, ''),
+        ]:
+            Food.objects.create(name=name, category=category, calories_per_100g=calories,
+                                protein_per_100g=10, carbs_per_100g=10, fat_per_100g=5, common_allergens=allergens)
+        self.user = get_user_model().objects.create_user(username='engine', password='x',
+                                                         allergies='peanut', disliked_foods='roti')
+
+    def compose(self, seed):
+        return DietAIEngine(self.user, seed=seed).compose_meals(['breakfast', 'lunch', 'dinner', 'snack'] * 30,
+                                                                [500, 700, 600, 200] * 30)
+
+    def test_restricted_foods_are_never_picked(self):
+        names = {item['name'] for meal in self.compose(seed=1) for item in meal}
+        self.assertEqual(names, {'Chicken', 'Rice', 'Spinach', 'Mustard oil', 'Banana'})
+
+    def test_same_seed_gives_same_meals(self):
+        self.assertEqual(self.compose(seed=7), self.compose(seed=7))
+
+    def test_optimized_meals_have_no_zero_gram_items(self):
+        meals = DietAIEngine(self.user, seed=3).compose_meals(['lunch', 'snack'] * 30, [700, 200] * 30,
+                                                              optimize_portions=True)
+        quantities = [item['quantity'] for meal in meals for item in meal]
+        self.assertGreaterEqual(min(quantities), MIN_PORTION_GRAMS)
+        self.assertLessEqual(max(quantities), MAX_PORTION_GRAMS)
+
+
+class PortionOptimizerTests(TestCase):
+    # Pure protein, pure carbs and pure fat (calories, protein, carbs, fat, fiber per 100 g)
+    matrix = FoodMatrix([1, 2, 3], ['Protein', 'Carbs', 'Fat'], ['proteins', 'carbs', 'fats'], [
+        [400, 100, 0, 0, 0],
+        [400, 0, 100, 0, 0],
+        [900, 0, 0, 100, 0],
+    ])
+    rows = [[0, 1, 2]]
+
+    def solve(self, targets, **bounds):
+        optimizer = PortionOptimizer(self.matrix, **bounds)
+        return optimizer, optimizer.solve(self.rows, [targets])
+
+    def test_reachable_targets_converge(self):
+        optimizer, grams = self.solve([410, 30, 50, 10], min_grams=MIN_PORTION_GRAMS)
+        np.testing.assert_allclose(grams[0], [30, 50, 10], rtol=0.01)
+        np.testing.assert_allclose(optimizer.totals(self.rows, grams)[0], [410, 30, 50, 10], rtol=0.01)
+
+    def test_portions_stay_within_bounds(self):
+        # Protein wants 600 g and fat 5 g
+        _, grams = self.solve([2645, 600, 50, 5], min_grams=MIN_PORTION_GRAMS, max_grams=MAX_PORTION_GRAMS)
+        self.assertEqual(grams[0, 0], MAX_PORTION_GRAMS)
+        self.assertEqual(grams[0, 2], MIN_PORTION_GRAMS)
+        self.assertTrue(((grams >= MIN_PORTION_GRAMS) & (grams <= MAX_PORTION_GRAMS)).all())
+
+    def test_padding_stays_empty(self):
+        optimizer = PortionOptimizer(self.matrix, min_grams=MIN_PORTION_GRAMS)
+        grams = optimizer.solve([[0, 1, -1]], [[400, 50, 50, 0]])
+        self.assertEqual(grams[0, 2], 0)
+
+
+@skipUnless(fakeredis, 'fakeredis is not installed')
+@override_settings(CACHES=LOCMEM_CACHES, DIET_PLAN_SCHEDULER_ENABLED=True)
+class SchedulerTests(TestCase):
+    def setUp(self):
+        self.client = fakeredis.FakeRedis()
+        # fakeredis has no Lua scripting, which redis-py's lock needs
+        self.client.lock = lambda *args, **kwargs: threading.Lock()
+        self.sent = []
+        for target, patched in [
+            ('_redis', lambda: self.client),
+            ('_send', lambda args, task_id: self.sent.append(task_id)),
+            ('AsyncResult', lambda task_id: mock.Mock(ready=lambda: False)),
+        ]:
+            patcher = mock.patch.object(scheduler, target, patched)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def submit(self, *task_ids):
+        for task_id in task_ids:
+            user_id = task_id.split('-')[0]
+            scheduler.submit(user_id, task_id, [user_id, 'maintain', 'standard'])
+
+    @override_settings(DIET_PLAN_SCHEDULER_SLOTS=1)
+    def test_a_burst_interleaves_with_later_users(self):
+        self.submit('a-1', 'a-2', 'a-3', 'b-1', 'b-2')
+        self.assertEqual(self.sent, ['a-1'])
+        self.assertEqual(scheduler.estimate('b-1')['queue_position'], 2)
+
+        for task_id in ['a-1', 'a-2', 'b-1', 'a-3']:
+            scheduler.finish(task_id)
+        self.assertEqual(self.sent, ['a-1', 'a-2', 'b-1', 'a-3', 'b-2'])
+        self.assertEqual(scheduler.queue_stats()['queued'], 0)
+
+    @override_settings(DIET_PLAN_SCHEDULER_SLOTS=2, DIET_PLAN_MAX_JOBS_PER_USER=1)
+    def test_a_user_only_runs_their_share_of_slots(self):
+        self.submit('a-1', 'a-2')
+        self.assertEqual(self.sent, ['a-1'])
+        self.submit('b-1')
+        self.assertEqual(self.sent, ['a-1', 'b-1'])
+
+        scheduler.finish('a-1')
+        self.assertEqual(self.sent, ['a-1', 'b-1', 'a-2'])
+
+    @override_settings(DIET_PLAN_SCHEDULER_SLOTS=1)
+    def test_tick_reclaims_slots_of_ended_jobs(self):
+        self.submit('a-1', 'b-1')
+        self.assertEqual(self.sent, ['a-1'])
+        with mock.patch.object(scheduler, 'AsyncResult', lambda task_id: mock.Mock(ready=lambda: True)), \
+                self.assertLogs('diet_plans.scheduler', 'WARNING'):
+            scheduler.tick()
+        self.assertEqual(self.sent, ['a-1', 'b-1'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PLAN_CACHE_ENABLED=True)
+class PlanCacheTests(TestCase):
+    user_data = {
+        'goal': 'weight_loss', 'gender': 'female', 'activity_level': 'moderate',
+        'age': 31, 'height_cm': 164, 'weight_kg': 71.5,
+        'food_restrictions': ['Peanut'], 'medical_conditions': [],
+    }
+    plan = {'Day 1': {'Lunch': ['Rice: 185g']}}
+
+    def setUp(self):
+        cache.clear()
+
+    def test_a_stored_plan_is_returned_to_the_same_bucket(self):
+        self.assertIsNone(plan_cache.get_cached_plan(self.user_data))
+        plan_cache.store_plan(self.user_data, self.plan, 42.0)
+
+        # Same 5-year/5-cm/5-kg buckets, restrictions compared case- and order-insensitively
+        neighbour = dict(self.user_data, age=33, height_cm=162, weight_kg=74, food_restrictions=[' peanut '])
+        self.assertEqual(plan_cache.get_cached_plan(neighbour), (self.plan, 42.0))
+        self.assertEqual(plan_cache.cache_stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_other_buckets_miss(self):
+        plan_cache.store_plan(self.user_data, self.plan, 42.0)
+        for changes in [{'age': 36}, {'goal': 'muscle_gain'}, {'food_restrictions': []},
+                        {'dietary_restrictions': ['vegetarian']}]:
+            with self.subTest(**changes):
+                self.assertIsNone(plan_cache.get_cached_plan(dict(self.user_data, **changes)))
+
+    @override_settings(PLAN_CACHE_ENABLED=False)
+    def test_disabled_cache_stores_nothing(self):
+        plan_cache.store_plan(self.user_data, self.plan, 42.0)
+        self.assertIsNone(plan_cache.get_cached_plan(self.user_data))
+        self.assertIsNone(cache.get(plan_cache.bucket_key(self.user_data)))
+
+    @skipUnless(fakeredis, 'fakeredis is not installed')
+    @override_settings(PLAN_CACHE_MAX_ENTRIES=2)
+    def test_least_recently_used_plans_are_evicted(self):
+        client = fakeredis.FakeRedis()
+        with mock.patch.object(plan_cache, 'get_redis_connection', lambda alias: client), \
+                mock.patch.object(plan_cache, 'time', mock.Mock(time=itertools.count().__next__)):
+            profiles = [dict(self.user_data, age=age) for age in (20, 30, 40)]
+            plan_cache.store_plan(profiles[0], self.plan, 1.0)
+            plan_cache.store_plan(profiles[1], self.plan, 1.0)
+            plan_cache.get_cached_plan(profiles[0])
+            plan_cache.store_plan(profiles[2], self.plan, 1.0)
+
+            self.assertIsNotNone(plan_cache.get_cached_plan(profiles[0]))
+            self.assertIsNone(plan_cache.get_cached_plan(profiles[1]))
+            self.assertIsNotNone(plan_cache.get_cached_plan(profiles[2]))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, DIET_PLAN_RESULT_REUSE_SECONDS=600)
+class GenerationRegistryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.finished = set()
+        patcher = mock.patch.object(
+            generation_registry, 'AsyncResult', lambda task_id: mock.Mock(ready=lambda: task_id in self.finished)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_identical_requests_share_the_running_task(self):
+        task_id, created = generation_registry.claim(7, 'weight_loss', 'standard')
+        self.assertTrue(created)
+        self.assertEqual(generation_registry.claim(7, ' Weight_Loss ', 'STANDARD'), (task_id, False))
+        self.assertEqual(generation_registry.owner_of(task_id), 7)
+
+        other_id, created = generation_registry.claim(8, 'weight_loss', 'standard')
+        self.assertTrue(created)
+        self.assertNotEqual(other_id, task_id)
+
+    def test_release_and_finished_tasks_free_the_claim(self):
+        task_id, _ = generation_registry.claim(7, 'weight_loss', 'standard')
+        generation_registry.release(7, 'weight_loss', 'standard')
+        second_id, created = generation_registry.claim(7, 'weight_loss', 'standard')
+        self.assertTrue(created)
+        self.assertNotEqual(second_id, task_id)
+
+        # A task that ended without releasing (dead worker) doesn't block new requests
+        self.finished.add(second_id)
+        third_id, created = generation_registry.claim(7, 'weight_loss', 'standard')
+        self.assertTrue(created)
+        self.assertNotEqual(third_id, second_id)
+
+    def test_completed_results_are_reused(self):
+        generation_registry.claim(7, 'weight_loss', 'standard')
+        self.assertIsNone(generation_registry.get_reusable_result(7, 'weight_loss', 'standard'))
+        generation_registry.complete(7, 'weight_loss', 'standard', {'status': 'success'})
+
+        self.assertEqual(generation_registry.get_reusable_result(7, 'weight_loss', 'standard'), {'status': 'success'})
+        self.assertTrue(generation_registry.claim(7, 'weight_loss', 'standard')[1])
+
+    def test_only_the_holder_extends_a_claim(self):
+        task_id, _ = generation_registry.claim(7, 'weight_loss', 'standard')
+        self.assertTrue(generation_registry.extend(7, 'weight_loss', 'standard', task_id))
+        self.assertFalse(generation_registry.extend(7, 'weight_loss', 'standard', 'someone-else'))
+
+
+class CompressedPlanTests(TestCase):
+    plan = {'Day 1': {'Breakfast': ['Paratha: 1 piece', 'Chai: 1 cup'], 'Lunch': ['Daal chawal – 250g']}}
+
+    def test_zlib_round_trip(self):
+        blob = encode_json(self.plan, codec='zlib')
+        self.assertEqual(blob[0], FORMAT_ZLIB)
+        self.assertEqual(decode_json(blob), self.plan)
+
+    @skipUnless(zstandard, 'zstandard is not installed')
+    def test_zstd_round_trip(self):
+        blob = encode_json(self.plan, codec='zstd')
+        self.assertEqual(blob[0], FORMAT_ZSTD)
+        self.assertEqual(decode_json(memoryview(blob)), self.plan)
+
+    def test_unknown_format_is_rejected(self):
+        with self.assertRaises(ValueError):
+            decode_json(b'\x09' + encode_json(self.plan, codec='zlib')[1:])
+
+    def test_plans_are_saved_compressed_and_decoded_on_access(self):
+        user = get_user_model().objects.create_user(username='compressed', password='x')
+        meal = GenerateMeal(user=user, meal_type='Regular', start_date=date(2026, 1, 1), end_date=date(2026, 1, 1))
+        meal.plan_data = self.plan
+        meal.save()
+
+        loaded = GenerateMeal.objects.get(pk=meal.pk)
+        self.assertIsInstance(loaded.plan_blob, bytes)
+        self.assertEqual(loaded.ai_generated_data, '')
+        self.assertEqual(loaded.plan_data, self.plan)
+
+    def test_legacy_text_plans_load_and_are_compressed_on_save(self):
+        user = get_user_model().objects.create_user(username='legacy', password='x')
+        meal = GenerateMeal.objects.create(user=user, meal_type='Regular', start_date=date(2026, 1, 1),
+                                           end_date=date(2026, 1, 1))
+        GenerateMeal.objects.filter(pk=meal.pk).update(plan_blob=None, ai_generated_data=json.dumps(self.plan))
+
+        legacy = GenerateMeal.objects.get(pk=meal.pk)
+        self.assertEqual(legacy.plan_data, self.plan)
+        legacy.save()
+        loaded = GenerateMeal.objects.get(pk=meal.pk)
+        self.assertEqual((loaded.ai_generated_data, decode_json(loaded.plan_blob)), ('', self.plan))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RunningPlanTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='runner', password='x')
+        self.start = date.today() - timedelta(days=1)
+        plan = {f'Day {day}': {'Lunch': [f'Rice: {100 + day}g']} for day in range(1, 6)}
+        self.plan = save_plan(user=self.user, plan_dict=plan, start_date=self.start,
+                              end_date=self.start + timedelta(days=4))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, etag=None, **params):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse('diet_plans:get-meal-plan'), params, **headers)
+
+    def test_unchanged_plans_answer_304(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['daily_plans']), 5)
+        etag = response['ETag']
+
+        # Only the active-plan lookup
+        with self.assertNumQueries(1):
+            cached = self.get(etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], etag)
+        self.assertEqual(self.get(f'"stale", W/{etag}').status_code, 304)
+
+    def test_plan_edits_change_the_etag(self):
+        etag = self.get()['ETag']
+        append_plan_day(generated_meal=self.plan, day_label='Day 3', meals={'Lunch': ['Daal: 200g']})
+
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['daily_plans'][2]['lunch'], 'Daal: 200g')
+
+    def test_day_window_is_clipped_to_the_plan(self):
+        self.assertEqual(plan_responses.day_window(self.plan), (1, 5))
+        self.assertEqual(plan_responses.day_window(self.plan, self.start + timedelta(days=1)), (2, 5))
+        self.assertEqual(
+            plan_responses.day_window(self.plan, self.start - timedelta(days=3), self.start + timedelta(days=9)), (1, 5)
+        )
+
+    def test_windows_return_their_days_with_their_own_etag(self):
+        whole = self.get()
+        response = self.get(days=2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([day['day'] for day in response.data['daily_plans']], [2, 3])
+        self.assertEqual(response.data['daily_plans'][0]['date'], date.today().isoformat())
+        self.assertEqual(response.data['daily_plans'][0]['items']['Lunch'][0]['grams'], 102)
+        self.assertNotEqual(response['ETag'], whole['ETag'])
+
+        self.assertEqual(self.get(response['ETag'], days=2).status_code, 304)
+        self.assertEqual(self.get(response['ETag']).status_code, 200)
+
+        until = self.get(**{'from': self.start.isoformat(), 'to': (self.start + timedelta(days=30)).isoformat()})
+        self.assertEqual([day['day'] for day in until.data['daily_plans']], [1, 2, 3, 4, 5])
+
+    def test_bad_windows_are_rejected(self):
+        for params in [{'from': '2026-13-01'}, {'days': 0}, {'days': 2, 'to': '2026-01-01'},
+                       {'from': '2026-01-05', 'to': '2026-01-01'}]:
+            with self.subTest(**params):
+                self.assertEqual(self.get(**params).status_code, 400)
@@ -0,0 +1,44 @@
+"""
+Columnar to-do calendar.
+
+A date range of the user's to-do list is returned as parallel columns instead
+of one dict per item: `dates`, and for each date a bitmask of the meal times
+that have an item (`planned`) and of those completed (`completed`). Bit i
+stands for MEAL_TIMES[i], so Breakfast is 1, Lunch 2, Dinner 4 and Snacks 8.
+The columns are read from the DailyAdherence summaries, one row per day.
+"""
+import calendar
+from datetime import date
+from diet_plans.adherence import MEAL_TIMES
+from diet_plans.models import DailyAdherence
+
+# Longest range one request may ask for (a quarter)
+CALENDAR_MAX_DAYS = 92
+
+
+def month_range(value):
+    """First and last date of a YYYY-MM month"""
+    try:
+        year, month = (int(part) for part in value.split('-'))
+        last = calendar.monthrange(year, month)[1]
+    except (ValueError, calendar.IllegalMonthError):
+        raise ValueError('Invalid month, expected YYYY-MM')
+    return date(year, month, 1), date(year, month, last)
+
+
+def build_calendar(user, from_date, to_date):
+    """Columnar calendar of the user's to-do items from from_date to to_date (inclusive), in one query"""
+    rows = list(DailyAdherence.objects
+                .filter(user=user, date__range=(from_date, to_date), meals_planned__gt=0)
+                .order_by('date')
+                .values_list('date', 'planned_mask', 'completed_mask'))
+
+    return {
+        'from': from_date.strftime('%Y-%m-%d'),
+        'to': to_date.strftime('%Y-%m-%d'),
+        'meal_times': MEAL_TIMES,
+        'dates': [day.strftime('%Y-%m-%d') for day, _, _ in rows],
+        'planned': [planned for _, planned, _ in rows],
+        'completed': [completed for _, _, completed in rows],
+        'completed_days': sum(1 for _, planned, completed in rows if completed == planned),
+    }
@@ -1,11 +1,18 @@
 from django.urls import path
-from diet_plans.views import SaveAIDietPlanAPIView, GetGeneratedMealPlanAPIView, ToDoListAPIView
+from diet_plans.views import (
+    SaveAIDietPlanAPIView, GetGeneratedMealPlanAPIView, ToDoListAPIView, GenerateDietPlanAPIView,
+    DietPlanTaskStatusAPIView, ToDoCompletionAPIView, ToDoCalendarAPIView,
+)
 
 app_name = 'diet_plans'
 
 urlpatterns = [
     # Diet plan endpoints
+    path('generate-plan/', GenerateDietPlanAPIView.as_view(), name='generate-plan'),
+    path('generate-plan/<str:task_id>/', DietPlanTaskStatusAPIView.as_view(), name='generate-plan-status'),
     path('save-ai-plan/', SaveAIDietPlanAPIView.as_view(), name='save-ai-plan'),
     path('running-meal-plan/', GetGeneratedMealPlanAPIView.as_view(), name='get-meal-plan'),
     path('todo/', ToDoListAPIView.as_view(), name='todo-list'),
+    path('todo/complete/', ToDoCompletionAPIView.as_view(), name='todo-complete'),
+    path('todo/calendar/', ToDoCalendarAPIView.as_view(), name='todo-calendar'),
 ]
@@ -7,9 +7,11 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from datetime import datetime, timedelta
 from django.utils.dateparse import parse_date
-import json
 
+from celery.result import AsyncResult
+from diet_plans import generation_registry, plan_responses, scheduler, todo_calendar
 from diet_plans.models import GenerateMeal, ToDoList
+from services.save_data import TODO_COMPLETION_BATCH_MAX, save_plan, set_todo_completion
 
 logger = logging.getLogger(__name__)
 
@@ -58,44 +60,33 @@ class SaveAIDietPlanAPIView(APIView):
                     "Snacks": [day_data.get('snacks', '')]
                 }
 
-            # Create the meal plan using existing GenerateMeal model
-            meal_plan = GenerateMeal.objects.create(
+            # ToDoList entries for each day and meal time; an existing entry for the
+            # same date and meal time is overwritten, and keeps its completion only
+            # if its meal is unchanged
+            meal_times = ['Breakfast', 'Lunch', 'Dinner', 'Snacks']
+            todo_rows = [
+                ToDoList(
+                    user=request.user,
+                    meal=day_data.get(meal_time.lower(), ''),
+                    day=day_data.get('day', 1),
+                    meal_time=meal_time,
+                    date_of_meal=parse_date(day_data.get('date')),
+                    is_completed=False,
+                )
+                for day_data in days_data
+                for meal_time in meal_times
+            ]
+
+            # Plan, day rows and to-do entries are saved together in one transaction
+            meal_plan = save_plan(
                 user=request.user,
+                plan_dict=ai_generated_data,
+                meal_type=meal_type,
                 start_date=start_date_obj,
                 end_date=end_date_obj,
-                meal_type=meal_type,
-                ai_generated_data=json.dumps(ai_generated_data)
+                todo_rows=todo_rows,
             )
 
-            # Create ToDoList entries for each day and meal time
-            meal_times = ['Breakfast', 'Lunch', 'Dinner', 'Snacks']
-
-            for day_data in days_data:
-                day_number = day_data.get('day', 1)
-                day_date = parse_date(day_data.get('date'))
-
-                for meal_time in meal_times:
-                    meal_content = day_data.get(meal_time.lower(), '')
-
-                    # Use get_or_create to avoid UNIQUE constraint errors
-                    todo_item, created = ToDoList.objects.get_or_create(
-                        user=request.user,
-                        date_of_meal=day_date,
-                        meal_time=meal_time,
-                        defaults={
-                            'meal': meal_content,
-                            'day': day_number,
-                            'is_completed': False
-                        }
-                    )
-
-                    # If the item already exists, update it with new meal content
-                    if not created:
-                        todo_item.meal = meal_content
-                        todo_item.day = day_number
-                        todo_item.is_completed = False  # Reset completion status
-                        todo_item.save()
-
             logger.info(f"Successfully saved AI diet plan with ID: {meal_plan.id}")
 
             return Response({
@@ -115,64 +106,119 @@ class SaveAIDietPlanAPIView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-# Keep the existing views but remove Celery dependencies
+class GenerateDietPlanAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Start generating a diet plan in the background. Identical requests
+        (same goal and meal type) share one task while it runs, and a result
+        finished in the last few minutes is returned instead of a new task.
+        """
+        try:
+            goal = request.data.get('goal') or request.user.goal
+            meal_type = request.data.get('meal_type', 'Regular')
+
+            result = generation_registry.get_reusable_result(request.user.id, goal, meal_type)
+            if result:
+                return Response({**result, 'reused': True}, status=status.HTTP_200_OK)
+
+            task_id, created = generation_registry.claim(request.user.id, goal, meal_type)
+            if created:
+                try:
+                    scheduler.submit(request.user.id, task_id, [request.user.id, goal, meal_type])
+                except Exception:
+                    generation_registry.release(request.user.id, goal, meal_type)
+                    raise
+                logger.info(f"Queued diet plan task {task_id} for user {request.user.id}")
+            else:
+                logger.info(f"Reusing in-flight diet plan task {task_id} for user {request.user.id}")
+
+            return Response({
+                'task_id': task_id,
+                'status': 'PENDING',
+                'deduplicated': not created,
+                'message': 'Diet plan generation started',
+                'queue': scheduler.estimate(task_id),
+            }, status=status.HTTP_202_ACCEPTED)
+
+        except Exception as e:
+            logger.error(f"Error starting diet plan generation: {str(e)}", exc_info=True)
+            return Response({
+                'error': 'Failed to start diet plan generation',
+                'details': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class DietPlanTaskStatusAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, task_id):
+        """Progress or result of a diet plan generation task"""
+        if generation_registry.owner_of(task_id) != request.user.id:
+            return Response({
+                'error': 'Task not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        task = AsyncResult(task_id)
+        response = {'task_id': task_id, 'state': task.state}
+        if task.state == 'SUCCESS':
+            response.update(task.result or {})
+        elif task.state == 'FAILURE':
+            response.update({'status': 'Failed to generate diet plan', 'error': str(task.result)})
+        elif isinstance(task.info, dict):
+            response.update(task.info)
+        elif task.state == 'PENDING':
+            scheduler.tick()
+            response['queue'] = scheduler.estimate(task_id)
+        return Response(response, status=status.HTTP_200_OK)
+
+
 class GetGeneratedMealPlanAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
+        """
+        The active meal plan. Optional query parameters limit it to a window:
+        `from` and `to` (YYYY-MM-DD, inclusive), or `days` (count of days
+        starting at `from`, default today).
+        """
         try:
             today_date = datetime.now().date()
 
-            # Find meal plans that are currently active (today falls within start_date and end_date)
-            meal_plans = GenerateMeal.objects.filter(
-                user=request.user,
-                start_date__lte=today_date,
-                end_date__gte=today_date
+            try:
+                from_date, to_date = self.parse_window(request.query_params, today_date)
+            except ValueError as e:
+                return Response({
+                    'error': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            # Find the meal plan that is currently active (today falls within start_date and end_date).
+            # The plan blob is only kept for audit; the days are read from their own rows
+            meal_plan = GenerateMeal.objects.defer('plan_blob', 'ai_generated_data').active_for(
+                request.user, today_date
             )
 
-            if meal_plans.exists():
-                if meal_plans.count() > 1:
-                    # If multiple active plans, choose the one marked as running or the most recent one
-                    meal_plan = meal_plans.filter(is_running=True).order_by('-start_date').first()
-                    if not meal_plan:
-                        meal_plan = meal_plans.order_by('-start_date').first()
-                else:
-                    meal_plan = meal_plans.first()
-            else:
+            if not meal_plan:
                 return Response({
                     'error': 'No active meal plan found'
                 }, status=status.HTTP_404_NOT_FOUND)
 
-            # Parse the JSON data
-            ai_data = json.loads(meal_plan.ai_generated_data)
-
-            # Convert to the format expected by frontend
-            daily_plans = []
-            for day_key, meals in ai_data.items():
-                if day_key.startswith('Day '):
-                    day_number = int(day_key.split(' ')[1])
-                    # Calculate the date for this day
-                    day_date = meal_plan.start_date + timedelta(days=day_number - 1)
-
-                    daily_plans.append({
-                        'day': day_number,
-                        'date': day_date.strftime('%Y-%m-%d'),
-                        'breakfast': meals.get('Breakfast', [''])[0],
-                        'lunch': meals.get('Lunch', [''])[0],
-                        'dinner': meals.get('Dinner', [''])[0],
-                        'snacks': meals.get('Snacks', [''])[0]
-                    })
-
-            # Sort by day number
-            daily_plans.sort(key=lambda x: x['day'])
+            first_day = last_day = None
+            if from_date or to_date:
+                first_day, last_day = plan_responses.day_window(meal_plan, from_date, to_date)
 
-            return Response({
-                'id': meal_plan.id,
-                'daily_plans': daily_plans,
-                'start_date': meal_plan.start_date.strftime('%Y-%m-%d'),
-                'end_date': meal_plan.end_date.strftime('%Y-%m-%d'),
-                'meal_type': meal_plan.meal_type
-            }, status=status.HTTP_200_OK)
+            # The ETag changes with every plan edit, so an unchanged plan costs one query
+            etag = plan_responses.etag(meal_plan, first_day, last_day)
+            if plan_responses.etag_matches(request, etag):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = Response(
+                    plan_responses.get_running_plan(meal_plan, first_day, last_day), status=status.HTTP_200_OK
+                )
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            return response
 
         except GenerateMeal.DoesNotExist:
             return Response({
@@ -185,6 +231,33 @@ class GetGeneratedMealPlanAPIView(APIView):
                 'details': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @staticmethod
+    def parse_window(params, today_date):
+        """(from_date, to_date) requested by the query parameters; (None, None) for the whole plan"""
+        from_date = to_date = None
+        if params.get('from'):
+            from_date = parse_date(params['from'])
+            if from_date is None:
+                raise ValueError('Invalid from date, expected YYYY-MM-DD')
+        if params.get('to'):
+            to_date = parse_date(params['to'])
+            if to_date is None:
+                raise ValueError('Invalid to date, expected YYYY-MM-DD')
+        if params.get('days'):
+            if to_date:
+                raise ValueError('Use either to or days, not both')
+            try:
+                days = int(params['days'])
+            except ValueError:
+                raise ValueError('days must be a positive integer')
+            if days < 1:
+                raise ValueError('days must be a positive integer')
+            from_date = from_date or today_date
+            to_date = from_date + timedelta(days=days - 1)
+        if from_date and to_date and from_date > to_date:
+            raise ValueError('from must not be after to')
+        return from_date, to_date
+
 
 class ToDoListAPIView(APIView):
     permission_classes = [IsAuthenticated]
@@ -197,6 +270,7 @@ class ToDoListAPIView(APIView):
         try:
             today = datetime.now().date()
             todo_items = ToDoList.objects.filter(user=request.user, date_of_meal=today)
+            meal_plan = GenerateMeal.objects.only('id', 'start_date').active_for(request.user, today)
 
             # Serialize the data
             serialized_items = [
@@ -212,7 +286,9 @@ class ToDoListAPIView(APIView):
             ]
 
             return Response({
-                'todo_list': serialized_items
+                'todo_list': serialized_items,
+                'meal_plan_id': meal_plan.id if meal_plan else None,
+                'plan_day': (today - meal_plan.start_date).days + 1 if meal_plan else None,
             }, status=status.HTTP_200_OK)
         except Exception as e:
             logger.error(f"Error retrieving to-do diet list: {str(e)}", exc_info=True)
@@ -240,74 +316,164 @@ class ToDoListAPIView(APIView):
                     'error': 'Exactly 4 items must be provided (Breakfast, Lunch, Dinner, Snacks)'
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Extract item IDs and completion statuses
-            item_ids = []
-            completion_statuses = []
+            changes, error = parse_completion_items(items_data)
+            if error:
+                return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
 
-            for item_data in items_data:
-                item_id = item_data.get('id')
-                is_completed = item_data.get('is_completed')
-
-                if item_id is None or is_completed is None:
-                    return Response({
-                        'error': 'Each item must have id and is_completed fields'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-
-                item_ids.append(item_id)
-                completion_statuses.append(is_completed)
+            # Check if all items are marked as completed
+            if not all(changes.values()):
+                return Response({
+                    'error': 'All 4 items must be marked as completed to update'
+                }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Verify all items belong to the user and are for today
+            # Verify all items belong to the user and are for today, then update them together
             today = datetime.now().date()
-            todo_items = ToDoList.objects.filter(
-                id__in=item_ids,
-                user=request.user,
-                date_of_meal=today
+            updated_items, missing_ids = set_todo_completion(
+                user=request.user, changes=changes, date_of_meal=today
             )
-
-            if todo_items.count() != 4:
+            if missing_ids or len(updated_items) != 4:
                 return Response({
                     'error': 'All 4 items must belong to you and be for today'
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Check if all items are marked as completed
-            all_completed = all(completion_statuses)
+            return Response({
+                'message': 'All to-do items updated successfully',
+                'items': [serialize_todo_row(row) for row in updated_items]
+            }, status=status.HTTP_200_OK)
 
-            if not all_completed:
+        except Exception as e:
+            logger.error(f"Error updating to-do diet items: {str(e)}", exc_info=True)
+            return Response({
+                'error': 'Failed to update to-do diet items',
+                'details': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ToDoCompletionAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """
+        Set the completion status of any of the user's to-do items, on any dates.
+        Body: {"items": [{"id": 1, "is_completed": true}, ...]}. Either every
+        item is updated or none is; the query count doesn't depend on the batch size.
+        """
+        try:
+            items_data = request.data.get('items', [])
+
+            if not items_data:
                 return Response({
-                    'error': 'All 4 items must be marked as completed to update'
+                    'error': 'Items array is required'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            if len(items_data) > TODO_COMPLETION_BATCH_MAX:
+                return Response({
+                    'error': f'At most {TODO_COMPLETION_BATCH_MAX} items can be updated at once'
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Update all items since validation passed
-            updated_items = []
-            for item_data in items_data:
-                item_id = item_data['id']
-                is_completed = item_data['is_completed']
-
-                todo_item = todo_items.get(id=item_id)
-                todo_item.is_completed = is_completed
-                todo_item.save()
-
-                updated_items.append({
-                    'id': todo_item.id,
-                    'meal': todo_item.meal,
-                    'day': todo_item.day,
-                    'meal_time': todo_item.meal_time,
-                    'date_of_meal': todo_item.date_of_meal.strftime('%Y-%m-%d'),
-                    'is_completed': todo_item.is_completed
-                })
+            changes, error = parse_completion_items(items_data)
+            if error:
+                return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+            updated_items, missing_ids = set_todo_completion(user=request.user, changes=changes)
+            if missing_ids:
+                return Response({
+                    'error': 'One or more to-do items not found',
+                    'missing_ids': missing_ids
+                }, status=status.HTTP_404_NOT_FOUND)
 
             return Response({
-                'message': 'All to-do items updated successfully',
-                'items': updated_items
+                'message': 'To-do items updated successfully',
+                'items': [serialize_todo_row(row) for row in updated_items]
             }, status=status.HTTP_200_OK)
 
-        except ToDoList.DoesNotExist:
-            return Response({
-                'error': 'One or more to-do items not found'
-            }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             logger.error(f"Error updating to-do diet items: {str(e)}", exc_info=True)
             return Response({
                 'error': 'Failed to update to-do diet items',
                 'details': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ToDoCalendarAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        The user's to-do items over a range as columns (see diet_plans.todo_calendar).
+        Range: `month` (YYYY-MM), `window=plan` (the active plan), or `from`/`to`/`days`
+        as for running-meal-plan. Defaults to the current month.
+        """
+        try:
+            today_date = datetime.now().date()
+            params = request.query_params
+
+            try:
+                if params.get('month'):
+                    from_date, to_date = todo_calendar.month_range(params['month'])
+                elif params.get('window') == 'plan':
+                    meal_plan = GenerateMeal.objects.only('id', 'start_date', 'end_date').active_for(
+                        request.user, today_date
+                    )
+                    if not meal_plan:
+                        return Response({
+                            'error': 'No active meal plan found'
+                        }, status=status.HTTP_404_NOT_FOUND)
+                    from_date, to_date = meal_plan.start_date, meal_plan.end_date
+                else:
+                    from_date, to_date = GetGeneratedMealPlanAPIView.parse_window(params, today_date)
+                    if not from_date and not to_date:
+                        from_date, to_date = todo_calendar.month_range(today_date.strftime('%Y-%m'))
+                    from_date = from_date or to_date.replace(day=1)
+                    to_date = to_date or from_date + timedelta(days=todo_calendar.CALENDAR_MAX_DAYS - 1)
+            except ValueError as e:
+                return Response({
+                    'error': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            if (to_date - from_date).days + 1 > todo_calendar.CALENDAR_MAX_DAYS:
+                return Response({
+                    'error': f'At most {todo_calendar.CALENDAR_MAX_DAYS} days can be requested at once'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            return Response(todo_calendar.build_calendar(request.user, from_date, to_date), status=status.HTTP_200_OK)
+
+        except Exception as e:
+            logger.error(f"Error retrieving to-do calendar: {str(e)}", exc_info=True)
+            return Response({
+                'error': 'Failed to retrieve to-do calendar',
+                'details': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def parse_completion_items(items_data):
+    """[{"id", "is_completed"}, ...] -> ({todo_id: is_completed}, error message or None)"""
+    if not isinstance(items_data, list):
+        return None, 'Items must be a list'
+
+    changes = {}
+    for item_data in items_data:
+        if not isinstance(item_data, dict):
+            return None, 'Each item must have id and is_completed fields'
+        item_id = item_data.get('id')
+        is_completed = item_data.get('is_completed')
+        if item_id is None or is_completed is None:
+            return None, 'Each item must have id and is_completed fields'
+        if is_completed not in (True, False):
+            return None, 'is_completed must be true or false'
+        try:
+            changes[int(item_id)] = bool(is_completed)
+        except (TypeError, ValueError):
+            return None, f'Invalid to-do item id: {item_id}'
+    return changes, None
+
+
+def serialize_todo_row(row):
+    return {
+        'id': row['id'],
+        'meal': row['meal'],
+        'day': row['day'],
+        'meal_time': row['meal_time'],
+        'date_of_meal': row['date_of_meal'].strftime('%Y-%m-%d'),
+        'is_completed': row['is_completed']
+    }
@@ -44,6 +44,16 @@ app.conf.update(
     # Task routing (optional)
     task_routes={
         'diet_plans.tasks.generate_diet_plan_async': {'queue': 'diet_plans'},
+        'diet_plans.tasks.generate_plan_chunk': {'queue': 'diet_plans'},
+        'diet_plans.tasks.merge_plan_chunks': {'queue': 'diet_plans'},
+    },
+
+    # Periodic tasks (celery beat)
+    beat_schedule={
+        'tick-plan-scheduler': {
+            'task': 'diet_plans.tasks.tick_plan_scheduler',
+            'schedule': 60.0,
+        },
     },
 )
 
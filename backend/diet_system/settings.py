@@ -109,6 +109,59 @@ CELERY_WORKER_MAX_TASKS_PER_CHILD = 1000
 CELERY_TASK_TIME_LIMIT = 900  # 15 minutes
 CELERY_TASK_SOFT_TIME_LIMIT = 840  # 14 minutes
 
+# How generate_diet_plan_async produces plans:
+#   'batch'     - wait for the whole 30-day plan, then save it
+#   'streaming' - save each day as soon as the AI produces it
+#   'chunked'   - generate DIET_PLAN_CHUNK_DAYS-day ranges as parallel tasks (Celery chord)
+DIET_PLAN_GENERATION_MODE = config('DIET_PLAN_GENERATION_MODE', default='batch')
+DIET_PLAN_CHUNK_DAYS = config('DIET_PLAN_CHUNK_DAYS', default=5, cast=int)
+
+# How long a finished generation result is returned to an identical request
+# (same user, goal and meal type) instead of starting a new task
+DIET_PLAN_RESULT_REUSE_SECONDS = config('DIET_PLAN_RESULT_REUSE_SECONDS', default=600, cast=int)
+
+# Fair-share scheduling of generation jobs (diet_plans/scheduler.py): at most
+# DIET_PLAN_SCHEDULER_SLOTS jobs are handed to the diet_plans queue at once
+# (match the workers' total concurrency), and at most DIET_PLAN_MAX_JOBS_PER_USER
+# of them belong to the same user. Needs the Redis cache and Celery beat
+# (`celery -A diet_system beat`) for the tick-plan-scheduler entry, which
+# reclaims the slots of jobs that died without finishing; off by default
+DIET_PLAN_SCHEDULER_ENABLED = config('DIET_PLAN_SCHEDULER_ENABLED', default=False, cast=bool)
+DIET_PLAN_SCHEDULER_SLOTS = config('DIET_PLAN_SCHEDULER_SLOTS', default=4, cast=int)
+DIET_PLAN_MAX_JOBS_PER_USER = config('DIET_PLAN_MAX_JOBS_PER_USER', default=1, cast=int)
+
+# Backend generate_diet_plan_async asks for plans (see services/ai_backends.py):
+# 'remote' (production model), 'http' (e.g. `manage.py run_ai_stub`) or 'offline'
+DIET_PLAN_AI_BACKEND = config('DIET_PLAN_AI_BACKEND', default='remote')
+DIET_PLAN_AI_BACKEND_URL = config('DIET_PLAN_AI_BACKEND_URL', default='http://127.0.0.1:8765/plan')
+DIET_PLAN_AI_TIMEOUT = config('DIET_PLAN_AI_TIMEOUT', default=600, cast=float)  # seconds
+
+# Offline plan generator (services/offline_diet_plan.py, built from the bundled food table):
+#   'off'      - always use the AI
+#   'fallback' - use it when the AI call fails or hits the soft time limit, so an
+#                AI outage yields a table-based plan (allergies and vegetarian/
+#                vegan/halal diets applied) instead of a failed task
+#   'always'   - never call the AI
+DIET_PLAN_OFFLINE_MODE = config('DIET_PLAN_OFFLINE_MODE', default='fallback')
+
+# Codec for GenerateMeal.plan_blob: 'zstd' (needs the zstandard package, falls
+# back to zlib without it) or 'zlib'. Existing rows keep their codec.
+PLAN_DATA_COMPRESSION = config('PLAN_DATA_COMPRESSION', default='zstd')
+
+# How long a precomputed running-meal-plan response is kept (entries are keyed by
+# plan version, so edits never serve stale data)
+RUNNING_PLAN_CACHE_TTL = config('RUNNING_PLAN_CACHE_TTL', default=60 * 60 * 24, cast=int)
+
+# AI plan cache (profile-bucketed, stored in the default cache)
+PLAN_CACHE_ENABLED = config('PLAN_CACHE_ENABLED', default=True, cast=bool)
+PLAN_CACHE_TTL = config('PLAN_CACHE_TTL', default=60 * 60 * 24 * 7, cast=int)  # 7 days
+PLAN_CACHE_MAX_ENTRIES = config('PLAN_CACHE_MAX_ENTRIES', default=5000, cast=int)
+PLAN_CACHE_BUCKETS = {
+    'age': 5,  # years
+    'height_cm': 5,
+    'weight_kg': 5,
+}
+
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
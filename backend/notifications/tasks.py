@@ -3,6 +3,7 @@ from django.utils import timezone
 from datetime import time, timedelta
 from .models import UserNotification, NotificationTemplate, UserNotificationSettings
 from django.contrib.auth import get_user_model
+from diet_plans.models import GenerateMeal
 
 User = get_user_model()
 
@@ -10,8 +11,10 @@ User = get_user_model()
 def send_meal_reminders():
     """Send meal reminders based on user preferences"""
     current_time = timezone.now().time()
+    # Users with an active diet plan today, resolved in one query
+    users_with_plan = set(GenerateMeal.objects.active_on(timezone.now().date()).values_list('user_id', flat=True))
     
-    for settings in UserNotificationSettings.objects.filter(meal_reminders=True):
+    for settings in UserNotificationSettings.objects.filter(meal_reminders=True).select_related('user'):
         user = settings.user
         
         # Check if it's time for any meal reminder
@@ -26,8 +29,7 @@ def send_meal_reminders():
                    (meal_time.hour * 60 + meal_time.minute)) <= 5:  # 5 minute window
                 
                 # Check if user has an active diet plan
-                active_plan = user.diet_plans.filter(is_active=True).first()
-                if active_plan:
+                if user.id in users_with_plan:
                     template = NotificationTemplate.objects.filter(
                         notification_type='meal_reminder'
                     ).first()
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from diet_plans.models import DailyAdherence
+from progress.models import Achievement, UserStreak
+from progress.streaks import achievements_between, streak_runs
+
+
+class Command(BaseCommand):
+    help = 'Compute meal-plan streaks and streak achievements from daily adherence in one ordered pass'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        rows = (DailyAdherence.objects
+                .filter(meals_planned__gt=0, completed_mask=F('planned_mask'))
+                .order_by('user_id', 'date')
+                .values_list('user_id', 'date'))
+
+        streaks, achievements = [], []
+        users = awarded = 0
+
+        def flush():
+            nonlocal users, awarded
+            if not streaks:
+                return
+            with transaction.atomic():
+                UserStreak.objects.bulk_create(
+                    streaks,
+                    update_conflicts=True,
+                    unique_fields=['user'],
+                    update_fields=['current_streak', 'last_completed_date', 'updated_at'],
+                    batch_size=batch_size,
+                )
+                # The best streak never drops: keep an existing one higher than the history shows
+                UserStreak.objects.filter(user_id__in=[streak.user_id for streak in streaks]).update(
+                    best_streak=Greatest('best_streak', Case(
+                        *[When(user_id=streak.user_id, then=Value(streak.best_streak)) for streak in streaks],
+                        output_field=IntegerField(),
+                    ))
+                )
+                Achievement.objects.bulk_create(achievements, ignore_conflicts=True, batch_size=batch_size)
+            users += len(streaks)
+            awarded += len(achievements)
+            streaks.clear()
+            achievements.clear()
+
+        def add_user(user_id, days):
+            current, best, last = streak_runs(days)
+            streaks.append(UserStreak(user_id=user_id, current_streak=current, best_streak=best,
+                                      last_completed_date=last))
+            achievements.extend(achievements_between(user_id, 0, best))
+            if len(streaks) >= batch_size:
+                flush()
+
+        user_id, days = None, []
+        for row_user_id, day in rows.iterator(chunk_size=batch_size * 4):
+            if row_user_id != user_id:
+                if user_id is not None:
+                    add_user(user_id, days)
+                user_id, days = row_user_id, []
+            days.append(day)
+        if user_id is not None:
+            add_user(user_id, days)
+        flush()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Computed streaks for {users} users ({awarded} streak achievements checked)"
+        ))
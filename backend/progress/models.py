@@ -29,6 +29,20 @@ class CalorieLog(models.Model):
         unique_together = ['user', 'date_recorded']
         ordering = ['-date_recorded']
 
+class UserStreak(models.Model):
+    """Consecutive fully completed meal-plan days, kept current by progress.streaks"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='streak')
+    current_streak = models.PositiveIntegerField(default=0)
+    best_streak = models.PositiveIntegerField(default=0)  # best ever reached; never drops
+    last_completed_date = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def current_on(self, day):
+        """The streak as seen on day: it is broken once a whole day passes uncompleted"""
+        if self.last_completed_date is None or (day - self.last_completed_date).days > 1:
+            return 0
+        return self.current_streak
+
 class Achievement(models.Model):
     ACHIEVEMENT_TYPES = [
         ('streak_7', '7 Day Streak'),
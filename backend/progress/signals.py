@@ -0,0 +1,9 @@
+from django.dispatch import receiver
+from diet_plans.adherence import day_completion_changed
+from . import streaks
+
+
+@receiver(day_completion_changed)
+def update_streak(sender, user_id, completed, uncompleted, **kwargs):
+    """Advance (or roll back) the user's streak when whole plan days are completed or undone"""
+    streaks.record_days(user_id, completed, uncompleted)
@@ -0,0 +1,110 @@
+"""
+Meal-plan streaks and the streak_7/14/30 achievements.
+
+A day counts towards a streak when every planned meal of it is completed (see
+diet_plans.adherence). Each day-completion event updates the user's UserStreak
+in constant time from its last_completed_date. The few events that can't be
+applied that way (a past day completed or un-done inside the current run)
+recount the streak from the DailyAdherence summaries. Achievements are created
+only when the best streak crosses one of their lengths.
+"""
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F
+from diet_plans.models import DailyAdherence
+from .models import Achievement, UserStreak
+
+STREAK_ACHIEVEMENTS = [
+    (7, 'streak_7', '7 Day Streak!', 'You completed every meal of your plan for 7 days in a row.'),
+    (14, 'streak_14', '14 Day Streak!', 'Two full weeks of completed meal plans. Keep it going!'),
+    (30, 'streak_30', '30 Day Streak!', 'A whole month of completed meal plans. Outstanding!'),
+]
+STREAK_BADGE = '🔥'
+
+ONE_DAY = timedelta(days=1)
+
+
+def apply_day(streak, day, completed):
+    """
+    Update streak in place for one day becoming complete (or no longer
+    complete). Returns False when the change can't be applied without a recount.
+    """
+    last = streak.last_completed_date
+    if completed:
+        if last is None or day > last:
+            streak.current_streak = streak.current_streak + 1 if last == day - ONE_DAY else 1
+            streak.last_completed_date = day
+        elif day != last:
+            # A past day may join two runs
+            return False
+    else:
+        if last is None or day > last or day <= last - timedelta(days=streak.current_streak):
+            return True  # outside the current run
+        if day != last or streak.current_streak <= 1:
+            return False
+        # The run before the last day is still intact
+        streak.current_streak -= 1
+        streak.last_completed_date = day - ONE_DAY
+    streak.best_streak = max(streak.best_streak, streak.current_streak)
+    return True
+
+
+def streak_runs(days):
+    """(current, best, last day) for ascending completed days; current is the run ending on the last day"""
+    current = best = 0
+    last = None
+    for day in days:
+        current = current + 1 if last is not None and day == last + ONE_DAY else 1
+        best = max(best, current)
+        last = day
+    return current, best, last
+
+
+def completed_days(user_id):
+    return (DailyAdherence.objects
+            .filter(user_id=user_id, meals_planned__gt=0, completed_mask=F('planned_mask'))
+            .order_by('date')
+            .values_list('date', flat=True))
+
+
+def recount(streak):
+    """Rebuild the current run from the user's daily adherence history (the best streak never drops)"""
+    current, best, last = streak_runs(completed_days(streak.user_id))
+    streak.current_streak, streak.last_completed_date = current, last
+    streak.best_streak = max(streak.best_streak, best)
+
+
+def achievements_between(user_id, previous_best, best):
+    """Unsaved Achievement rows for the streak lengths in (previous_best, best]"""
+    return [
+        Achievement(user_id=user_id, achievement_type=achievement_type, title=title,
+                    description=description, badge_icon=STREAK_BADGE)
+        for length, achievement_type, title, description in STREAK_ACHIEVEMENTS
+        if previous_best < length <= best
+    ]
+
+
+def record_days(user_id, completed=(), uncompleted=()):
+    """Apply day-completion changes to the user's streak and award any streak achievements reached"""
+    changes = sorted([(day, True) for day in completed] + [(day, False) for day in uncompleted])
+    if not changes:
+        return None
+
+    with transaction.atomic():
+        streak, _ = UserStreak.objects.select_for_update().get_or_create(user_id=user_id)
+        previous_best = streak.best_streak
+        if not all(apply_day(streak, day, is_completed) for day, is_completed in changes):
+            recount(streak)
+        streak.save()
+
+        for achievement in achievements_between(user_id, previous_best, streak.best_streak):
+            Achievement.objects.get_or_create(
+                user_id=user_id,
+                achievement_type=achievement.achievement_type,
+                defaults={
+                    'title': achievement.title,
+                    'description': achievement.description,
+                    'badge_icon': achievement.badge_icon,
+                }
+            )
+    return streak
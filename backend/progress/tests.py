@@ -0,0 +1,47 @@
+from datetime import date, timedelta
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from diet_plans.models import DailyAdherence, ToDoList
+from services.save_data import plan_todo_rows, set_todo_completion, upsert_todo_rows
+from .models import Achievement, UserStreak
+
+
+class StreakTests(TestCase):
+    start = date(2026, 1, 1)
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='streaker', password='x')
+        plan = {f'Day {day}': {'Lunch': ['Rice: 185g']} for day in range(1, 9)}
+        upsert_todo_rows(plan_todo_rows(self.user, plan, self.start))
+
+    def complete(self, *days, done=True):
+        todos = ToDoList.objects.filter(
+            user=self.user, date_of_meal__in=[self.start + timedelta(days=day - 1) for day in days]
+        )
+        set_todo_completion(user=self.user, changes={todo.id: done for todo in todos})
+        return UserStreak.objects.get(user=self.user)
+
+    def test_consecutive_days_extend_the_streak_and_award_achievements(self):
+        streak = self.complete(*range(1, 8))
+        self.assertEqual((streak.current_streak, streak.best_streak), (7, 7))
+        self.assertTrue(Achievement.objects.filter(user=self.user, achievement_type='streak_7').exists())
+
+    def test_undoing_a_day_splits_the_run_but_keeps_the_best(self):
+        self.complete(1, 2, 3, 4)
+        streak = self.complete(2, done=False)
+        self.assertEqual((streak.current_streak, streak.best_streak), (2, 4))
+        self.assertEqual(streak.last_completed_date, self.start + timedelta(days=3))
+
+        streak = self.complete(2)
+        self.assertEqual((streak.current_streak, streak.best_streak), (4, 4))
+
+    def test_backfill_matches_live_streak_and_never_lowers_best(self):
+        self.complete(1, 2, 3)
+        UserStreak.objects.filter(user=self.user).update(best_streak=10)
+        DailyAdherence.objects.filter(user=self.user, date=self.start).delete()
+
+        call_command('backfill_streaks', stdout=StringIO())
+        streak = UserStreak.objects.get(user=self.user)
+        self.assertEqual((streak.current_streak, streak.best_streak), (2, 10))
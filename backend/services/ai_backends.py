@@ -0,0 +1,106 @@
+"""
+Diet plan generation backends.
+
+generate_diet_plan_async talks to whichever backend DIET_PLAN_AI_BACKEND
+selects, so the paid remote model can be swapped for the offline generator or
+an HTTP endpoint such as the bundled stub server (`manage.py run_ai_stub`):
+
+    'remote'  - services.ai_served_diet_plan (the production model)
+    'http'    - POST user_data as JSON to DIET_PLAN_AI_BACKEND_URL
+    'offline' - services.offline_diet_plan
+"""
+import abc
+import json
+import urllib.error
+import urllib.request
+from django.conf import settings
+from services.offline_diet_plan import generate_offline_meal_suggestions
+
+
+class AIBackendError(Exception):
+    """The backend failed or returned something that isn't a plan"""
+
+
+class AIBackend(abc.ABC):
+    """Produces {"Day N": {meal_time: [items]}} plans for a user_data dict"""
+
+    name = None
+
+    @abc.abstractmethod
+    def generate(self, user_data):
+        """Return the whole plan"""
+
+    def stream(self, user_data):
+        """Yield ("Day N", meals) pairs; backends without streaming yield the whole plan"""
+        yield from self.generate(user_data).items()
+
+
+class RemoteAIBackend(AIBackend):
+    name = 'remote'
+
+    def __init__(self):
+        try:
+            from services import ai_served_diet_plan
+        except ImportError as e:
+            raise AIBackendError("AI diet plan service is not installed") from e
+        self.service = ai_served_diet_plan
+
+    def generate(self, user_data):
+        return self.service.generate_meal_suggestions(user_data)
+
+    def stream(self, user_data):
+        stream_meal_suggestions = getattr(self.service, 'stream_meal_suggestions', None)
+        if stream_meal_suggestions is None:
+            yield from super().stream(user_data)
+        else:
+            yield from stream_meal_suggestions(user_data)
+
+
+class HTTPAIBackend(AIBackend):
+    name = 'http'
+
+    def __init__(self, url, timeout):
+        if not url:
+            raise AIBackendError("DIET_PLAN_AI_BACKEND_URL is not set")
+        self.url = url
+        self.timeout = timeout
+
+    def generate(self, user_data):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(user_data, default=str).encode(),
+            headers={'Content-Type': 'application/json'},
+            method='POST',
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = response.read()
+        except (urllib.error.URLError, TimeoutError) as e:
+            raise AIBackendError(f"Request to {self.url} failed: {e}") from e
+
+        try:
+            plan = json.loads(body)
+        except ValueError as e:
+            raise AIBackendError(f"Malformed JSON from {self.url}: {e}") from e
+        if not isinstance(plan, dict):
+            raise AIBackendError(f"Expected a JSON object from {self.url}, got {type(plan).__name__}")
+        return plan
+
+
+class OfflineAIBackend(AIBackend):
+    name = 'offline'
+
+    def generate(self, user_data):
+        return generate_offline_meal_suggestions(user_data)
+
+
+def get_backend(name=None):
+    """Backend selected by DIET_PLAN_AI_BACKEND (or by name)"""
+    name = name or settings.DIET_PLAN_AI_BACKEND
+    if name == 'remote':
+        return RemoteAIBackend()
+    if name == 'http':
+        return HTTPAIBackend(settings.DIET_PLAN_AI_BACKEND_URL, settings.DIET_PLAN_AI_TIMEOUT)
+    if name == 'offline':
+        return OfflineAIBackend()
+    raise AIBackendError(f"Unknown diet plan backend: {name}")
@@ -0,0 +1,224 @@
+"""
+Offline diet plan generator.
+
+Builds the same {"Day N": {"Breakfast": [...], "Lunch": [...], "Dinner": [...],
+"Snacks": [...]}} plan the AI returns, from the Bangladeshi food table in
+Bangladeshi_Foods_100g.csv and the user's daily calorie target. Generation is
+deterministic for a given user_data and takes a few milliseconds, so it can
+serve plans on its own or stand in for the AI when it fails.
+
+Allergies ('food_restrictions') and diets ('dietary_restrictions': vegetarian,
+vegan, halal) are applied to the food table before anything is picked;
+vegetarian plans take their protein from legumes.
+"""
+import csv
+import hashlib
+import json
+import random
+from collections import Counter, defaultdict, namedtuple
+from functools import lru_cache
+from pathlib import Path
+
+FOODS_CSV = Path(__file__).resolve().parent / 'Bangladeshi_Foods_100g.csv'
+
+PLAN_DAYS = 30
+
+CsvFood = namedtuple('CsvFood', 'name category calories')
+
+ACTIVITY_MULTIPLIERS = {
+    'sedentary': 1.2,
+    'light': 1.375,
+    'moderate': 1.55,
+    'active': 1.725,
+    'extra_active': 1.9,
+}
+
+GOAL_ADJUSTMENTS = {
+    'lose_weight': -500,
+    'gain_weight': 300,
+    'muscle_gain': 300,
+}
+
+DEFAULT_CALORIES = 2000
+MIN_CALORIES = 1200
+
+# Share of the daily calories for each meal
+MEAL_SHARES = {
+    'Breakfast': 0.25,
+    'Lunch': 0.35,
+    'Dinner': 0.30,
+    'Snacks': 0.10,
+}
+
+# Meal slots: (pool, share of the meal's calories, max grams)
+MEAL_SLOTS = {
+    'Breakfast': [('breakfast_grain', 0.6, 150), ('fruit', 0.4, 250)],
+    'Lunch': [('rice', 0.45, 400), ('protein', 0.3, 250), ('dal', 0.1, 250), ('vegetable', 0.15, 300)],
+    'Dinner': [('rice', 0.4, 400), ('protein', 0.3, 250), ('dal', 0.15, 250), ('vegetable', 0.15, 300)],
+    'Snacks': [('snack', 1.0, 250)],
+}
+
+# How many slots draw from each pool every day
+POOL_USES_PER_DAY = Counter(pool for slots in MEAL_SLOTS.values() for pool, _, _ in slots)
+
+BREAKFAST_GRAINS = (
+    'Flattened Rice (Chira)',
+    'Oats',
+    'Puffed Rice (Muri)',
+    'Semolina (Suji)',
+    'Wheat Flour (Atta)',
+)
+
+# Vegetables only used as seasoning
+CONDIMENTS = ('Morich (Green Chili)',)
+
+MEAT_CATEGORIES = ('Fishes', 'Meats & Poultry')
+DAIRY_FOODS = ('Rosogolla', 'Sandesh', 'Chomchom', 'Misti Doi')
+NON_HALAL_TERMS = ('pork', 'ham', 'bacon', 'lard', 'wine', 'rum')
+
+
+@lru_cache(maxsize=1)
+def load_foods():
+    """Foods from the CSV, de-duplicated by name, grouped into meal slot pools"""
+    foods = {}
+    with open(FOODS_CSV, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            calories = float(row['calories_per_100g'] or 0)
+            if calories > 0:
+                foods.setdefault(row['item'], CsvFood(row['item'], row['category'], calories))
+
+    pools = defaultdict(list)
+    for food in foods.values():
+        if food.category == 'Grains & Staples':
+            if food.name.startswith('Rice ('):
+                pools['rice'].append(food)
+            elif food.name in BREAKFAST_GRAINS:
+                pools['breakfast_grain'].append(food)
+        elif food.category in ('Fishes', 'Meats & Poultry'):
+            pools['protein'].append(food)
+        elif food.category == 'Lentils & Pulses':
+            pools['dal'].append(food)
+        elif food.category == 'Legumes & Pulses':
+            pools['legume'].append(food)
+        elif food.category == 'Vegetables' and food.name not in CONDIMENTS:
+            pools['vegetable'].append(food)
+        elif food.category == 'Fruits':
+            pools['fruit'].append(food)
+            pools['snack'].append(food)
+        elif food.category == 'Snacks':
+            pools['snack'].append(food)
+    return {pool: tuple(items) for pool, items in pools.items()}
+
+
+def daily_calorie_target(user_data):
+    """Mifflin-St Jeor energy need for the user's activity level, adjusted for their goal"""
+    try:
+        weight = float(user_data['weight_kg'])
+        height = float(user_data['height_cm'])
+        age = float(user_data['age'])
+    except (KeyError, TypeError, ValueError):
+        calories = DEFAULT_CALORIES
+    else:
+        bmr = 10 * weight + 6.25 * height - 5 * age + (5 if user_data.get('gender') == 'M' else -161)
+        calories = bmr * ACTIVITY_MULTIPLIERS.get(user_data.get('activity_level'), 1.2)
+
+    calories += GOAL_ADJUSTMENTS.get(user_data.get('goal'), 0)
+    return max(MIN_CALORIES, round(calories))
+
+
+def _restricted_terms(user_data):
+    return [
+        str(term).strip().lower()
+        for term in user_data.get('food_restrictions') or []
+        if str(term).strip()
+    ]
+
+
+def _diets(user_data):
+    """Diets named in user_data['dietary_restrictions'] (a list or comma-separated text)"""
+    terms = user_data.get('dietary_restrictions') or []
+    if isinstance(terms, str):
+        terms = terms.split(',')
+    terms = [str(term).strip().lower() for term in terms]
+    vegan = any('vegan' in term for term in terms)
+    return {
+        'vegan': vegan,
+        'vegetarian': vegan or any('vegetarian' in term for term in terms),
+        'halal': any('halal' in term for term in terms),
+    }
+
+
+def _allowed(food, terms, diets):
+    text = f'{food.name} {food.category}'.lower()
+    if any(term in text for term in terms):
+        return False
+    if diets['vegetarian'] and food.category in MEAT_CATEGORIES:
+        return False
+    if diets['vegan'] and food.name in DAIRY_FOODS:
+        return False
+    if diets['halal'] and any(term in text for term in NON_HALAL_TERMS):
+        return False
+    return True
+
+
+def _seed(user_data):
+    """Stable seed for a profile, independent of the day range requested"""
+    profile = {key: value for key, value in user_data.items() if key not in ('start_day', 'num_days')}
+    payload = json.dumps(profile, sort_keys=True, default=str)
+    return int(hashlib.sha1(payload.encode()).hexdigest()[:16], 16)
+
+
+def _portion(food, calories, max_grams):
+    grams = calories * 100 / food.calories
+    return int(min(max_grams, max(10, round(grams / 5) * 5)))
+
+
+def generate_offline_meal_suggestions(user_data):
+    """
+    Offline counterpart of generate_meal_suggestions(user_data).
+
+    Honours the optional 'start_day' and 'num_days' keys used for chunked
+    generation; a chunk contains exactly the days of the full plan it covers.
+    """
+    start_day = int(user_data.get('start_day', 1))
+    num_days = int(user_data.get('num_days', PLAN_DAYS))
+    daily_calories = daily_calorie_target(user_data)
+    terms = _restricted_terms(user_data)
+    diets = _diets(user_data)
+    pools = load_foods()
+
+    # Each pool is shuffled once per profile and walked slot by slot, so lunch and
+    # dinner differ, consecutive days differ, and any day range is reproducible
+    # on its own
+    rng = random.Random(_seed(user_data))
+    rotations = {}
+    for pool in sorted(POOL_USES_PER_DAY):
+        allowed = [food for food in pools.get(pool, ()) if _allowed(food, terms, diets)]
+        rng.shuffle(allowed)
+        rotations[pool] = allowed
+    if diets['vegetarian']:
+        legumes = [food for food in pools.get('legume', ()) if _allowed(food, terms, diets)]
+        rng.shuffle(legumes)
+        rotations['protein'] = legumes
+
+    plan = {}
+    for day in range(start_day, start_day + num_days):
+        meals = {}
+        used_today = Counter()
+        for meal_time, slots in MEAL_SLOTS.items():
+            available = [slot for slot in slots if rotations.get(slot[0])]
+            total_share = sum(share for _, share, _ in available)
+            meal_calories = daily_calories * MEAL_SHARES[meal_time]
+
+            items = []
+            for pool, share, max_grams in available:
+                foods = rotations[pool]
+                position = (day - 1) * POOL_USES_PER_DAY[pool] + used_today[pool]
+                used_today[pool] += 1
+                food = foods[position % len(foods)]
+                grams = _portion(food, meal_calories * share / total_share, max_grams)
+                items.append(f'{food.name}: {grams}g')
+            meals[meal_time] = items
+        plan[f'Day {day}'] = meals
+
+    return plan
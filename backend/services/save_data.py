@@ -2,50 +2,246 @@
 import json
 from datetime import timedelta
 from django.db import transaction
+from django.db.models import Case, Value, When
 from django.utils import timezone
-from diet_plans.models import ToDoList, GenerateMeal
+from diet_plans import adherence
+from diet_plans.ai_diet_parser import meal_item_records, plan_item_records
+from diet_plans.models import ToDoList, GenerateMeal, GeneratedMealDay
+from diet_plans.restrictions import get_matcher, rewrite_meals, rewrite_plan, rewrite_todo_meal
+
+PLAN_DAYS = 30
+BULK_BATCH_SIZE = 500
+TODO_COMPLETION_BATCH_MAX = 500
+TODO_FIELDS = ('id', 'meal', 'day', 'meal_time', 'date_of_meal', 'is_completed')
+
+# Fields refreshed when a regenerated plan hits an existing (user, date_of_meal, meal_time) row;
+# upsert_todo_rows() carries the old completion over when the meal is unchanged
+TODO_UPSERT_FIELDS = ['meal', 'day', 'is_completed', 'updated_at']
+
+
+def _todo_rows(user, day_num, date_of_meal, meals):
+    # meals: {'Breakfast': [...], 'Lunch': [...], 'Dinner': [...], 'Snacks': [...]}
+    return [
+        # items is a list of strings; store as JSON in `meal`
+        ToDoList(
+            user=user,
+            meal=json.dumps(items, ensure_ascii=False),
+            day=day_num,
+            meal_time=meal_time,
+            date_of_meal=date_of_meal,
+            is_completed=False,
+        )
+        for meal_time, items in meals.items()
+    ]
+
+
+def _day_number(day_label):
+    # 'Day 7' -> 7, None if the label is malformed
+    try:
+        return int(day_label.split()[1])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def save_plan_days(generated_meal, plan_dict: dict):
+    """Store each 'Day N' of plan_dict, with its parsed items, as its own GeneratedMealDay row"""
+    items = plan_item_records(plan_dict)
+    days = [
+        GeneratedMealDay(generated_meal=generated_meal, day=day_num, meals=meals, items=items[day_label])
+        for day_num, day_label, meals in (
+            (_day_number(day_label), day_label, meals) for day_label, meals in plan_dict.items()
+        )
+        if day_num is not None
+    ]
+    GeneratedMealDay.objects.bulk_create(days, ignore_conflicts=True, batch_size=BULK_BATCH_SIZE)
+    # bulk_create sends no post_save, so bump the version here
+    generated_meal.bump_version()
+    return len(days)
+
+
+def _todo_key(row):
+    return row.user_id, row.date_of_meal, row.meal_time
+
+
+def upsert_todo_rows(rows):
+    """
+    Insert ToDoList rows, overwriting the meal of any existing row for the same
+    user, date and meal time (uniq_user_date_mealtime). An existing row keeps
+    its completion if its meal is unchanged and is reset otherwise. When rows
+    repeat a key the last one wins. Two queries per BULK_BATCH_SIZE rows (the
+    locked read of the existing rows and the upsert), plus the adherence
+    refresh of the days touched.
+    """
+    # One row per key: Postgres rejects an upsert that hits the same row twice
+    rows = list({_todo_key(row): row for row in rows}.values())
+
+    with transaction.atomic():
+        for start in range(0, len(rows), BULK_BATCH_SIZE):
+            batch = rows[start:start + BULK_BATCH_SIZE]
+            existing = {
+                (user_id, date_of_meal, meal_time): (meal, is_completed)
+                for user_id, date_of_meal, meal_time, meal, is_completed in ToDoList.objects.select_for_update().filter(
+                    user_id__in={row.user_id for row in batch},
+                    date_of_meal__in={row.date_of_meal for row in batch},
+                ).values_list('user_id', 'date_of_meal', 'meal_time', 'meal', 'is_completed')
+            }
+            for row in batch:
+                meal, is_completed = existing.get(_todo_key(row), (None, False))
+                row.is_completed = is_completed if meal == row.meal else False
+
+            ToDoList.objects.bulk_create(
+                batch,
+                update_conflicts=True,
+                unique_fields=['user', 'date_of_meal', 'meal_time'],
+                update_fields=TODO_UPSERT_FIELDS,
+            )
+        adherence.refresh_for_todos(rows)
+    return len(rows)
+
+
+def plan_todo_rows(user, plan_dict: dict, start_date):
+    """ToDoList rows for every 'Day N' of plan_dict, dated from start_date"""
+    rows = []
+    for day_label, meals in plan_dict.items():            # 'Day 1' -> {...}
+        day_num = _day_number(day_label)
+        if day_num is None:
+            # skip if key is malformed
+            continue
+        date_of_meal = start_date + timedelta(days=day_num - 1)
+        rows.extend(_todo_rows(user, day_num, date_of_meal, meals))
+    return rows
+
+
+def save_plan(*, user, plan_dict: dict, meal_type: str = 'Regular', start_date=None, end_date=None,
+              todo_rows=None):
+    """
+    Persist a plan in one transaction with a constant number of queries: the
+    GenerateMeal (blob kept for audit), its day rows and its upserted ToDoList
+    rows. todo_rows overrides the rows derived from plan_dict; like the plan,
+    their meals get the user's restrictions applied.
+    """
+    gen = GenerateMeal(
+        user=user,
+        meal_type=meal_type,
+        start_date=start_date,           # may be None; model fills in
+        end_date=end_date,
+        plan_blob=plan_dict,
+    )
+
+    with transaction.atomic():
+        gen.save()  # start_date/end_date ensured by model.save()
+        # Day and to-do rows come from the saved plan, which has restrictions applied
+        save_plan_days(gen, gen.plan_data)
+        if todo_rows is None:
+            todo_rows = plan_todo_rows(user, gen.plan_data, gen.start_date)
+        else:
+            matcher = get_matcher(user)
+            for row in todo_rows:
+                row.meal = rewrite_todo_meal(row.meal, matcher)
+        upsert_todo_rows(todo_rows)
+
+    return gen
+
 
 def save_30_day_plan_for_user(*, user, plan_dict: dict, meal_type: str = 'Regular', start_date=None):
     """
     plan_dict: the big dict you pasted, keys like 'Day 1'..'Day 30'
     start_date: optional date object; if None, GenerateMeal will default to tomorrow
     """
-    # persist the original plan for auditing/export
+    return save_plan(user=user, plan_dict=plan_dict, meal_type=meal_type, start_date=start_date)
+
+
+def start_plan_for_user(*, user, meal_type: str = 'Regular', start_date=None):
+    """
+    Create an empty plan that days are appended to as the AI streams them in.
+    The plan is visible (start/end dates set) before any day arrives; its audit
+    blob is written by save_plan_audit() once the plan is complete.
+    """
     gen = GenerateMeal(
         user=user,
         meal_type=meal_type,
-        start_date=start_date,           # may be None; model fills in
-        ai_generated_data=json.dumps(plan_dict, ensure_ascii=False),
+        start_date=start_date,
+        plan_blob={},
     )
+    gen.save()
+    return gen
+
+
+def append_plan_day(*, generated_meal, day_label: str, meals: dict):
+    """
+    Persist one 'Day N' block, with the user's restrictions applied: its
+    GeneratedMealDay row and its ToDoList rows. Returns the number of ToDoList
+    rows written.
+    """
+    day_num = _day_number(day_label)
+    if day_num is None:
+        raise ValueError(f"Malformed day label: {day_label!r}")
+
+    meals = rewrite_meals(meals, get_matcher(generated_meal.user))
+    date_of_meal = generated_meal.start_date + timedelta(days=day_num - 1)
+    rows = _todo_rows(generated_meal.user, day_num, date_of_meal, meals)
 
     with transaction.atomic():
-        gen.save()  # start_date/end_date ensured by model.save()
+        GeneratedMealDay.objects.update_or_create(
+            generated_meal=generated_meal, day=day_num,
+            defaults={'meals': meals, 'items': meal_item_records(meals)},
+        )
+        upsert_todo_rows(rows)
+
+    return len(rows)
+
+
+def discard_plan(*, generated_meal, day_labels):
+    """Delete a plan that failed part-way, with the to-do rows of the days already saved"""
+    dates = {
+        generated_meal.start_date + timedelta(days=day_num - 1)
+        for day_num in map(_day_number, day_labels) if day_num is not None
+    }
+    with transaction.atomic():
+        # Row deletes refresh the days' adherence through the ToDoList post_delete signal
+        ToDoList.objects.filter(user_id=generated_meal.user_id, date_of_meal__in=dates).delete()
+        generated_meal.delete()
+
+
+def save_plan_audit(*, generated_meal, plan_dict: dict):
+    """Write the complete plan, with the user's restrictions applied, to the audit blob of a streamed plan"""
+    plan_dict = rewrite_plan(plan_dict, get_matcher(generated_meal.user))
+    # update() instead of save(): only the blob changes
+    GenerateMeal.objects.filter(pk=generated_meal.pk).update(plan_blob=plan_dict)
+    generated_meal.plan_blob = plan_dict
+
+
+def set_todo_completion(*, user, changes: dict, date_of_meal=None):
+    """
+    Apply {todo_id: is_completed} to the user's to-do rows with a fixed number
+    of queries in one transaction: one that checks ownership and loads and
+    locks the rows, one UPDATE for every row whose status actually changes and
+    the adherence refresh of their days. Nothing is updated if any id is missing (not the user's, or not on
+    date_of_meal when given).
+
+    Returns (rows, missing_ids); rows are dicts of TODO_FIELDS with the new
+    status applied.
+    """
+    with transaction.atomic():
+        # Lock the rows so concurrent toggles of the same to-dos apply one after the other
+        todos = ToDoList.objects.select_for_update().filter(user=user, id__in=changes)
+        if date_of_meal is not None:
+            todos = todos.filter(date_of_meal=date_of_meal)
+        rows = list(todos.values(*TODO_FIELDS))
+
+        missing = set(changes) - {row['id'] for row in rows}
+        if missing:
+            return [], sorted(missing)
+
+        changed = [row for row in rows if row['is_completed'] != changes[row['id']]]
+        if changed:
+            completed = [row['id'] for row in changed if changes[row['id']]]
+            ToDoList.objects.filter(id__in=[row['id'] for row in changed]).update(
+                is_completed=Case(When(id__in=completed, then=Value(True)), default=Value(False)),
+                updated_at=timezone.now(),
+            )
+            adherence.refresh_days(user.id, {row['date_of_meal'] for row in changed})
 
-        rows = []
-        base = gen.start_date
-        for day_label, meals in plan_dict.items():            # 'Day 1' -> {...}
-            try:
-                day_num = int(day_label.split()[1])
-            except (IndexError, ValueError):
-                # skip/raise if key is malformed
-                continue
-            date_of_meal = base + timedelta(days=day_num - 1)
-
-            # meals: {'Breakfast': [...], 'Lunch': [...], 'Dinner': [...], 'Snacks': [...]}
-            for meal_time, items in meals.items():
-                # items is a list of strings; store as JSON in `meal`
-                rows.append(
-                    ToDoList(
-                        user=user,
-                        meal=json.dumps(items, ensure_ascii=False),
-                        day=day_num,
-                        meal_time=meal_time,
-                        date_of_meal=date_of_meal,
-                        is_completed=False,
-                    )
-                )
-
-        # Fast insert; ignore duplicates if you re-run for same window
-        ToDoList.objects.bulk_create(rows, ignore_conflicts=True, batch_size=500)
-
-    return gen  # has id, start_date, end_date
+    for row in rows:
+        row['is_completed'] = changes[row['id']]
+    return rows, []